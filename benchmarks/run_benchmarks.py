@@ -0,0 +1,422 @@
+"""Benchmark suite of PASCAL NDVI Block on synthetic rasters.
+
+Generates Sentinel-2/Landsat-like GeoTIFFs of configurable size and layout
+(striped or tiled, compressed or not, 4/7/12 bands) and times the clipping,
+each index function, ``calculate_all_indices`` and the CLI ``auto`` path.
+Every run executes in a fresh child process, so the peak resident memory
+reported is the one of that case alone.
+
+Results are saved as JSON with the environment of the run (versions, CPU,
+commit) and can be compared against a previous report::
+
+    python -m benchmarks.run_benchmarks --size 1024 --size 4096
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/base.json
+"""
+
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import rasterio
+import typer
+from loguru import logger
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Longitudes de onda centrales (nm) de los apilados sintéticos por número de bandas
+SCENE_WAVELENGTHS = {
+    4: (665, 842, 560, 490),
+    7: (443, 482, 561, 655, 865, 1609, 2201),
+    12: (443, 490, 560, 665, 705, 740, 783, 842, 865, 945, 1610, 2190),
+}
+# Reflectancia típica (x 10000) de cada banda sobre vegetación y suelo
+_VEGETATION = {490: 400, 560: 800, 665: 500, 705: 1500, 842: 4000}
+_SOIL = {490: 1200, 560: 1500, 665: 1800, 705: 2000, 842: 2500}
+
+LAYOUTS = ("striped", "tiled")
+COMPRESSIONS = ("none", "deflate")
+TARGETS = ("clip", "ndvi", "ndre", "savi", "all_indices", "auto")
+PIXEL_SIZE = 10.0
+ORIGIN = (300000.0, 6100000.0)
+CRS = "EPSG:32719"
+
+DEFAULT_DATA_DIR = ROOT / "benchmarks" / "data"
+DEFAULT_RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+app = typer.Typer()
+
+
+def _reflectance(wavelength: int, field: np.ndarray) -> np.ndarray:
+    """Mixes vegetation and soil reflectance according to a field pattern."""
+    nearest = min(_VEGETATION, key=lambda w: abs(w - wavelength))
+    vegetation, soil = _VEGETATION[nearest], _SOIL[nearest]
+    return soil + (vegetation - soil) * field
+
+
+def synthetic_scene(
+    path: Path,
+    size: int,
+    bands: int = 12,
+    layout: str = "tiled",
+    compress: str = "none",
+    seed: int = 0,
+) -> Path:
+    """Writes a synthetic multiband uint16 scene with wavelength tags.
+
+    The scene is a patchwork of fields with noise, so compression ratios are
+    closer to real imagery than those of pure noise. It is written by strips
+    and never held in memory as a whole.
+
+    Args:
+        path: Output GeoTIFF
+        size: Width and height in pixels
+        bands: Number of bands (4, 7 or 12)
+        layout: ``striped`` or ``tiled`` (512 x 512 blocks)
+        compress: ``none`` or a GDAL compression such as ``deflate``
+        seed: Random seed
+
+    Returns:
+        Path of the scene
+    """
+    wavelengths = SCENE_WAVELENGTHS[bands]
+    profile: Dict[str, Any] = {
+        "driver": "GTiff",
+        "width": size,
+        "height": size,
+        "count": bands,
+        "dtype": "uint16",
+        "nodata": 0,
+        "crs": CRS,
+        "transform": from_origin(*ORIGIN, PIXEL_SIZE, PIXEL_SIZE),
+    }
+    if layout == "tiled":
+        profile.update(tiled=True, blockxsize=512, blockysize=512)
+    if compress != "none":
+        profile["compress"] = compress
+
+    rng = np.random.default_rng(seed)
+    cell = 64
+    fields = rng.uniform(0.0, 1.0, (size // cell + 1, size // cell + 1))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with rasterio.open(path, "w", **profile) as dst:
+        for i, wavelength in enumerate(wavelengths, start=1):
+            dst.update_tags(i, wavelength_nm=wavelength)
+        for row in range(0, size, 512):
+            height = min(512, size - row)
+            rows = np.arange(row, row + height) // cell
+            field = np.repeat(fields[rows], cell, axis=1)[:, :size]
+            for i, wavelength in enumerate(wavelengths, start=1):
+                band = _reflectance(wavelength, field)
+                band += rng.normal(0.0, 50.0, band.shape)
+                dst.write(
+                    np.clip(band, 1, 10000).astype("uint16"),
+                    i,
+                    window=Window(0, row, size, height),
+                )
+    return path
+
+
+def clip_shapefile(path: Path, size: int) -> Path:
+    """Writes a shapefile with one polygon over the central half of a scene."""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    left, top = ORIGIN
+    extent = size * PIXEL_SIZE
+    polygon = box(
+        left + extent / 4, top - 3 * extent / 4, left + 3 * extent / 4, top - extent / 4
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    gpd.GeoDataFrame({"id": [1]}, geometry=[polygon], crs=CRS).to_file(path)
+    return path
+
+
+def _scene_name(size: int, bands: int, layout: str, compress: str) -> str:
+    return f"scene_{size}_{bands}b_{layout}_{compress}"
+
+
+def _run_target(target: str, image: Path, shapefile: Path, workdir: Path) -> None:
+    """Runs one benchmark target."""
+    from src.indices import (
+        calculate_all_indices,
+        calculate_ndre,
+        calculate_ndvi,
+        calculate_savi,
+    )
+    from src.preprocessor import clip_image_with_shapefile
+
+    if target == "clip":
+        clip_image_with_shapefile(image, shapefile, workdir)
+    elif target == "ndvi":
+        calculate_ndvi(image, workdir)
+    elif target == "ndre":
+        calculate_ndre(image, workdir)
+    elif target == "savi":
+        calculate_savi(image, workdir)
+    elif target == "all_indices":
+        calculate_all_indices(image, workdir)
+    elif target == "auto":
+        from src.main import app as cli
+
+        cli(
+            ["auto", "--image", str(image), "--output", str(workdir), "--no-cache"],
+            standalone_mode=False,
+        )
+    else:
+        raise ValueError(f"Objetivo de benchmark desconocido: {target}")
+
+
+def _measure(target: str, image: str, shapefile: str, workdir: str, conn: Any) -> None:
+    """Times one target in the current (fresh) process.
+
+    Runs in a child process: the peak memory it reports belongs to this run
+    only, and ``baseline_rss_mb`` is the memory after importing the package.
+    The measurement is sent back through ``conn``.
+    """
+    import src  # noqa: F401
+    from src.metrics import peak_memory_mb
+
+    baseline = peak_memory_mb()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+        logger.remove()
+        start = time.perf_counter()
+        _run_target(target, Path(image), Path(shapefile), Path(workdir))
+        seconds = time.perf_counter() - start
+    peak = peak_memory_mb()
+    conn.send(
+        {
+            "seconds": seconds,
+            "baseline_rss_mb": round(baseline, 1) if baseline is not None else None,
+            "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        }
+    )
+    conn.close()
+
+
+def _in_child(
+    context: Any, target: str, image: Path, shapefile: Path, workdir: Path
+) -> Dict[str, Any]:
+    """Runs ``_measure`` in a new process and returns its measurement."""
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_measure, args=(target, str(image), str(shapefile), str(workdir), sender)
+    )
+    process.start()
+    sender.close()
+    measurement: Optional[Dict[str, Any]]
+    try:
+        measurement = receiver.recv()
+    except EOFError:
+        measurement = None
+    process.join()
+    if measurement is None or process.exitcode != 0:
+        raise RuntimeError(
+            f"El benchmark {target} falló sobre {image.name} (código {process.exitcode})"
+        )
+    return measurement
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """Describes the machine and versions a report was produced with."""
+    from src import __version__
+
+    return {
+        "version": __version__,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "rasterio": rasterio.__version__,
+        "gdal": rasterio.__gdal_version__,
+    }
+
+
+def run_suite(
+    sizes: List[int],
+    bands: List[int],
+    layouts: List[str],
+    compressions: List[str],
+    targets: List[str],
+    repeat: int = 3,
+    data_dir: Path = DEFAULT_DATA_DIR,
+) -> Dict[str, Any]:
+    """Runs every target on every synthetic scene.
+
+    Scenes are generated once in ``data_dir`` and reused by later runs, so
+    reports of different commits measure the same inputs. Each repetition
+    runs in its own child process.
+
+    Args:
+        sizes: Scene sizes in pixels (width = height)
+        bands: Band counts (4, 7, 12)
+        layouts: ``striped`` and/or ``tiled``
+        compressions: ``none`` and/or GDAL compressions
+        targets: Targets from ``TARGETS``
+        repeat: Repetitions per case
+        data_dir: Directory of the synthetic scenes and outputs
+
+    Returns:
+        Report with the environment and one record per case
+    """
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        raise ValueError(f"Objetivos de benchmark desconocidos: {sorted(unknown)}")
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        shapefile = data_dir / f"clip_{size}.shp"
+        if not shapefile.exists():
+            clip_shapefile(shapefile, size)
+        for n_bands, layout, compress in product(bands, layouts, compressions):
+            name = _scene_name(size, n_bands, layout, compress)
+            image = data_dir / f"{name}.tif"
+            if not image.exists():
+                logger.info(f"🧪 Generando escena sintética {image.name}")
+                synthetic_scene(image, size, n_bands, layout, compress)
+            for target in targets:
+                workdir = data_dir / "out" / name / target
+                workdir.mkdir(parents=True, exist_ok=True)
+                runs = []
+                for _ in range(repeat):
+                    runs.append(_in_child(context, target, image, shapefile, workdir))
+                times = [r["seconds"] for r in runs]
+                median = statistics.median(times)
+                peaks = [r["peak_rss_mb"] for r in runs if r["peak_rss_mb"] is not None]
+                record = {
+                    "target": target,
+                    "size": size,
+                    "bands": n_bands,
+                    "layout": layout,
+                    "compress": compress,
+                    "image_mb": round(image.stat().st_size / 1024**2, 2),
+                    "repeat": repeat,
+                    "min_seconds": round(min(times), 4),
+                    "median_seconds": round(median, 4),
+                    "mpixels_per_second": round(size * size / median / 1e6, 2),
+                    "baseline_rss_mb": runs[0]["baseline_rss_mb"],
+                    "peak_rss_mb": max(peaks) if peaks else None,
+                }
+                logger.info(
+                    f"⏱️ {target} {name}: {record['median_seconds']} s, "
+                    f"{record['peak_rss_mb']} MB"
+                )
+                results.append(record)
+
+    return {
+        "created": datetime.now().isoformat(),
+        "environment": environment(),
+        "results": results,
+    }
+
+
+def _case(record: Dict[str, Any]) -> tuple:
+    return tuple(record[k] for k in ("target", "size", "bands", "layout", "compress"))
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Compares the cases of two reports.
+
+    Returns:
+        One record per case present in both reports with the ratio of the
+        median times and of the peak memory (current / baseline)
+    """
+    previous = {_case(r): r for r in baseline["results"]}
+    rows = []
+    for record in report["results"]:
+        base = previous.get(_case(record))
+        if base is None:
+            continue
+        peak, base_peak = record["peak_rss_mb"], base["peak_rss_mb"]
+        rows.append(
+            {
+                "case": "/".join(str(v) for v in _case(record)),
+                "seconds": record["median_seconds"],
+                "baseline_seconds": base["median_seconds"],
+                "time_ratio": round(
+                    record["median_seconds"] / base["median_seconds"], 3
+                ),
+                "memory_ratio": (
+                    round(peak / base_peak, 3) if peak and base_peak else None
+                ),
+            }
+        )
+    return rows
+
+
+@app.command()
+def main(
+    size: List[int] = typer.Option(
+        [1024, 2048], help="Scene size in pixels (repeatable)"
+    ),
+    bands: List[int] = typer.Option(
+        [4, 7, 12], help="Band count: 4, 7 or 12 (repeatable)"
+    ),
+    layout: List[str] = typer.Option(
+        list(LAYOUTS), help="striped or tiled (repeatable)"
+    ),
+    compress: List[str] = typer.Option(
+        list(COMPRESSIONS), help="none or a GDAL compression (repeatable)"
+    ),
+    target: List[str] = typer.Option(list(TARGETS), help="Target to time (repeatable)"),
+    repeat: int = typer.Option(3, min=1, help="Repetitions per case"),
+    data_dir: Path = typer.Option(DEFAULT_DATA_DIR, help="Synthetic scenes directory"),
+    output: Optional[Path] = typer.Option(None, help="JSON report path"),
+    compare_with: Optional[Path] = typer.Option(
+        None, "--compare", exists=True, help="Previous JSON report to compare with"
+    ),
+) -> None:
+    """Runs the benchmark suite and saves a JSON report."""
+    unsupported = set(bands) - set(SCENE_WAVELENGTHS)
+    if unsupported:
+        raise typer.BadParameter(
+            f"Número de bandas no soportado: {sorted(unsupported)}"
+        )
+
+    report = run_suite(size, bands, layout, compress, target, repeat, data_dir)
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = DEFAULT_RESULTS_DIR / f"benchmark_{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    logger.info(f"📈 Resultados guardados en {output}")
+
+    if compare_with is not None:
+        for row in compare(report, json.loads(compare_with.read_text())):
+            logger.info(
+                f"📊 {row['case']}: {row['baseline_seconds']} s → {row['seconds']} s "
+                f"(x{row['time_ratio']}, memoria x{row['memory_ratio']})"
+            )
+
+
+if __name__ == "__main__":
+    app()
@@ -6,8 +6,12 @@ from .indices import (
     calculate_savi,
     calculate_ndre,
     calculate_all_indices,
+    calculate_indices,
+    compute_indices,
+    IndexResult,
 )
 from .preprocessor import clip_image_with_shapefile
+from .expressions import register_index
 from .config import get_config
 from .logging_config import setup_logging
 
@@ -21,7 +25,11 @@ __all__ = [
     "calculate_savi",
     "calculate_ndre",
     "calculate_all_indices",
+    "calculate_indices",
+    "compute_indices",
+    "IndexResult",
     "clip_image_with_shapefile",
+    "register_index",
     "get_config",
     "setup_logging",
 ]
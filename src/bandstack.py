@@ -0,0 +1,292 @@
+"""Virtual band stacks from per-band image files.
+
+Sentinel-2 (SAFE/JP2) and Landsat products are delivered as one file per
+band. Instead of writing a multiband GeoTIFF first, the band files are
+combined into an in-memory VRT (``/vsimem``) that the index engine reads like
+any multiband image. Only the headers of the selected band files are opened
+to build the VRT, and only the bands the requested indices need are read.
+
+Bands delivered at different resolutions (Sentinel-2 NIR at 10 m, red-edge
+at 20 m) are resampled on read to a common target grid: the finest band grid
+by default or a requested pixel size, in which case the band files closest
+to that resolution are preferred.
+"""
+
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import rasterio
+from affine import Affine
+from loguru import logger
+from rasterio.dtypes import dtype_rev, typename_fwd
+from rasterio.io import MemoryFile
+
+from .config import QUALITY_BANDS
+from .sensors import detect_sensor, normalize_band_name, sensor_profile
+
+# Extensiones de archivos por banda reconocidas en un producto
+BAND_FILE_EXTENSIONS = (".jp2", ".tif", ".tiff")
+# Bandas de los índices por defecto: las únicas incluidas en la VRT si no se piden otras
+STACK_BANDS = ("red", "nir", "red_edge1")
+
+# Sufijo de banda de un archivo: "..._B04", "..._B04_10m", "..._SR_B4", "..._SCL_20m"
+_BAND_SUFFIX = re.compile(r"(?:^|_)(B\d{1,2}A?|SCL|QA_PIXEL)(?:_(\d+)M)?$")
+
+
+def find_band_files(
+    product_dir: Path,
+    sensor: Optional[str] = None,
+    bands: Iterable[str] = STACK_BANDS,
+    resolution: Optional[float] = None,
+) -> Dict[str, Path]:
+    """Finds the per-band files of a product directory.
+
+    The band of each file is taken from its name suffix and matched with the
+    band names of the sensor profile. When a band is available at several
+    resolutions (Sentinel-2 L2A ``R10m``/``R20m``/``R60m``) the finest is
+    used, or with ``resolution`` the coarsest one not coarser than it.
+
+    Args:
+        product_dir: Product directory (searched recursively)
+        sensor: Sensor profile. Detected from the product names by default.
+        bands: Logical bands to include
+        resolution: Target pixel size of the processing grid
+
+    Returns:
+        Dictionary mapping logical band names to files
+    """
+    files = sorted(
+        p for p in product_dir.rglob("*") if p.suffix.lower() in BAND_FILE_EXTENSIONS
+    )
+    sensor = sensor or detect_sensor([product_dir.name] + [p.name for p in files])
+    if sensor is None:
+        raise ValueError(f"No se pudo identificar el sensor del producto {product_dir}")
+
+    wanted = set(bands)
+    lookup = {
+        normalize_band_name(name): logical
+        for logical, name in sensor_profile(sensor).get("bands", {}).items()
+        if logical in wanted
+    }
+    found: Dict[str, Tuple[int, Path]] = {}
+    for path in files:
+        match = _BAND_SUFFIX.search(path.stem.upper())
+        if not match:
+            continue
+        logical = lookup.get(normalize_band_name(match.group(1)))
+        if logical is None:
+            continue
+        file_resolution = int(match.group(2) or 0)
+        if logical not in found or _prefer(
+            file_resolution, found[logical][0], resolution
+        ):
+            found[logical] = (file_resolution, path)
+
+    if not found:
+        raise ValueError(f"No se encontraron archivos de banda en {product_dir}")
+    logger.debug(f"Archivos de banda ({sensor}): {found}")
+    return {name: found[name][1] for name in lookup.values() if name in found}
+
+
+def _prefer(candidate: int, current: int, target: Optional[float]) -> bool:
+    """Whether a band file resolution is a better match than the current one."""
+    if target is None or (candidate > target and current > target):
+        return candidate < current
+    if current > target:
+        return True
+    return target >= candidate > current
+
+
+def parse_band_files(specs: List[str]) -> Dict[str, Path]:
+    """Parses ``name=path`` band file specifications from the command line."""
+    band_files = {}
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(
+                f"Especificación de banda inválida: {spec} (use nombre=ruta)"
+            )
+        band_files[name.strip().lower()] = Path(path.strip())
+    return band_files
+
+
+def build_vrt(band_files: Dict[str, Path], resolution: Optional[float] = None) -> str:
+    """Builds the XML of a VRT stacking one file per band.
+
+    The VRT uses the grid of the finest band, or a grid with the ``resolution``
+    pixel size over the same extent. Bands on a different grid are resampled
+    on read: averaged when finer than the VRT grid, nearest neighbour when
+    coarser. Quality bands (SCL, QA_PIXEL) hold classes and bit flags and are
+    always resampled with nearest neighbour. Each VRT band is described with
+    its logical name so the bands are identified without further metadata.
+
+    Args:
+        band_files: Dictionary mapping logical band names to files
+        resolution: Pixel size of the VRT grid. Finest band grid by default.
+
+    Returns:
+        VRT document
+    """
+    headers = {}
+    for name, path in band_files.items():
+        with rasterio.open(path) as src:
+            headers[name] = {
+                "crs": src.crs,
+                "transform": src.transform,
+                "bounds": src.bounds,
+                "width": src.width,
+                "height": src.height,
+                "dtype": src.dtypes[0],
+                "nodata": src.nodata,
+                "block": src.block_shapes[0],
+                "res": src.res,
+            }
+
+    crs = {str(h["crs"]) for h in headers.values()}
+    if len(crs) > 1:
+        raise ValueError(
+            "Los archivos de banda tienen sistemas de coordenadas distintos"
+        )
+
+    finest = min(headers.values(), key=lambda h: h["res"][0] * h["res"][1])
+    transform, width, height = finest["transform"], finest["width"], finest["height"]
+    if resolution is not None:
+        bounds = finest["bounds"]
+        width = max(1, math.floor((bounds.right - bounds.left) / resolution))
+        height = max(1, math.floor((bounds.top - bounds.bottom) / resolution))
+        transform = Affine(resolution, 0.0, bounds.left, 0.0, -resolution, bounds.top)
+    inverse = ~transform
+
+    root = ET.Element("VRTDataset", rasterXSize=str(width), rasterYSize=str(height))
+    if finest["crs"]:
+        ET.SubElement(root, "SRS").text = finest["crs"].to_wkt()
+    ET.SubElement(root, "GeoTransform").text = ", ".join(
+        repr(v) for v in transform.to_gdal()
+    )
+    pixel_area = abs(transform.a * transform.e)
+    for i, (name, path) in enumerate(band_files.items(), start=1):
+        header = headers[name]
+        dtype = typename_fwd[dtype_rev[header["dtype"]]]
+        band = ET.SubElement(root, "VRTRasterBand", dataType=dtype, band=str(i))
+        ET.SubElement(band, "Description").text = name
+        nodata = header["nodata"]
+        if nodata is not None:
+            ET.SubElement(band, "NoDataValue").text = repr(nodata)
+
+        # Bandas más finas que la malla se promedian; las más gruesas y las de
+        # calidad (clases, bits) se replican
+        finer = header["res"][0] * header["res"][1] < pixel_area
+        average = finer and name not in QUALITY_BANDS
+        source = ET.SubElement(
+            band, "ComplexSource", resampling="average" if average else "nearest"
+        )
+        ET.SubElement(source, "SourceFilename", relativeToVRT="0").text = str(
+            Path(path).resolve()
+        )
+        ET.SubElement(source, "SourceBand").text = "1"
+        ET.SubElement(
+            source,
+            "SourceProperties",
+            RasterXSize=str(header["width"]),
+            RasterYSize=str(header["height"]),
+            DataType=dtype,
+            BlockXSize=str(header["block"][1]),
+            BlockYSize=str(header["block"][0]),
+        )
+        ET.SubElement(
+            source,
+            "SrcRect",
+            xOff="0",
+            yOff="0",
+            xSize=str(header["width"]),
+            ySize=str(header["height"]),
+        )
+        # Extensión del archivo de banda en píxeles de la malla de la VRT
+        left, top = inverse * (header["bounds"].left, header["bounds"].top)
+        right, bottom = inverse * (header["bounds"].right, header["bounds"].bottom)
+        ET.SubElement(
+            source,
+            "DstRect",
+            xOff=repr(left),
+            yOff=repr(top),
+            xSize=repr(right - left),
+            ySize=repr(bottom - top),
+        )
+        if nodata is not None:
+            ET.SubElement(source, "NODATA").text = repr(nodata)
+
+    return ET.tostring(root, encoding="unicode")
+
+
+def _stack_stem(band_files: Dict[str, Path]) -> str:
+    """Base name for the outputs: common prefix of the band file names."""
+    prefix = os.path.commonprefix([p.stem for p in band_files.values()])
+    return prefix.rstrip("_-.") or "bands"
+
+
+@contextmanager
+def virtual_stack(
+    band_files: Dict[str, Path],
+    stem: Optional[str] = None,
+    resolution: Optional[float] = None,
+) -> Iterator[Path]:
+    """Exposes per-band files as an in-memory multiband VRT.
+
+    Args:
+        band_files: Dictionary mapping logical band names to files
+        stem: Base name of the VRT (and of the outputs computed from it)
+        resolution: Pixel size of the VRT grid. Finest band grid by default.
+
+    Yields:
+        ``/vsimem`` path of the VRT, valid inside the context
+    """
+    stem = stem or _stack_stem(band_files)
+    xml = build_vrt(band_files, resolution)
+    with MemoryFile(xml.encode(), filename=f"{stem}.vrt") as memfile:
+        logger.info(
+            f"🧬 Pila virtual de {len(band_files)} bandas: {', '.join(band_files)}"
+        )
+        yield Path(memfile.name)
+
+
+def scene_stem(image_path: Path, band_files: Optional[Dict[str, Path]] = None) -> str:
+    """Base name of the outputs computed from a scene (see ``scene_input``)."""
+    if band_files and not image_path.is_dir():
+        return _stack_stem(band_files)
+    return image_path.stem
+
+
+@contextmanager
+def scene_input(
+    image_path: Path,
+    band_files: Optional[Dict[str, Path]] = None,
+    sensor: Optional[str] = None,
+    resolution: Optional[float] = None,
+    bands: Iterable[str] = STACK_BANDS,
+) -> Iterator[Path]:
+    """Resolves the image to process: a multiband file or a virtual stack.
+
+    Args:
+        image_path: Multiband image or product directory with per-band files
+        band_files: Explicit band files (take precedence over ``image_path``)
+        sensor: Sensor profile of a product directory
+        resolution: Target pixel size of a virtual stack
+        bands: Logical bands to stack from a product directory
+
+    Yields:
+        Path of a dataset readable by the index engine
+    """
+    if band_files is None and image_path.is_dir():
+        band_files = find_band_files(image_path, sensor, bands, resolution)
+    if not band_files:
+        yield image_path
+        return
+    with virtual_stack(
+        band_files, scene_stem(image_path, band_files), resolution
+    ) as vrt:
+        yield vrt
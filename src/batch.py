@@ -0,0 +1,199 @@
+"""Batch processing of many scenes for PASCAL NDVI Block.
+
+Collects scenes from a directory, glob pattern or manifest file and processes
+them concurrently on a bounded worker pool. Failed scenes, and scenes
+rejected by the pre-flight or cloud checks, are recorded and skipped without
+aborting the run, and a single summary is written at the end for ISO 42001
+traceability.
+"""
+
+import csv
+from collections import Counter
+import glob
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from .pipeline import process_scene
+from .preprocessor import SceneRejected
+from .tiling import map_ordered
+
+# Extensiones de imagen reconocidas al recorrer directorios
+IMAGE_EXTENSIONS = (".tif", ".tiff")
+
+Scene = Tuple[Path, Optional[Path]]
+
+
+def _read_manifest(manifest: Path) -> List[Scene]:
+    """Reads a manifest of images with optional per-image shapefiles.
+
+    JSON manifests are a list of paths or of ``{"image": ..., "shapefile": ...}``
+    objects. Text/CSV manifests have one ``image[,shapefile]`` entry per line.
+    Relative paths are resolved against the manifest directory.
+    """
+    base = manifest.parent
+
+    def resolve(value: Optional[str]) -> Optional[Path]:
+        if not value:
+            return None
+        path = Path(value.strip())
+        return path if path.is_absolute() else base / path
+
+    scenes: List[Scene] = []
+    if manifest.suffix.lower() == ".json":
+        for entry in json.loads(manifest.read_text()):
+            if isinstance(entry, str):
+                entry = {"image": entry}
+            image = resolve(entry["image"])
+            if image is not None:
+                scenes.append((image, resolve(entry.get("shapefile"))))
+        return scenes
+
+    with open(manifest, newline="") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                continue
+            image = resolve(row[0])
+            if image is not None:
+                scenes.append((image, resolve(row[1]) if len(row) > 1 else None))
+    return scenes
+
+
+def collect_scenes(source: str, shapefile: Optional[Path] = None) -> List[Scene]:
+    """Builds the list of scenes to process.
+
+    Args:
+        source: Directory of images, glob pattern or manifest file
+            (.json, .csv or .txt)
+        shapefile: Shapefile applied to every scene without its own
+
+    Returns:
+        List of (image, shapefile) tuples in a deterministic order
+    """
+    path = Path(source)
+    if path.is_dir():
+        images = sorted(
+            p for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS
+        )
+        scenes: List[Scene] = [(p, None) for p in images]
+    elif path.is_file() and path.suffix.lower() not in IMAGE_EXTENSIONS:
+        scenes = _read_manifest(path)
+    else:
+        scenes = [(Path(p), None) for p in sorted(glob.glob(source))]
+
+    return [(image, shp or shapefile) for image, shp in scenes]
+
+
+def _output_names(scenes: Sequence[Scene]) -> List[str]:
+    """Output directory name of every scene: its image stem, made unique.
+
+    Scenes sharing a stem (same file name in different directories, or the
+    same image listed twice) are prefixed with their parent directory name,
+    and with their position if that is not enough.
+    """
+    counts = Counter(image.stem for image, _ in scenes)
+    taken = {stem for stem, n in counts.items() if n == 1}
+    names: List[str] = []
+    for position, (image, _) in enumerate(scenes):
+        name = image.stem
+        if counts[name] > 1:
+            name = f"{image.parent.name}_{name}"
+            if name in taken:
+                name = f"{name}_{position}"
+            taken.add(name)
+        names.append(name)
+    repeated = sorted(stem for stem, n in counts.items() if n > 1)
+    if repeated:
+        logger.warning(
+            f"⚠️ Escenas con el mismo nombre: {', '.join(repeated)}. "
+            "Sus resultados se guardan en directorios distintos"
+        )
+    return names
+
+
+def _run_scene(
+    scene: Scene, output_dir: Path, options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Processes one scene into ``output_dir`` and records its outcome."""
+    image, shapefile = scene
+    record: Dict[str, Any] = {
+        "image": str(image),
+        "shapefile": str(shapefile) if shapefile else None,
+        "output_dir": str(output_dir),
+    }
+    start = time.perf_counter()
+    try:
+        outputs = process_scene(image, output_dir, shapefile, **options)
+        if not outputs:
+            raise RuntimeError("No se generó ningún índice")
+        record["status"] = "ok"
+        record["outputs"] = {name: str(p) for name, p in outputs.items()}
+    except SceneRejected as e:
+        logger.warning(f"⏭️ {image} omitida: {e}")
+        record["status"] = "rejected"
+        record["error"] = str(e)
+    except Exception as e:
+        logger.error(f"❌ Error procesando {image}: {e}")
+        record["status"] = "failed"
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_batch(
+    scenes: Sequence[Scene],
+    output_dir: Path,
+    workers: int = 1,
+    **options: Any,
+) -> Dict[str, Any]:
+    """Processes many scenes concurrently and writes a single summary.
+
+    Scenes are scheduled on a thread pool with a bounded number of scenes in
+    flight. Each scene's results go to ``output_dir/<image stem>/`` (prefixed
+    with the parent directory name when several scenes share a stem).
+
+    Args:
+        scenes: Sequence of (image, shapefile) tuples
+        output_dir: Root directory to save results
+        workers: Number of scenes processed concurrently
+        **options: Execution options forwarded to the index engine
+
+    Returns:
+        Summary dictionary, also written to ``batch_summary.json``
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(f"📦 Procesando {len(scenes)} escenas con {workers} trabajador(es)")
+
+    start = time.perf_counter()
+    jobs = list(zip(scenes, _output_names(scenes)))
+    records = []
+    for _, record in map_ordered(
+        lambda job: _run_scene(job[0], output_dir / job[1], options), jobs, workers
+    ):
+        records.append(record)
+    elapsed = time.perf_counter() - start
+
+    succeeded = sum(1 for r in records if r["status"] == "ok")
+    rejected = sum(1 for r in records if r["status"] == "rejected")
+    summary = {
+        "timestamp": datetime.now().isoformat(),
+        "total": len(records),
+        "succeeded": succeeded,
+        "rejected": rejected,
+        "failed": len(records) - succeeded - rejected,
+        "seconds": round(elapsed, 3),
+        "scenes_per_hour": round(len(records) * 3600 / elapsed, 1) if elapsed else None,
+        "scenes": records,
+    }
+
+    summary_file = output_dir / "batch_summary.json"
+    summary_file.write_text(json.dumps(summary, indent=2, ensure_ascii=False))
+    logger.success(
+        f"🏁 Lote completo: {succeeded}/{len(records)} escenas correctas. "
+        f"Resumen en {summary_file}"
+    )
+    return summary
@@ -0,0 +1,216 @@
+"""Content-addressed cache of processing results.
+
+Results are stored under a key derived from a fingerprint of the input image
+(size, modification time and a hash of its header), the clipping shapefile,
+the processing parameters and the code version. Re-running an unchanged
+scene restores the cached outputs instead of recomputing them. The cache is
+bounded in size and evicts the least recently used entries first.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from loguru import logger
+
+from .config import CACHE_MAX_SIZE_GB, DEFAULT_CACHE_DIR
+from .logging_config import calculate_hash
+
+# Bytes iniciales de la imagen incluidos en la huella rápida (cabecera)
+HEADER_BYTES = 64 * 1024
+# Archivos que componen un shapefile
+SHAPEFILE_PARTS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+ENTRY_FILE = "entry.json"
+
+_lock = threading.Lock()
+
+
+def default_cache_dir() -> Path:
+    """Cache directory, overridable with the ``PASCAL_CACHE_DIR`` variable."""
+    return Path(os.getenv("PASCAL_CACHE_DIR", str(DEFAULT_CACHE_DIR)))
+
+
+def file_fingerprint(path: Path, full_hash: bool = False) -> str:
+    """Computes a fingerprint of a file.
+
+    The fast fingerprint combines size, modification time and a SHA-256 of
+    the first ``HEADER_BYTES``; ``full_hash`` hashes the whole content with
+    ``calculate_hash`` instead.
+    """
+    if full_hash:
+        return calculate_hash(path)
+    stat = path.stat()
+    with open(path, "rb") as f:
+        header = hashlib.sha256(f.read(HEADER_BYTES)).hexdigest()
+    return f"{stat.st_size}-{stat.st_mtime_ns}-{header}"
+
+
+def shapefile_fingerprint(shapefile_path: Path) -> str:
+    """Hashes the content of every component file of a shapefile."""
+    digest = hashlib.sha256()
+    for suffix in SHAPEFILE_PARTS:
+        part = shapefile_path.with_suffix(suffix)
+        if part.exists():
+            digest.update(suffix.encode())
+            digest.update(calculate_hash(part).encode())
+    return digest.hexdigest()
+
+
+def _code_version() -> str:
+    from . import __version__
+
+    return __version__
+
+
+def _copy(source: Path, target: Path) -> None:
+    """Hard-links a file when possible, copying it otherwise."""
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class ResultCache:
+    """Size-bounded LRU cache of output files keyed by input content.
+
+    Args:
+        cache_dir: Directory holding the cache entries
+        max_size_gb: Maximum total size before evicting old entries
+        full_hash: Hash the whole input image instead of a fast fingerprint
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        max_size_gb: float = CACHE_MAX_SIZE_GB,
+        full_hash: bool = False,
+    ) -> None:
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = int(max_size_gb * 1024**3)
+        self.full_hash = full_hash
+
+    def key(
+        self,
+        image_path: Union[Path, Dict[str, Path]],
+        shapefile_path: Optional[Path] = None,
+        quality_file: Optional[Path] = None,
+        **params: Any,
+    ) -> str:
+        """Builds the cache key of a processing request.
+
+        Args:
+            image_path: Input image, or mapping of band names to per-band
+                files
+            shapefile_path: Optional clipping shapefile
+            quality_file: Optional separate SCL or QA_PIXEL file
+            **params: Parameters that change the outputs (indices, SAVI L,
+                output profile...)
+
+        Returns:
+            Hexadecimal key
+        """
+        # Huella de la imagen, o de cada archivo por banda
+        fingerprint: Union[str, Dict[str, str]]
+        if isinstance(image_path, dict):
+            fingerprint = {
+                name: file_fingerprint(path, self.full_hash)
+                for name, path in image_path.items()
+            }
+        else:
+            fingerprint = file_fingerprint(image_path, self.full_hash)
+        payload = {
+            "image": fingerprint,
+            "shapefile": (
+                shapefile_fingerprint(shapefile_path) if shapefile_path else None
+            ),
+            "quality": (
+                file_fingerprint(quality_file, self.full_hash) if quality_file else None
+            ),
+            "params": {k: params[k] for k in sorted(params)},
+            "version": _code_version(),
+        }
+        text = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key: str, output_dir: Path) -> Optional[Dict[str, Path]]:
+        """Restores a cached result into ``output_dir``.
+
+        Returns:
+            Mapping of result names to restored files, or None on a miss
+        """
+        entry_dir = self.cache_dir / key
+        entry_file = entry_dir / ENTRY_FILE
+        try:
+            entry = json.loads(entry_file.read_text())
+        except (OSError, ValueError):
+            return None
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        results = {}
+        for name, filename in entry["outputs"].items():
+            cached = entry_dir / filename
+            if not cached.exists():
+                return None
+            target = output_dir / filename
+            _copy(cached, target)
+            results[name] = target
+
+        # Actualizar último acceso para el orden LRU
+        entry["last_access"] = time.time()
+        entry_file.write_text(json.dumps(entry))
+        return results
+
+    def put(self, key: str, results: Dict[str, Path]) -> None:
+        """Stores the files of a result and evicts old entries if needed."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = self.cache_dir / f".{key}.{uuid.uuid4().hex}"
+        staging.mkdir()
+
+        size = 0
+        outputs: Dict[str, str] = {}
+        for name, path in results.items():
+            if path.name not in outputs.values():
+                _copy(path, staging / path.name)
+                size += path.stat().st_size
+            outputs[name] = path.name
+
+        now = time.time()
+        entry = {"outputs": outputs, "size": size, "created": now, "last_access": now}
+        (staging / ENTRY_FILE).write_text(json.dumps(entry))
+
+        with _lock:
+            entry_dir = self.cache_dir / key
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir)
+            os.replace(staging, entry_dir)
+            self._evict(key, size)
+
+    def _evict(self, keep: str, keep_size: int) -> None:
+        """Removes least recently used entries until the size limit is met.
+
+        The entry ``keep`` (the one just stored) is never removed.
+        """
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            if entry_dir.name == keep:
+                continue
+            try:
+                entry = json.loads((entry_dir / ENTRY_FILE).read_text())
+            except (OSError, ValueError):
+                continue
+            entries.append((entry["last_access"], entry["size"], entry_dir))
+
+        total = keep_size + sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            logger.debug(f"Entrada de caché eliminada: {entry_dir.name}")
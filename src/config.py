@@ -5,7 +5,7 @@ for configuration management and security.
 """
 
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, TypedDict
 
 # Directorios por defecto
 DEFAULT_OUTPUT_DIR = Path("results")
@@ -14,23 +14,151 @@ DEFAULT_LOG_DIR = DEFAULT_OUTPUT_DIR / "logs"
 DEFAULT_BACKUP_DIR = DEFAULT_LOG_DIR / "backup"
 
 # Parámetros de índices vegetativos
-VALID_INDICES = ["ndvi", "savi", "ndre"]
 DEFAULT_SAVI_L = 0.5  # Factor L por defecto para SAVI
 VALID_L_RANGE = (0.0, 1.0)  # Rango válido para factor L
 
+# Registro de índices: expresiones de álgebra de bandas sobre bandas lógicas
+# (resueltas por identify_bands) con reflectancias en escala 0-1. Los nombres
+# declarados en "params" son parámetros con su valor por defecto; un factor
+# "L" forma parte del nombre del resultado (savi_0.5). Para añadir un índice
+# basta con una entrada nueva.
+INDEX_EXPRESSIONS: Dict[str, Dict[str, Any]] = {
+    "ndvi": {"expression": "(nir - red) / (nir + red)"},
+    "savi": {
+        "expression": "(nir - red) / (nir + red + L) * (1 + L)",
+        "params": {"L": DEFAULT_SAVI_L},
+    },
+    "ndre": {"expression": "(nir - red_edge1) / (nir + red_edge1)"},
+    "evi": {"expression": "2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 1)"},
+    "gndvi": {"expression": "(nir - green) / (nir + green)"},
+    "ndwi": {"expression": "(green - nir) / (green + nir)"},
+    "nbr": {"expression": "(nir - swir2) / (nir + swir2)"},
+    "msavi2": {
+        "expression": "(2 * nir + 1 - sqrt((2 * nir + 1) ** 2 - 8 * (nir - red))) / 2"
+    },
+}
+VALID_INDICES = list(INDEX_EXPRESSIONS)
+# Índices calculados cuando no se indica ninguno
+DEFAULT_INDICES = ["ndvi", "savi", "ndre"]
+
 # Límites de seguridad
-MAX_IMAGE_SIZE_GB = 10.0
+MAX_IMAGE_SIZE_GB = 10.0  # Tamaño máximo sin comprimir de los datos a leer por escena
 MAX_CLOUD_COVERAGE = 50.0  # Porcentaje máximo de nubes permitido
 
+# Bandas de calidad: clases SCL de Sentinel-2 y bits de QA_PIXEL de Landsat
+# que marcan nubes o sombras (enmascaradas) y píxeles sin dato (excluidos del
+# porcentaje de nubosidad)
+QUALITY_BANDS: Dict[str, Dict[str, Any]] = {
+    "scl": {"cloud_values": [3, 8, 9, 10], "nodata_values": [0]},
+    "qa_pixel": {"cloud_bits": [1, 2, 3, 4], "nodata_bits": [0]},
+}
+QUALITY_PREVIEW_SIZE = 1024  # Lado máximo de la lectura reducida para la nubosidad
+
+# Procesamiento por ventanas (streaming)
+DEFAULT_MEMORY_BUDGET_MB = 256.0  # Memoria máxima por ventana en modo streaming
+DEFAULT_WORKERS = 1  # Hilos de cálculo por imagen
+DEFAULT_BATCH_WORKERS = 4  # Escenas procesadas en paralelo en modo batch
+
+# Perfiles de salida (disposición, compresión y overviews de los GeoTIFF)
+OUTPUT_PROFILES = ["default", "tiled", "cog"]
+DEFAULT_OUTPUT_PROFILE = (
+    "default"  # GeoTIFF simple a partir de los metadatos de entrada
+)
+COMPRESSIONS = ["deflate", "zstd", "lerc", "none"]
+DEFAULT_COMPRESSION = "deflate"
+OUTPUT_BLOCK_SIZE = 512  # Tamaño de bloque de los perfiles tiled y cog
+
+# Caché de resultados (sobrescribible con la variable PASCAL_CACHE_DIR)
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "pascal_ndvi"
+CACHE_MAX_SIZE_GB = 20.0  # Tamaño máximo antes de eliminar entradas (LRU)
+
 # Configuración de logging
 LOG_RETENTION_DAYS = 90
 LOG_FORMAT = "[{time:YYYY-MM-DD HH:mm:ss.SSS}] {level: <8} | {message}"
 
-# Tipos de imágenes soportadas
-SUPPORTED_SATELLITES = {
-    "sentinel2": {"red_band": "B04", "nir_band": "B08", "resolution": 10},
-    "landsat8": {"red_band": "B4", "nir_band": "B5", "resolution": 30},
+
+# Tipos de imágenes soportadas (perfiles de sensor). Para añadir un sensor basta
+# con una entrada nueva: "bands" asocia bandas lógicas con los nombres del
+# sensor (descripciones de banda o sufijos de archivos por banda),
+# "positions" con su número de banda en un apilado completo de al menos
+# "min_count" bandas y "product_pattern" reconoce los nombres de sus productos.
+class SensorProfile(TypedDict, total=False):
+    """Configuration entry of a sensor profile."""
+
+    red_band: str
+    nir_band: str
+    resolution: int
+    product_pattern: str
+    bands: Dict[str, str]
+    min_count: int
+    positions: Dict[str, int]
+
+
+SUPPORTED_SATELLITES: Dict[str, SensorProfile] = {
+    "sentinel2": {
+        "red_band": "B04",
+        "nir_band": "B08",
+        "resolution": 10,
+        "product_pattern": r"^(S2[A-D]_|T\d{2}[A-Z]{3}_)",
+        "bands": {
+            "blue": "B02",
+            "green": "B03",
+            "red": "B04",
+            "red_edge1": "B05",
+            "nir": "B08",
+            "swir1": "B11",
+            "swir2": "B12",
+            "scl": "SCL",
+        },
+        "min_count": 12,
+        "positions": {
+            "blue": 2,
+            "green": 3,
+            "red": 4,
+            "red_edge1": 5,
+            "nir": 8,
+            "swir1": 11,
+            "swir2": 12,
+        },
+    },
+    "landsat8": {
+        "red_band": "B4",
+        "nir_band": "B5",
+        "resolution": 30,
+        "product_pattern": r"^L[COTE]0[89]_",
+        "bands": {
+            "blue": "B2",
+            "green": "B3",
+            "red": "B4",
+            "nir": "B5",
+            "swir1": "B6",
+            "swir2": "B7",
+            "qa_pixel": "QA_PIXEL",
+        },
+        "min_count": 7,
+        "positions": {
+            "blue": 2,
+            "green": 3,
+            "red": 4,
+            "nir": 5,
+            "swir1": 6,
+            "swir2": 7,
+        },
+    },
+}
+
+# Rangos de longitud de onda (nm) de las bandas lógicas, en orden de prioridad
+BAND_WAVELENGTHS = {
+    "red": (630, 690),
+    "nir": (760, 900),
+    "green": (520, 600),
+    "blue": (450, 520),
+    "red_edge1": (690, 730),
+    "swir1": (1550, 1750),
+    "swir2": (2080, 2350),
 }
+# Orden de bandas supuesto para imágenes sin metadatos ni perfil de sensor
+GENERIC_BAND_ORDER = ("red", "nir", "green", "blue")
 
 
 def get_config() -> Dict[str, Any]:
@@ -56,8 +184,19 @@ def get_config() -> Dict[str, Any]:
                 "l_range": VALID_L_RANGE,
             },
         },
+        "index_expressions": INDEX_EXPRESSIONS,
+        "default_indices": DEFAULT_INDICES,
         "satellites": SUPPORTED_SATELLITES,
+        "band_wavelengths": BAND_WAVELENGTHS,
         "max_image_size": MAX_IMAGE_SIZE_GB,
         "max_cloud_coverage": MAX_CLOUD_COVERAGE,
+        "quality_bands": QUALITY_BANDS,
+        "memory_budget_mb": DEFAULT_MEMORY_BUDGET_MB,
+        "workers": DEFAULT_WORKERS,
+        "batch_workers": DEFAULT_BATCH_WORKERS,
+        "output_profile": DEFAULT_OUTPUT_PROFILE,
+        "compression": DEFAULT_COMPRESSION,
+        "cache_dir": DEFAULT_CACHE_DIR,
+        "cache_max_size": CACHE_MAX_SIZE_GB,
         "log_retention": LOG_RETENTION_DAYS,
     }
@@ -0,0 +1,401 @@
+"""Band-math expressions and the index registry of PASCAL NDVI Block.
+
+Every index is declared as an arithmetic expression over logical band names
+(``nir``, ``red``, ``swir2``...) resolved by ``identify_bands``, plus optional
+parameters such as the SAVI soil factor ``L``. The built-in indices come from
+``config.INDEX_EXPRESSIONS``; customer formulas are registered with
+``register_index`` or passed per run.
+
+The expressions of a run are compiled once into a single evaluation plan:
+a flat list of float32 ufunc steps in which identical subexpressions (for
+example ``nir - red`` and ``nir + red`` shared by NDVI, SAVI and MSAVI2) are
+computed only once per window. Intermediate buffers are reused as soon as no
+later step needs them.
+"""
+
+import ast
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    BAND_WAVELENGTHS,
+    INDEX_EXPRESSIONS,
+    QUALITY_BANDS,
+    SUPPORTED_SATELLITES,
+)
+
+# Operadores y funciones admitidos en las expresiones
+_BINARY = {
+    ast.Add: "add",
+    ast.Sub: "subtract",
+    ast.Mult: "multiply",
+    ast.Div: "divide",
+    ast.Pow: "power",
+}
+_FUNCTIONS = {
+    "sqrt": ("sqrt", 1),
+    "abs": ("absolute", 1),
+    "log": ("log", 1),
+    "exp": ("exp", 1),
+    "min": ("minimum", 2),
+    "max": ("maximum", 2),
+}
+# Divisiones: "divide_positive" invalida denominadores no positivos, "divide"
+# solo la división por cero
+_DIVISIONS = ("divide", "divide_positive")
+# Operaciones conmutativas: sus operandos se ordenan para reconocer a + b == b + a
+_COMMUTATIVE = {"add", "multiply", "minimum", "maximum"}
+
+# Nodo del plan: ("band", nombre), ("const", valor) u (operación, *operandos)
+Node = Tuple[Any, ...]
+
+
+def _parse(expression: str) -> ast.expr:
+    try:
+        return ast.parse(expression, mode="eval").body
+    except SyntaxError as e:
+        raise ValueError(f"Expresión inválida: {expression} ({e.msg})") from None
+
+
+def _names(tree: ast.expr) -> List[str]:
+    """Variable names of an expression (not function names), in order."""
+    functions = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    names: List[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and id(node) not in functions:
+            if node.id not in names:
+                names.append(node.id)
+    return names
+
+
+@dataclass
+class IndexDefinition:
+    """An index declared as a band-math expression.
+
+    Attributes:
+        name: Index name
+        expression: Arithmetic expression over logical band names and
+            parameters (``+ - * / **``, ``sqrt``, ``abs``, ``log``, ``exp``,
+            ``min``, ``max``)
+        params: Parameter values; every other name is a band
+        positive_denominators: Treat non-positive denominators as invalid
+            (NaN), as the built-in normalized indices do. Otherwise only
+            divisions by zero are invalid.
+    """
+
+    name: str
+    expression: str
+    params: Dict[str, float] = field(default_factory=dict)
+    positive_denominators: bool = False
+
+    @property
+    def bands(self) -> Tuple[str, ...]:
+        """Logical bands read by the index."""
+        names = _names(_parse(self.expression))
+        return tuple(n for n in names if n not in self.params)
+
+    def with_params(self, **params: float) -> "IndexDefinition":
+        """Copy of the definition with some parameters replaced."""
+        return IndexDefinition(
+            self.name,
+            self.expression,
+            {**self.params, **params},
+            self.positive_denominators,
+        )
+
+
+class _Compiler:
+    """Builds the node list of a plan, merging identical subexpressions."""
+
+    def __init__(self) -> None:
+        self.nodes: List[Node] = []
+        self._ids: Dict[Node, int] = {}
+
+    def add(self, node: Node) -> int:
+        if node[0] in _COMMUTATIVE:
+            node = (node[0], *sorted(node[1:]))
+        if node not in self._ids:
+            self._ids[node] = len(self.nodes)
+            self.nodes.append(node)
+        return self._ids[node]
+
+    def _operation(self, op: str, operands: List[int]) -> int:
+        # Plegado de constantes: (1 + L) se calcula una sola vez al compilar
+        if all(self.nodes[i][0] == "const" for i in operands):
+            values = [np.float64(self.nodes[i][1]) for i in operands]
+            with np.errstate(all="ignore"):
+                if op in _DIVISIONS:
+                    valid = _valid_denominator(values[1], op == "divide_positive")
+                    value = values[0] / values[1] if valid else np.nan
+                else:
+                    value = getattr(np, op)(*values)
+            return self.add(("const", float(value)))
+        return self.add((op, *operands))
+
+    def visit(
+        self, node: ast.expr, params: Dict[str, float], positive: bool = False
+    ) -> int:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return self.add(("const", float(node.value)))
+        if isinstance(node, ast.Name):
+            if node.id in params:
+                return self.add(("const", float(params[node.id])))
+            return self.add(("band", node.id))
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+            operands = [
+                self.visit(node.left, params, positive),
+                self.visit(node.right, params, positive),
+            ]
+            op = _BINARY[type(node.op)]
+            if op == "divide" and positive:
+                op = "divide_positive"
+            return self._operation(op, operands)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self.visit(node.operand, params, positive)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+            return self._operation("negative", [operand])
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in _FUNCTIONS
+            and not node.keywords
+        ):
+            op, arity = _FUNCTIONS[node.func.id]
+            if len(node.args) != arity:
+                raise ValueError(f"{node.func.id} requiere {arity} argumento(s)")
+            return self._operation(
+                op, [self.visit(a, params, positive) for a in node.args]
+            )
+        raise ValueError(f"Elemento no soportado en la expresión: {ast.dump(node)}")
+
+
+class EvaluationPlan:
+    """Compiled evaluation of several index expressions.
+
+    Args:
+        nodes: Plan steps in evaluation order
+        outputs: Mapping of result keys to the node holding their value
+        index_bands: Mapping of result keys to the bands they read
+    """
+
+    def __init__(
+        self,
+        nodes: List[Node],
+        outputs: Dict[str, int],
+        index_bands: Dict[str, Tuple[str, ...]],
+    ) -> None:
+        self.nodes = nodes
+        self.outputs = outputs
+        self.index_bands = index_bands
+        self.bands = sorted({b for bands in index_bands.values() for b in bands})
+
+        # Último paso que usa cada nodo: a partir de ahí su búfer se reutiliza
+        self._last_use: Dict[int, int] = {}
+        for i, node in enumerate(nodes):
+            if node[0] not in ("band", "const"):
+                for operand in node[1:]:
+                    self._last_use[operand] = i
+        self._results = set(outputs.values())
+
+        # Búferes float32 intermedios vivos a la vez (para el presupuesto de memoria)
+        live = peak = 0
+        for i, node in enumerate(nodes):
+            if node[0] in ("band", "const"):
+                continue
+            if i not in self._results:
+                live += 1
+                peak = max(peak, live)
+            live -= sum(
+                1
+                for j in set(node[1:])
+                if self._last_use.get(j) == i and self._releasable(j)
+            )
+        self.scratch_buffers = peak + 1
+
+    def _releasable(self, i: int) -> bool:
+        return self.nodes[i][0] not in ("band", "const") and i not in self._results
+
+    @property
+    def steps(self) -> int:
+        """Number of array operations evaluated per window."""
+        return sum(1 for node in self.nodes if node[0] not in ("band", "const"))
+
+    def evaluate(
+        self,
+        data: Dict[str, np.ndarray],
+        masks: Optional[Dict[str, Optional[np.ndarray]]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Evaluates every expression on float32 band arrays.
+
+        Divisions by zero (by a non-positive denominator for definitions with
+        ``positive_denominators``), non-finite quotients and pixels outside
+        the mask of an index are set to NaN.
+
+        Args:
+            data: Mapping of band names to float32 arrays of the same shape
+            masks: Optional mapping of result keys to validity masks
+
+        Returns:
+            Mapping of result keys to float32 arrays (one allocation each)
+        """
+        shape = next(iter(data.values())).shape
+        values: Dict[int, Any] = {}
+        pool: List[np.ndarray] = []
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            for i, node in enumerate(self.nodes):
+                op = node[0]
+                if op == "band":
+                    values[i] = data[node[1]]
+                    continue
+                if op == "const":
+                    values[i] = np.float32(node[1])
+                    continue
+                if i in self._results or not pool:
+                    out = np.empty(shape, dtype=np.float32)
+                else:
+                    out = pool.pop()
+                args = [values[j] for j in node[1:]]
+                if op in _DIVISIONS:
+                    _divide(args[0], args[1], out, op == "divide_positive")
+                else:
+                    getattr(np, op)(*args, out=out)
+                values[i] = out
+                for j in set(node[1:]):
+                    if self._last_use.get(j) == i and self._releasable(j):
+                        pool.append(values.pop(j))
+
+        results = {}
+        for key, i in self.outputs.items():
+            value = values[i]
+            if self.nodes[i][0] in ("band", "const"):
+                value = np.array(np.broadcast_to(value, shape), dtype=np.float32)
+            mask = masks.get(key) if masks else None
+            if mask is not None:
+                value[~mask] = np.nan
+            results[key] = value
+        return results
+
+
+def _valid_denominator(b: Any, positive: bool) -> Any:
+    """Whether a denominator is valid: positive, or only non-zero."""
+    return b > 0 if positive else b != 0
+
+
+def _divide(a: Any, b: Any, out: np.ndarray, positive: bool = False) -> None:
+    """Float32 division writing NaN for invalid denominators.
+
+    With ``positive`` a non-positive denominator is invalid; otherwise only
+    zero is, and non-finite quotients (overflow) are also set to NaN.
+    """
+    if not isinstance(b, np.ndarray):
+        np.divide(a, b, out=out)
+        if not _valid_denominator(b, positive):
+            out[...] = np.nan
+    else:
+        valid = _valid_denominator(b, positive)
+        np.divide(a, b, out=out, where=valid)
+        out[~valid] = np.nan
+    if not positive:
+        out[~np.isfinite(out)] = np.nan
+
+
+def compile_indices(definitions: Dict[str, IndexDefinition]) -> EvaluationPlan:
+    """Compiles index definitions into one shared evaluation plan.
+
+    Args:
+        definitions: Mapping of result keys to index definitions
+
+    Returns:
+        EvaluationPlan computing every definition
+    """
+    compiler = _Compiler()
+    outputs = {
+        key: compiler.visit(_parse(d.expression), d.params, d.positive_denominators)
+        for key, d in definitions.items()
+    }
+    index_bands = {key: d.bands for key, d in definitions.items()}
+    return EvaluationPlan(compiler.nodes, outputs, index_bands)
+
+
+def _builtin_registry() -> Dict[str, IndexDefinition]:
+    # Los índices normalizados solo son válidos con denominador positivo
+    return {
+        name: IndexDefinition(
+            name, spec["expression"], dict(spec.get("params", {})), True
+        )
+        for name, spec in INDEX_EXPRESSIONS.items()
+    }
+
+
+INDEX_REGISTRY: Dict[str, IndexDefinition] = _builtin_registry()
+
+
+def register_index(
+    name: str, expression: str, *, positive_denominators: bool = False, **params: float
+) -> IndexDefinition:
+    """Registers (or replaces) an index available to every run.
+
+    Args:
+        name: Index name
+        expression: Band-math expression over logical band names
+        positive_denominators: Treat non-positive denominators as invalid
+        **params: Default values of the expression parameters
+
+    Returns:
+        The registered definition
+    """
+    definition = IndexDefinition(
+        name.strip().lower(), expression, params, positive_denominators
+    )
+    compile_indices({definition.name: definition})
+    INDEX_REGISTRY[definition.name] = definition
+    return definition
+
+
+def get_index(
+    name: str, formulas: Optional[Dict[str, str]] = None
+) -> Optional[IndexDefinition]:
+    """Looks up an index in the run formulas and then in the registry."""
+    if formulas and name in formulas:
+        return IndexDefinition(name, formulas[name])
+    return INDEX_REGISTRY.get(name)
+
+
+def known_bands() -> List[str]:
+    """Logical band names an image can be resolved to (see ``identify_bands``)."""
+    names = list(BAND_WAVELENGTHS)
+    for profile in SUPPORTED_SATELLITES.values():
+        names += [
+            b
+            for b in profile.get("bands", {})
+            if b not in names and b not in QUALITY_BANDS
+        ]
+    return names
+
+
+def parse_formulas(specs: Iterable[str]) -> Dict[str, str]:
+    """Parses ``name=expression`` formulas from the command line.
+
+    Raises:
+        ValueError: If a formula is malformed or reads an unknown band
+    """
+    formulas = {}
+    bands = known_bands()
+    for spec in specs:
+        name, sep, expression = spec.partition("=")
+        name = name.strip().lower()
+        if not sep or not name.isidentifier() or not expression.strip():
+            raise ValueError(f"Fórmula inválida: {spec} (use nombre=expresión)")
+        definition = IndexDefinition(name, expression.strip())
+        compile_indices({name: definition})
+        unknown = [b for b in definition.bands if b not in bands]
+        if unknown:
+            raise ValueError(
+                f"Banda desconocida en la fórmula {name}: {', '.join(unknown)} "
+                f"(disponibles: {', '.join(bands)})"
+            )
+        formulas[name] = definition.expression
+    return formulas
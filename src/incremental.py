@@ -0,0 +1,111 @@
+"""Per-window input checksums for incremental reprocessing.
+
+A run in incremental mode stores, next to its outputs, a checksum of the
+input pixels of every processing window. When the image is later updated in
+one region (for example a new acquisition patched into a mosaic), the next
+run compares the checksums and only recomputes and rewrites the windows whose
+input changed, updating the existing output files in place.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+from rasterio.windows import Window
+
+# Sufijo del archivo de sumas de control junto a las salidas
+CHECKSUMS_SUFFIX = "_windows.json"
+
+
+def window_key(window: Window) -> str:
+    """Identifies a window by its offsets and size."""
+    return (
+        f"{int(window.col_off)},{int(window.row_off)},"
+        f"{int(window.width)},{int(window.height)}"
+    )
+
+
+def window_checksum(arrays: Iterable[Optional[np.ndarray]]) -> str:
+    """Hashes the input arrays (bands and masks) of one window."""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        if array is None:
+            digest.update(b"-")
+            continue
+        digest.update(f"{array.dtype}{array.shape}".encode())
+        digest.update(np.ascontiguousarray(array).data)
+    return digest.hexdigest()
+
+
+def _output_state(path: Path) -> str:
+    stat = path.stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def load_checksums(
+    path: Path, params: Dict[str, Any], outputs: Dict[str, Path]
+) -> Optional[Dict[str, str]]:
+    """Loads the window checksums of a previous run.
+
+    The checksums are only usable when the previous run had the same
+    parameters and its output files are still the ones it wrote (they were
+    not replaced by another run or restored from the cache since).
+
+    Args:
+        path: Checksums file
+        params: Parameters of the current run
+        outputs: Output files of the current run
+
+    Returns:
+        Mapping of window keys to checksums, or None when the outputs must be
+        fully recomputed
+    """
+    try:
+        state = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    if state.get("params") != json.loads(json.dumps(params, default=str)):
+        return None
+    try:
+        written = {name: _output_state(p) for name, p in outputs.items()}
+    except OSError:
+        return None
+    if state.get("outputs") != written:
+        return None
+    windows: Dict[str, str] = state["windows"]
+    return windows
+
+
+def save_checksums(
+    path: Path,
+    params: Dict[str, Any],
+    outputs: Dict[str, Path],
+    checksums: Dict[str, str],
+) -> Path:
+    """Writes the window checksums of a finished run next to its outputs."""
+    state = {
+        "params": params,
+        "outputs": {name: _output_state(p) for name, p in outputs.items()},
+        "windows": checksums,
+    }
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(state, default=str))
+    os.replace(tmp, path)
+    return path
+
+
+def detach_file(path: Path) -> None:
+    """Gives a hard-linked file its own copy before updating it in place.
+
+    Outputs restored from or stored in the result cache share their data with
+    the cache entry; writing to them directly would corrupt the entry.
+    """
+    if path.stat().st_nlink <= 1:
+        return
+    tmp = path.with_name(f".{path.name}.tmp")
+    shutil.copy2(path, tmp)
+    os.replace(tmp, path)
@@ -4,167 +4,761 @@ Compatible with Sentinel-2 and Landsat imagery. Provides automated band detectio
 and standardized index calculations following ISO 42001 requirements.
 """
 
+import math
+import threading
 import numpy as np
 import rasterio
+from affine import Affine
+from contextlib import ExitStack
+from dataclasses import dataclass, field
 from pathlib import Path
 from loguru import logger
-from typing import Dict
-from .config import DEFAULT_SAVI_L
-
+from rasterio.enums import MaskFlags, Resampling
+from rasterio.windows import Window
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from .config import (
+    DEFAULT_MEMORY_BUDGET_MB,
+    DEFAULT_OUTPUT_PROFILE,
+    DEFAULT_INDICES,
+    DEFAULT_SAVI_L,
+    DEFAULT_WORKERS,
+    MAX_CLOUD_COVERAGE,
+    VALID_L_RANGE,
+)
+from .expressions import IndexDefinition, compile_indices, get_index
+from .incremental import (
+    CHECKSUMS_SUFFIX,
+    detach_file,
+    load_checksums,
+    save_checksums,
+    window_checksum,
+    window_key,
+)
+from .metrics import stage
+from .preprocessor import SceneRejected, aoi_mask, aoi_window
+from .quality import quality_mask
+from .sensors import band_mapping
+from .tiling import map_ordered, max_window_pixels, plan_windows, window_masks
+from .writers import build_profile, finalize_output
+from .zonal import ZonalStats
+
+
+@dataclass
+class IndexResult:
+    """Result of an index computation.
+
+    Attributes:
+        paths: Mapping of index names to written files
+        arrays: Mapping of index names to float32 arrays (NaN = nodata),
+            only filled with ``return_arrays=True``
+        crs: Coordinate reference system of the outputs
+        transform: Affine transform of the outputs
+        shape: Output grid as (rows, cols)
+        cloud_coverage: Cloud percentage of the processed region, when the
+            scene has a quality band
+    """
 
-def identify_bands(src: rasterio.DatasetReader) -> Dict[str, int]:
+    paths: Dict[str, Path] = field(default_factory=dict)
+    arrays: Dict[str, np.ndarray] = field(default_factory=dict)
+    crs: Any = None
+    transform: Any = None
+    shape: Optional[Tuple[int, int]] = None
+    cloud_coverage: Optional[float] = None
+
+    @property
+    def profile(self) -> Dict[str, Any]:
+        """Rasterio profile to write any of the arrays as a GeoTIFF.
+
+        Raises:
+            ValueError: If the result has no output grid
+        """
+        if self.shape is not None:
+            height, width = self.shape
+        elif self.arrays:
+            height, width = next(iter(self.arrays.values())).shape
+        else:
+            raise ValueError("El resultado no tiene malla de salida")
+        return {
+            "driver": "GTiff",
+            "count": 1,
+            "dtype": "float32",
+            "nodata": np.nan,
+            "width": width,
+            "height": height,
+            "crs": self.crs,
+            "transform": self.transform,
+        }
+
+
+def identify_bands(
+    src: rasterio.DatasetReader, sensor: Optional[str] = None
+) -> Dict[str, int]:
     """Automatically identifies relevant bands based on metadata or wavelengths.
 
-    Uses image metadata or wavelength information to detect and map spectral bands
-    to their corresponding indices in the dataset.
+    Uses band descriptions, wavelength tags or the sensor profiles of
+    ``config.SUPPORTED_SATELLITES`` to map spectral bands to their indices in
+    the dataset. The mapping is resolved once per file and memoized.
 
     Args:
         src: Rasterio dataset object containing the multispectral image
+        sensor: Optional sensor profile name (sentinel2, landsat8...)
 
     Returns:
         Dictionary mapping band names to their indices in the dataset
     """
-    bands = {}
-
-    # Primero intentar identificar por metadatos de longitud de onda
-    for i in range(1, src.count + 1):
-        tags = src.tags(i)
-        if "wavelength_nm" in tags:
-            wavelength = float(tags["wavelength_nm"])
-            # Identificar bandas por rangos de longitud de onda
-            if 630 <= wavelength <= 690:  # Rojo
-                bands["red"] = i
-            elif 760 <= wavelength <= 900:  # NIR
-                bands["nir"] = i
-            elif 520 <= wavelength <= 600:  # Verde
-                bands["green"] = i
-            elif 450 <= wavelength <= 520:  # Azul
-                bands["blue"] = i
-            elif 690 <= wavelength <= 730:  # Red Edge
-                bands["red_edge1"] = i
-
-    # Si no se encontraron bandas por metadatos, usar la lógica existente
-    if not bands:
-        if src.count >= 12:  # Sentinel-2 tiene 12+ bandas
-            return {
-                "blue": 2,  # Banda 2 (490nm)
-                "green": 3,  # Banda 3 (560nm)
-                "red": 4,  # Banda 4 (665nm)
-                "nir": 8,  # Banda 8 (842nm)
-                "red_edge1": 5,  # Banda 5 (705nm)
-                "swir1": 11,  # Banda 11 (1610nm)
-            }
-        elif src.count >= 7:  # Landsat tiene 7+ bandas
-            return {
-                "blue": 2,  # Banda 2
-                "green": 3,  # Banda 3
-                "red": 4,  # Banda 4
-                "nir": 5,  # Banda 5
-                "swir1": 6,  # Banda 6
-            }
-        else:
-            # Caso genérico (suposición de orden RGB-NIR)
-            if src.count >= 1:
-                bands["red"] = 1
-            if src.count >= 2:
-                bands["nir"] = 2  # En nuestro caso de prueba, NIR es la segunda banda
-            if src.count >= 3:
-                bands["green"] = 3
-            if src.count >= 4:
-                bands["blue"] = 4
-
-    if "nir" not in bands:
-        logger.warning(
-            "⚠️ No se pudo identificar la banda NIR, necesaria para índices vegetativos"
-        )
+    return band_mapping(src, sensor)
 
-    return bands
 
+def _index_key(name: str, L: Optional[float] = None) -> str:
+    """Returns the result key of an index (indices with a soil factor include it)."""
+    return name if L is None else f"{name}_{L}"
 
-def calculate_ndvi(image_path: Path, output_dir: Path) -> Path:
-    """Calculate NDVI (Normalized Difference Vegetation Index).
 
-    Process a multiband satellite image to generate the NDVI index following
-    ISO 42001 calculation standards.
+def plan_indices(
+    indices: Optional[List[str]] = None,
+    L: Union[float, Sequence[float]] = DEFAULT_SAVI_L,
+    formulas: Optional[Dict[str, str]] = None,
+) -> Dict[str, IndexDefinition]:
+    """Works out the index computations of a request.
+
+    Indices are looked up in the run ``formulas`` and in the index registry.
+    An index with a soil factor ``L`` (SAVI) is computed once per factor in
+    ``L``; a result key such as ``savi_0.3`` (or the file suffix
+    ``savi_L0.30``) requests one factor explicitly. Formulas are always
+    computed, in addition to ``indices``. Repeated requests are computed once.
 
     Args:
-        image_path: Path to multiband satellite image
-        output_dir: Directory to save results
+        indices: Requested indices (ndvi, savi, savi_<L>, evi...).
+            ``config.DEFAULT_INDICES`` by default.
+        L: Soil adjustment factor(s) for SAVI
+        formulas: Custom ``name -> expression`` formulas of the run
 
     Returns:
-        Path to the generated NDVI file
+        Mapping of result keys to index definitions with their parameters,
+        in request order
     """
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_file = output_dir / f"{image_path.stem}_ndvi.tif"
+    factors = [L] if isinstance(L, (int, float)) else list(L)
+    requests = list(indices) if indices is not None else list(DEFAULT_INDICES)
+    requests += [name for name in formulas or {} if name not in requests]
+
+    plan: Dict[str, IndexDefinition] = {}
+    for request in requests:
+        name = request.strip().lower()
+        definition = get_index(name, formulas)
+        suffix = ""
+        if definition is None:
+            name, _, suffix = name.rpartition("_")
+            definition = get_index(name, formulas)
+        if definition is None or (suffix and "L" not in definition.params):
+            raise ValueError(f"Índice no soportado: {request}")
+        if "L" not in definition.params:
+            plan.setdefault(name, definition)
+            continue
+        try:
+            values = [float(suffix.lstrip("l"))] if suffix else factors
+        except ValueError:
+            raise ValueError(f"Factor L inválido: {request}") from None
+        for value in values:
+            if not VALID_L_RANGE[0] <= value <= VALID_L_RANGE[1]:
+                raise ValueError(f"Factor L fuera del rango {VALID_L_RANGE}: {value}")
+            key = _index_key(name, float(value))
+            plan.setdefault(key, definition.with_params(L=float(value)))
+    return plan
+
+
+def required_bands(
+    indices: Optional[List[str]] = None, formulas: Optional[Dict[str, str]] = None
+) -> Tuple[str, ...]:
+    """Logical bands read by the requested indices."""
+    plan = plan_indices(indices, formulas=formulas)
+    return tuple(sorted({b for d in plan.values() for b in d.bands}))
+
+
+def _factor_label(L: float) -> str:
+    """File name label of a soil factor: two decimals unless more are needed.
+
+    ``0.5`` gives ``0.50`` and ``0.125`` keeps ``0.125``, so distinct factors
+    never share an output file.
+    """
+    label = f"{L:.2f}"
+    return label if float(label) == L else repr(L)
+
+
+def _output_file(stem: str, output_dir: Path, definition: IndexDefinition) -> Path:
+    """Builds the output path for an index file."""
+    L = definition.params.get("L")
+    if L is not None:
+        return output_dir / f"{stem}_{definition.name}_L{_factor_label(L)}.tif"
+    return output_dir / f"{stem}_{definition.name}.tif"
+
+
+def compute_indices(
+    image_path: Path,
+    output_dir: Optional[Path] = None,
+    indices: Optional[List[str]] = None,
+    L: Union[float, Sequence[float]] = DEFAULT_SAVI_L,
+    streaming: bool = False,
+    tile_size: Optional[int] = None,
+    memory_mb: Optional[float] = None,
+    workers: int = DEFAULT_WORKERS,
+    geometries: Optional[List[Dict[str, Any]]] = None,
+    stem: Optional[str] = None,
+    zonal: Optional[ZonalStats] = None,
+    write_rasters: bool = True,
+    output_profile: str = DEFAULT_OUTPUT_PROFILE,
+    compress: Optional[str] = None,
+    stack: bool = False,
+    return_arrays: bool = False,
+    incremental: bool = False,
+    bands: Optional[Dict[str, int]] = None,
+    sensor: Optional[str] = None,
+    resolution: Optional[float] = None,
+    scale: Optional[float] = None,
+    max_size: Optional[int] = None,
+    formulas: Optional[Dict[str, str]] = None,
+    cloud_mask: bool = True,
+    quality_file: Optional[Path] = None,
+    max_cloud_coverage: Optional[float] = MAX_CLOUD_COVERAGE,
+) -> IndexResult:
+    """Calculate several vegetation indices in a single pass over the image.
+
+    Opens the dataset once, identifies its bands once and reads every band
+    required by the requested indices a single time; all indices are then
+    computed from the shared arrays and written to their own files. Only the
+    requested indices are planned (``plan_indices``): bands, masks and
+    outputs of the others are never read, computed or written, and several
+    SAVI soil factors share the same reads.
+
+    Indices are band-math expressions from the index registry
+    (``src.expressions``) or custom ``formulas``. They are compiled once into
+    a shared evaluation plan, so common subexpressions such as ``nir - red``
+    and ``nir + red`` are computed once per window for all indices.
+
+    In streaming mode the image is processed window by window (following its
+    internal blocks or ``tile_size``) and each window is written straight to
+    the outputs, so memory stays bounded regardless of the scene size. With
+    more than one worker, windows are read and computed on a thread pool (each
+    thread with its own dataset handle) and written back in order.
+
+    Validity masks are built once per window from the source nodata values
+    and dataset masks of the required bands and shared by every index that
+    uses the same bands; invalid pixels (and pixels with a non-positive
+    denominator) are written as NaN. Windows without any valid pixel are
+    not read nor computed.
+
+    When ``geometries`` are given the image is clipped on read: only the
+    window covering the geometries is read, pixels outside them are written
+    as NaN and the outputs are named ``<stem>_clipped_<index>.tif``, without
+    writing an intermediate clipped image.
+
+    With ``zonal``, per-feature statistics are accumulated from the same
+    window values as they are computed; the features also act as clipping
+    geometries when ``geometries`` is not given. Writing the index rasters
+    can then be disabled with ``write_rasters=False``.
+
+    With ``stack`` all indices are written as the bands of a single
+    ``<stem>_indices.tif`` (described with the index names). With
+    ``return_arrays`` the computed arrays are also returned in memory, along
+    with the georeferencing, so callers can chain steps without re-reading
+    the outputs from disk.
+
+    In ``incremental`` mode a checksum of the input pixels of every window is
+    stored next to the outputs (``<stem>_windows.json``). When the outputs of
+    a previous incremental run with the same parameters exist, only the
+    windows whose checksum changed are recomputed and rewritten in place.
+    It implies windowed processing and is not available for COG outputs,
+    zonal statistics or in-memory arrays, which always need every window.
+
+    With ``resolution`` the indices are computed on a grid with that pixel
+    size instead of the native one: each window is read with ``out_shape``
+    (averaging when coarser, nearest neighbour when finer), so a 20 m product
+    from 10 m bands reads and computes a quarter of the pixels of the native
+    grid in memory and output.
+
+    ``scale`` and ``max_size`` produce reduced-resolution previews (outputs
+    named ``<stem>_preview_<index>.tif``): the grid is shrunk by a fixed
+    factor or until its longest side fits ``max_size`` pixels. GDAL serves
+    these decimated reads from the image overviews when they exist, so a
+    quick-look of a full tile only reads a fraction of its data.
+
+    With ``cloud_mask``, a quality band of the image (Sentinel-2 SCL or
+    Landsat QA_PIXEL) or a separate ``quality_file`` masks clouds and cloud
+    shadows in every index (see ``src.quality``). The cloud percentage of
+    the region is first estimated from a decimated read of the quality band,
+    and a scene above ``max_cloud_coverage`` is rejected before any spectral
+    band is read.
 
-    with rasterio.open(image_path) as src:
-        bands = identify_bands(src)
+    Args:
+        image_path: Path to multiband satellite image
+        output_dir: Directory to save results. Without it no raster is
+            written (use with ``return_arrays`` or ``zonal``).
+        indices: Indices to calculate (ndvi, ndre, savi, savi_<L>, evi,
+            gndvi, ndwi, nbr, msavi2 or registered indices). NDVI, SAVI and
+            NDRE by default.
+        L: Soil adjustment factor for SAVI, or a list of factors to compute
+            one SAVI output per factor
+        streaming: Process the image by windows instead of whole bands
+        tile_size: Square tile size for streaming. Internal blocks by default.
+        memory_mb: Memory budget per window in streaming mode
+        workers: Number of threads computing windows in parallel. Implies
+            windowed processing when greater than 1.
+        geometries: Optional clipping geometries in the image CRS
+        stem: Base name of the outputs (image file stem by default)
+        zonal: Optional accumulator of per-feature zonal statistics
+        write_rasters: Write the index rasters (only useful to disable
+            together with ``zonal``)
+        output_profile: Output layout (default, tiled, cog)
+        compress: Output compression (deflate, zstd, lerc, none)
+        stack: Write all indices as bands of one GeoTIFF
+        return_arrays: Keep the full index arrays in the result
+        incremental: Only recompute the windows whose input pixels changed
+            since the previous incremental run
+        bands: Band mapping already resolved for the image (see
+            ``identify_bands``). Resolved from the image by default.
+        sensor: Sensor profile used to resolve the band mapping
+        resolution: Output pixel size in CRS units. Native grid by default.
+        scale: Preview reduction factor (8 computes at 1/8 resolution)
+        max_size: Preview size limit for the longest output side in pixels
+        formulas: Custom ``name -> expression`` indices computed in
+            addition to ``indices`` (e.g. ``{"ci": "nir / red_edge1 - 1"}``)
+        cloud_mask: Mask clouds and shadows using the scene quality band
+        quality_file: Separate SCL or QA_PIXEL file of the scene
+        max_cloud_coverage: Maximum cloud percentage of the region. None
+            disables the rejection.
 
-        if "red" not in bands or "nir" not in bands:
-            raise ValueError("No se encontraron bandas rojo o NIR necesarias para NDVI")
+    Returns:
+        IndexResult with the generated file paths (and arrays when
+        requested). Indices whose bands are not available are skipped.
 
-        red = src.read(bands["red"]).astype(float)
-        nir = src.read(bands["nir"]).astype(float)
+    Raises:
+        SceneRejected: If the cloud percentage exceeds ``max_cloud_coverage``
+    """
+    if zonal is not None and geometries is None:
+        geometries = zonal.geometries
+
+    plan = plan_indices(indices, L, formulas)
+
+    if output_dir is None:
+        write_rasters = False
+    elif write_rasters:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    with stage("open"):
+        src = rasterio.open(image_path)
+    with src:
+        if bands is None:
+            with stage("identify_bands"):
+                bands = identify_bands(src, sensor)
+
+        # Claves de resultado calculables con las bandas disponibles
+        computable = []
+        for key, definition in plan.items():
+            missing = [b for b in definition.bands if b not in bands]
+            if missing:
+                logger.warning(
+                    f"⚠️ No se encontraron bandas {', '.join(missing)} "
+                    f"necesarias para {definition.name.upper()}"
+                )
+                continue
+            computable.append(key)
+        # Plan de evaluación compilado una vez para todas las ventanas
+        evaluator = compile_indices({key: plan[key] for key in computable})
+        index_bands = evaluator.index_bands
+
+        result = IndexResult(crs=src.crs, transform=src.transform)
+        if not computable:
+            return result
+
+        needed = evaluator.bands
+
+        # Región de salida: imagen completa o ventana cubierta por el AOI
+        stem = stem or image_path.stem
+        if geometries is not None:
+            region = aoi_window(src, geometries)
+            stem = f"{stem}_clipped"
+        else:
+            region = Window(0, 0, src.width, src.height)
+
+        # Nubosidad estimada con la banda de calidad antes de leer bandas espectrales
+        quality = quality_mask(bands, quality_file) if cloud_mask else None
+        if quality is not None:
+            with stage("cloud_coverage"):
+                result.cloud_coverage = quality.coverage(src, region, geometries)
+            if result.cloud_coverage is not None:
+                logger.info(f"☁️ Nubosidad estimada: {result.cloud_coverage:.1f}%")
+                if (
+                    max_cloud_coverage is not None
+                    and result.cloud_coverage > max_cloud_coverage
+                ):
+                    quality.close()
+                    raise SceneRejected(
+                        f"Escena rechazada: nubosidad {result.cloud_coverage:.1f}% "
+                        f"superior al máximo de {max_cloud_coverage:g}%"
+                    )
+
+        # Malla de salida: nativa o remuestreada a la resolución pedida
+        scale_x = scale_y = 1.0
+        if resolution is not None:
+            scale_x, scale_y = resolution / src.res[0], resolution / src.res[1]
+        # Vista previa: reducción fija o hasta que el lado mayor quepa en max_size
+        if scale is not None or max_size is not None:
+            factor = scale or 1.0
+            if max_size:
+                longest = max(region.width / scale_x, region.height / scale_y)
+                factor = max(factor, longest / max_size)
+            scale_x, scale_y = scale_x * factor, scale_y * factor
+            stem = f"{stem}_preview"
+        scaled = (scale_x, scale_y) != (1.0, 1.0)
+        if region.width < scale_x or region.height < scale_y:
+            raise ValueError(
+                f"La resolución {src.res[0] * scale_x:g} es más gruesa que la región "
+                "a procesar"
+            )
+        width = max(1, math.floor(region.width / scale_x))
+        height = max(1, math.floor(region.height / scale_y))
+        block_y, block_x = src.block_shapes[0]
+        block_shape = (
+            max(1, round(block_y / scale_y)),
+            max(1, round(block_x / scale_x)),
+        )
+        resampling = Resampling.average if scale_x > 1 else Resampling.nearest
+        if scaled:
+            logger.info(
+                f"📐 Malla de salida de {src.res[0] * scale_x:g} unidades: "
+                f"{width}x{height} píxeles"
+            )
+
+        if streaming or workers > 1 or incremental:
+            budget = memory_mb if memory_mb is not None else DEFAULT_MEMORY_BUDGET_MB
+            max_pixels = max_window_pixels(
+                budget, len(needed), len(computable), evaluator.scratch_buffers
+            )
+            windows = plan_windows(width, height, block_shape, tile_size, max_pixels)
+            logger.info(
+                f"🧱 Procesando en {len(windows)} ventanas con {workers} hilo(s)"
+            )
+        else:
+            windows = [Window(0, 0, width, height)]
 
-        # Evitar división por cero
-        denominator = nir + red
-        ndvi = np.where(denominator > 0, (nir - red) / denominator, 0)
+        result.transform = src.window_transform(region) * Affine.scale(scale_x, scale_y)
+        result.shape = (height, width)
 
-        # Crear nuevo archivo de salida
         meta = src.meta.copy()
-        meta.update({"count": 1, "dtype": "float32", "nodata": np.nan})
-
-        with rasterio.open(output_file, "w", **meta) as dst:
-            dst.write(ndvi.astype(np.float32), 1)
+        meta.update(
+            {
+                "count": len(computable) if stack else 1,
+                "dtype": "float32",
+                "nodata": np.nan,
+                "width": width,
+                "height": height,
+                "transform": result.transform,
+            }
+        )
+        meta = build_profile(meta, output_profile, compress)
+
+        # Archivos de salida: uno por índice o uno apilado con todos
+        outputs: Dict[str, Path] = {}
+        if write_rasters and output_dir is not None:
+            if stack:
+                outputs = {"stack": output_dir / f"{stem}_indices.tif"}
+            else:
+                outputs = {
+                    key: _output_file(stem, output_dir, plan[key]) for key in computable
+                }
+
+        # Modo incremental: sumas de control por ventana junto a las salidas
+        checksums_file: Optional[Path] = None
+        previous: Dict[str, str] = {}
+        checksums: Dict[str, str] = {}
+        update = False
+        if incremental:
+            unsupported = output_profile == "cog" or zonal is not None or return_arrays
+            if output_dir is None or not outputs or unsupported:
+                logger.warning(
+                    "⚠️ Modo incremental no disponible con salidas COG, "
+                    "estadísticas zonales o arrays en memoria: se recalcula todo"
+                )
+            else:
+                checksums_file = output_dir / f"{stem}{CHECKSUMS_SUFFIX}"
+                params = {
+                    "indices": {
+                        key: [plan[key].expression, plan[key].params]
+                        for key in computable
+                    },
+                    "bands": bands,
+                    "stack": stack,
+                    "output_profile": output_profile,
+                    "compress": compress,
+                    "crs": str(src.crs),
+                    "transform": list(result.transform)[:6],
+                    "width": width,
+                    "height": height,
+                }
+                loaded = load_checksums(checksums_file, params, outputs)
+                if loaded is not None:
+                    previous, update = loaded, True
+                    # Sin archivo de control mientras las salidas cambian: una
+                    # ejecución interrumpida obliga a recalcular todo
+                    checksums_file.unlink()
+                    for path in outputs.values():
+                        detach_file(path)
+                    logger.info("♻️ Actualizando las salidas existentes por ventanas")
+
+        if return_arrays:
+            result.arrays = {
+                name: np.full((height, width), np.nan, dtype=np.float32)
+                for name in computable
+            }
+        local = threading.local()
+        lock = threading.Lock()
+
+        # Solo se leen máscaras de las bandas que tienen nodata o máscara propia
+        masked_bands = [
+            b
+            for b in needed
+            if MaskFlags.all_valid not in src.mask_flag_enums[bands[b] - 1]
+        ]
+        # Bytes leídos por píxel de salida, en el tipo de dato de origen
+        read_itemsize = sum(np.dtype(src.dtypes[bands[b] - 1]).itemsize for b in needed)
+
+        def compute_window(
+            window: Window,
+        ) -> Tuple[
+            Optional[str], Optional[Tuple[Dict[str, np.ndarray], Optional[np.ndarray]]]
+        ]:
+            # Los datasets de rasterio no son thread-safe: uno por hilo
+            reader = src
+            if workers > 1:
+                reader = getattr(local, "src", None)
+                if reader is None:
+                    reader = local.src = rasterio.open(image_path)
+                    with lock:
+                        files.callback(reader.close)
+
+            # Ventana de salida -> ventana de la imagen de origen
+            shape = (int(window.height), int(window.width))
+            src_window = Window(
+                window.col_off * scale_x + region.col_off,
+                window.row_off * scale_y + region.row_off,
+                window.width * scale_x,
+                window.height * scale_y,
+            )
+            read_options: Dict[str, Any] = {}
+            if scaled:
+                read_options = {"out_shape": shape, "resampling": resampling}
+
+            pixels = shape[0] * shape[1]
+            with stage("masks", log=False) as counters:
+                region_mask = labels = None
+                if zonal is not None:
+                    labels = zonal.labels(result.transform, window)
+                if geometries is not None:
+                    if (
+                        zonal is not None
+                        and labels is not None
+                        and geometries is zonal.geometries
+                    ):
+                        region_mask = np.any(labels > 0, axis=0)
+                    else:
+                        region_mask = aoi_mask(
+                            reader,
+                            geometries,
+                            src_window,
+                            read_options.get("out_shape"),
+                        )
+                # Nubes y sombras de la banda de calidad, para todos los índices
+                if quality is not None:
+                    clear = quality.clear(
+                        reader, src_window, read_options.get("out_shape")
+                    )
+                    region_mask = clear if region_mask is None else region_mask & clear
+                masks = window_masks(
+                    reader,
+                    src_window,
+                    bands,
+                    masked_bands,
+                    index_bands,
+                    region_mask,
+                    read_options.get("out_shape"),
+                )
+                counters["pixels"] += pixels
+            if not any(m is None or m.any() for m in masks.values()):
+                digest = None
+                if checksums_file is not None:
+                    digest = window_checksum(masks.values())
+                return digest, None
+
+            # Leer cada banda requerida una sola vez por ventana, en float32
+            with stage("read", log=False) as counters:
+                data = {
+                    b: reader.read(
+                        bands[b],
+                        window=src_window,
+                        out_dtype=np.float32,
+                        **read_options,
+                    )
+                    for b in needed
+                }
+                counters["pixels"] += pixels
+                counters["bytes_read"] += pixels * read_itemsize
+            digest = None
+            if checksums_file is not None:
+                digest = window_checksum([*data.values(), *masks.values()])
+                if previous.get(window_key(window)) == digest:
+                    return digest, None
+            with stage("compute", log=False) as counters:
+                values = evaluator.evaluate(data, masks)
+                counters["pixels"] += pixels
+            return digest, (values, labels)
+
+        with ExitStack() as files:
+            if quality is not None:
+                files.callback(quality.close)
+            if update:
+                dsts = {
+                    name: files.enter_context(rasterio.open(path, "r+"))
+                    for name, path in outputs.items()
+                }
+            else:
+                dsts = {
+                    name: files.enter_context(rasterio.open(path, "w", **meta))
+                    for name, path in outputs.items()
+                }
+                if stack and dsts:
+                    dsts["stack"].descriptions = tuple(computable)
+
+            skipped = unchanged = 0
+            for window, (digest, computed) in map_ordered(
+                compute_window, windows, workers
+            ):
+                if digest is not None:
+                    checksums[window_key(window)] = digest
+                    if previous.get(window_key(window)) == digest:
+                        unchanged += 1
+                        continue
+                if computed is None:
+                    # Ventana sin píxeles válidos: queda con nodata (NaN)
+                    skipped += 1
+                    if not update:
+                        continue
+                    # Al actualizar, la ventana puede tener valores anteriores
+                    empty = np.full(
+                        (int(window.height), int(window.width)),
+                        np.nan,
+                        dtype=np.float32,
+                    )
+                    computed = ({name: empty for name in computable}, None)
+                values, labels = computed
+                with stage("write", log=False) as counters:
+                    for i, name in enumerate(computable, start=1):
+                        if stack and dsts:
+                            dsts["stack"].write(values[name], i, window=window)
+                            counters["bytes_written"] += values[name].nbytes
+                        elif name in dsts:
+                            dsts[name].write(values[name], 1, window=window)
+                            counters["bytes_written"] += values[name].nbytes
+                        if return_arrays:
+                            result.arrays[name][window.toslices()] = values[name]
+                    counters["pixels"] += int(window.width) * int(window.height)
+                if zonal is not None and labels is not None:
+                    with stage("zonal", log=False) as counters:
+                        for name in computable:
+                            zonal.update(name, values[name], labels)
+                        counters["pixels"] += labels[0].size
+
+        if skipped:
+            logger.info(f"⏭️ {skipped} ventanas sin píxeles válidos omitidas")
+        if update:
+            logger.info(
+                f"♻️ {len(windows) - unchanged} de {len(windows)} ventanas recalculadas"
+            )
+
+        for name, output_file in outputs.items():
+            with stage("finalize") as counters:
+                finalize_output(output_file, output_profile, compress)
+                counters["bytes_written"] += output_file.stat().st_size
+                counters["pixels"] += width * height
+            if name == "stack":
+                result.paths.update({n: output_file for n in computable})
+            else:
+                result.paths[name] = output_file
+            logger.success(f"✅ {name.upper()} calculado y guardado en {output_file}")
+
+        if checksums_file is not None:
+            save_checksums(checksums_file, params, outputs, checksums)
+
+    return result
+
+
+def calculate_indices(
+    image_path: Path,
+    output_dir: Path,
+    indices: Optional[List[str]] = None,
+    L: Union[float, Sequence[float]] = DEFAULT_SAVI_L,
+    **options: Any,
+) -> Dict[str, Path]:
+    """Calculate several vegetation indices and write them to disk.
+
+    Thin wrapper over ``compute_indices`` returning only the output paths.
+    With ``stack=True`` every index name maps to the same stacked file, whose
+    band order and descriptions follow the returned dictionary.
 
-        logger.success(f"✅ NDVI calculado y guardado en {output_file}")
+    Args:
+        image_path: Path to multiband satellite image
+        output_dir: Directory to save results
+        indices: Indices to calculate (ndvi, ndre, savi, savi_<L>). All by
+            default.
+        L: Soil adjustment factor(s) for SAVI
+        **options: Execution options of ``compute_indices``
 
-    return output_file
+    Returns:
+        Dictionary mapping index names to generated file paths
+    """
+    return compute_indices(image_path, output_dir, indices, L, **options).paths
 
 
-def calculate_ndre(image_path: Path, output_dir: Path) -> Path | None:
-    """Calculate NDRE (Normalized Difference Red Edge).
+def calculate_ndvi(image_path: Path, output_dir: Path, **options: Any) -> Path:
+    """Calculate NDVI (Normalized Difference Vegetation Index).
 
-    Process a multiband satellite image to generate the NDRE index,
-    requires Red Edge bands.
+    Process a multiband satellite image to generate the NDVI index following
+    ISO 42001 calculation standards.
 
     Args:
         image_path: Path to multiband satellite image
         output_dir: Directory to save results
+        **options: Execution options of ``compute_indices`` (e.g. ``scale``
+            or ``max_size`` for a preview)
 
     Returns:
-        Path to generated NDRE file or None if required bands not found
+        Path to the generated NDVI file
     """
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_file = output_dir / f"{image_path.stem}_ndre.tif"
+    results = calculate_indices(image_path, output_dir, ["ndvi"], **options)
+    if "ndvi" not in results:
+        raise ValueError("No se encontraron bandas rojo o NIR necesarias para NDVI")
+    return results["ndvi"]
 
-    with rasterio.open(image_path) as src:
-        bands = identify_bands(src)
 
-        if "red_edge1" not in bands or "nir" not in bands:
-            logger.warning("⚠️ No se encontraron bandas Red Edge necesarias para NDRE")
-            return None
-
-        red_edge = src.read(bands["red_edge1"]).astype(float)
-        nir = src.read(bands["nir"]).astype(float)
-
-        # Evitar división por cero
-        denominator = nir + red_edge
-        ndre = np.where(denominator > 0, (nir - red_edge) / denominator, 0)
-
-        # Crear nuevo archivo de salida
-        meta = src.meta.copy()
-        meta.update({"count": 1, "dtype": "float32", "nodata": np.nan})
+def calculate_ndre(image_path: Path, output_dir: Path, **options: Any) -> Path | None:
+    """Calculate NDRE (Normalized Difference Red Edge).
 
-        with rasterio.open(output_file, "w", **meta) as dst:
-            dst.write(ndre.astype(np.float32), 1)
+    Process a multiband satellite image to generate the NDRE index,
+    requires Red Edge bands.
 
-        logger.success(f"✅ NDRE calculado y guardado en {output_file}")
+    Args:
+        image_path: Path to multiband satellite image
+        output_dir: Directory to save results
+        **options: Execution options of ``compute_indices``
 
-    return output_file
+    Returns:
+        Path to generated NDRE file or None if required bands not found
+    """
+    results = calculate_indices(image_path, output_dir, ["ndre"], **options)
+    return results.get("ndre")
 
 
-def calculate_savi(image_path: Path, output_dir: Path, L: float = 0.5) -> Path:
+def calculate_savi(
+    image_path: Path, output_dir: Path, L: float = 0.5, **options: Any
+) -> Path:
     """Calculate SAVI (Soil Adjusted Vegetation Index).
 
     Process a multiband satellite image to generate the SAVI index with
@@ -174,77 +768,50 @@ def calculate_savi(image_path: Path, output_dir: Path, L: float = 0.5) -> Path:
         image_path: Path to multiband satellite image
         output_dir: Directory to save results
         L: Soil adjustment factor (0 = no adjustment, 1 = maximum)
+        **options: Execution options of ``compute_indices``
 
     Returns:
         Path to generated SAVI file
     """
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_file = output_dir / f"{image_path.stem}_savi_L{L:.2f}.tif"
-
-    with rasterio.open(image_path) as src:
-        bands = identify_bands(src)
-
-        if "red" not in bands or "nir" not in bands:
-            raise ValueError("No se encontraron bandas rojo o NIR necesarias para SAVI")
-
-        red = src.read(bands["red"]).astype(float)
-        nir = src.read(bands["nir"]).astype(float)
-
-        # Fórmula SAVI: ((NIR - RED) / (NIR + RED + L)) * (1 + L)
-        denominator = nir + red + L
-        savi = np.where(denominator > 0, ((nir - red) / denominator) * (1 + L), 0)
-
-        # Crear nuevo archivo de salida
-        meta = src.meta.copy()
-        meta.update({"count": 1, "dtype": "float32", "nodata": np.nan})
-
-        with rasterio.open(output_file, "w", **meta) as dst:
-            dst.write(savi.astype(np.float32), 1)
-
-        logger.success(f"✅ SAVI calculado y guardado en {output_file}")
+    results = calculate_indices(image_path, output_dir, ["savi"], L=L, **options)
+    key = _index_key("savi", float(L))
+    if key not in results:
+        raise ValueError("No se encontraron bandas rojo o NIR necesarias para SAVI")
+    return results[key]
 
-    return output_file
 
-
-def calculate_all_indices(image_path: Path, output_dir: Path) -> Dict[str, Path]:
+def calculate_all_indices(
+    image_path: Path, output_dir: Path, **options: Any
+) -> Dict[str, Path]:
     """Calculate all available vegetation indices for an image.
 
     Processes a multiband satellite image to generate all supported vegetation
-    indices according to ISO 42001 standards.
+    indices according to ISO 42001 standards. Bands are read only once and
+    shared by every index.
 
     Args:
         image_path: Path to multiband satellite image
         output_dir: Directory to save results
+        **options: Execution options forwarded to ``calculate_indices``
+            (``streaming``, ``tile_size``, ``memory_mb``). ``indices`` and
+            ``L`` restrict the run to a subset of indices and SAVI factors.
 
     Returns:
         Dictionary mapping index names to generated file paths
-    """
-    results = {}
-
-    # NDVI (siempre disponible si hay bandas R y NIR)
-    try:
-        results["ndvi"] = calculate_ndvi(image_path, output_dir)
-        logger.info("📊 NDVI calculado correctamente")
-    except Exception as e:
-        logger.error(f"❌ Error al calcular NDVI: {e}")
 
-    # NDRE (solo disponible si hay bandas Red Edge)
+    Raises:
+        SceneRejected: If the scene is too cloudy to be processed
+    """
+    options.setdefault("L", DEFAULT_SAVI_L)
     try:
-        ndre_path = calculate_ndre(image_path, output_dir)
-        if ndre_path:
-            results["ndre"] = ndre_path
-            logger.info("📊 NDRE calculado correctamente")
+        results = calculate_indices(image_path, output_dir, **options)
+    except SceneRejected:
+        raise
     except Exception as e:
-        logger.error(f"❌ Error al calcular NDRE: {e}")
+        logger.error(f"❌ Error al calcular índices: {e}")
+        return {}
 
-    # SAVI
-    try:
-        savi_path = calculate_savi(image_path, output_dir)
-        # Usar el nombre con el factor L para compatibilidad
-        savi_name = f"savi_{DEFAULT_SAVI_L}"
-        results[savi_name] = savi_path
-        logger.info("📊 SAVI calculado correctamente")
-    except Exception as e:
-        logger.error(f"❌ Error al calcular SAVI: {e}")
+    for name in results:
+        logger.info(f"📊 {name.split('_')[0].upper()} calculado correctamente")
 
     return results
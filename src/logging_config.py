@@ -5,12 +5,16 @@ rotation, and custom formats compliant with ISO 42001 requirements.
 """
 
 from loguru import logger
+import atexit
 import sys
 import os
+import re
 import hashlib
 import shutil
+import threading
 from pathlib import Path
 from datetime import datetime
+from typing import Any, Dict, Optional
 
 
 def calculate_hash(file_path: Path) -> str:
@@ -22,84 +26,208 @@ def calculate_hash(file_path: Path) -> str:
     return sha256_hash.hexdigest()
 
 
-def backup_log(log_file: Path, backup_dir: Path) -> None:
-    """Creates a backup copy of the log file with integrity verification."""
+# Marcador del campo hash: el sink lo reemplaza por el eslabón de la cadena
+CHAIN_PLACEHOLDER = "<chain>"
+# Primer eslabón de la cadena de hashes de un archivo de log
+CHAIN_GENESIS = "0" * 64
+
+_HASH_FIELD = re.compile(r"hash=([0-9a-f]{64})")
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {}
+
+
+def backup_log(
+    log_file: Path, backup_dir: Path, hash_value: Optional[str] = None
+) -> None:
+    """Creates a backup copy of the log file with integrity verification.
+
+    Args:
+        log_file: Log file to back up
+        backup_dir: Backup directory
+        hash_value: SHA-256 of the log already known (computed from the file
+            by default)
+    """
     backup_dir.mkdir(parents=True, exist_ok=True)
     backup_file = backup_dir / f"{log_file.stem}_backup{log_file.suffix}"
     shutil.copy2(log_file, backup_file)
 
     # Crear archivo de verificación con hash
-    hash_value = calculate_hash(log_file)
+    hash_value = hash_value or calculate_hash(log_file)
     hash_file = backup_file.with_suffix(".sha256")
     hash_file.write_text(hash_value)
 
 
+def _chain_link(previous: str, line: str) -> str:
+    return hashlib.sha256(f"{previous}{line}".encode()).hexdigest()
+
+
+class HashChainSink:
+    """Log file sink that keeps the integrity hashes up to date per message.
+
+    Each line is chained to the previous one: its ``hash`` field holds the
+    SHA-256 of the previous link and of the line itself (with the
+    ``CHAIN_PLACEHOLDER`` in place of the hash). The SHA-256 of the whole file
+    is also updated with every line, so neither needs re-reading the log.
+
+    Args:
+        path: Log file (opened in append mode)
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.chain = CHAIN_GENESIS
+        self._digest = hashlib.sha256()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, message: str) -> None:
+        """Writes one formatted message, filling in its chain hash."""
+        self.chain = _chain_link(self.chain, message)
+        line = message.replace(CHAIN_PLACEHOLDER, self.chain, 1)
+        self._digest.update(line.encode())
+        self._file.write(line)
+        self._file.flush()
+
+    def hexdigest(self) -> str:
+        """SHA-256 of the content written so far."""
+        return self._digest.hexdigest()
+
+    def stop(self) -> None:
+        """Closes the log file (called by loguru when the sink is removed)."""
+        self._file.close()
+
+
+def verify_log_chain(log_file: Path) -> bool:
+    """Verifies the hash chain of a log file written by ``HashChainSink``.
+
+    Returns:
+        True if no record was modified, removed or reordered
+    """
+    # Un registro empieza con su marca de tiempo y puede ocupar varias líneas
+    records = re.split(r"(?m)^(?=\[\d{4}-\d{2}-\d{2} )", log_file.read_text("utf-8"))
+    chain = CHAIN_GENESIS
+    for record in filter(None, records):
+        match = _HASH_FIELD.search(record)
+        if match is None:
+            return False
+        original = record.replace(match.group(1), CHAIN_PLACEHOLDER, 1)
+        chain = _chain_link(chain, original)
+        if match.group(1) != chain:
+            return False
+    return True
+
+
+def _console(message: str) -> None:
+    """Console sink writing to the current ``sys.stderr``.
+
+    The stream is looked up on every message, so callers that swap stderr
+    after the first ``setup_logging`` (test runners, embedding applications)
+    never get messages written to a closed stream.
+    """
+    sys.stderr.write(message)
+
+
+def _finalize() -> None:
+    """Flushes the file sink and writes the final backup with its hash."""
+    with _lock:
+        if "sink_id" not in _state:
+            return
+        sink = _state["sink"]
+        # Vaciar la cola del escritor en segundo plano y cerrar el archivo
+        logger.remove(_state.pop("sink_id"))
+        backup_log(sink.path, _state["backup_dir"], sink.hexdigest())
+
+
 def setup_logging(output_dir: Path) -> None:
     """Configure logging system according to ISO 42001 standards.
 
     Implements auditable and permanent logging following standardized guidelines.
     Ensures log file integrity and maintains backup copies with verification.
 
+    Initialization is idempotent: the process has a single console sink and a
+    single log file sink, written by a background thread. Calling it again
+    with the same directory does nothing; with another directory the file
+    sink is moved there. Integrity hashes are updated incrementally by the
+    sink and the backup with its SHA-256 is written once, when the process
+    exits or the log file changes.
+
     Args:
         output_dir: Directory path where log files will be stored
     """
-    # Crear directorios
-    log_dir = output_dir / "logs"
-    backup_dir = output_dir / "logs" / "backup"
-    log_dir.mkdir(parents=True, exist_ok=True)
-    backup_dir.mkdir(parents=True, exist_ok=True)
-
-    # Formato para auditoría ISO 42001
-    log_format = (
-        "[{time:YYYY-MM-DD HH:mm:ss.SSS}] "
-        "{process}.{thread} | "
-        "{level: <8} | "
-        "{name}:{function}:{line} | "
-        "usuario={extra[user]} | "
-        "hash={extra[hash]} | "
-        "{message}"
-    )
-
-    # Archivo de log con fecha y hora exacta
-    current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = log_dir / f"pascal_ndvi_{current_datetime}.log"
-
-    # Configurar contexto para auditoría
-    logger.configure(
-        extra={"user": os.getenv("USERNAME", "unknown"), "hash": "calculating..."}
-    )
-
-    # Log a archivo (sin rotación - permanente)
-    logger.add(
-        log_file,
-        format=log_format,
-        level="INFO",
-        rotation=None,  # Sin rotación - logs permanentes
-        enqueue=True,  # Thread-safe
-        backtrace=True,  # Más info para debug
-        diagnose=True,  # Más info para diagnóstico
-    )
-
-    # Log a consola (formato simplificado)
-    logger.add(
-        sys.stderr,
-        format=(
-            "<green>{time:HH:mm:ss}</green> | "
-            "<level>{level: <8}</level> | "
-            "<cyan>{name}</cyan> | {message}"
-        ),
-        level="INFO",
-    )
+    with _lock:
+        if _state.get("output_dir") == output_dir and "sink_id" in _state:
+            return
+    _finalize()
+
+    with _lock:
+        # Crear directorios
+        log_dir = output_dir / "logs"
+        backup_dir = output_dir / "logs" / "backup"
+        log_dir.mkdir(parents=True, exist_ok=True)
+        backup_dir.mkdir(parents=True, exist_ok=True)
+
+        # Formato para auditoría ISO 42001
+        log_format = (
+            "[{time:YYYY-MM-DD HH:mm:ss.SSS}] "
+            "{process}.{thread} | "
+            "{level: <8} | "
+            "{name}:{function}:{line} | "
+            "usuario={extra[user]} | "
+            "hash={extra[hash]} | "
+            "{message}"
+        )
+
+        # Archivo de log con fecha y hora exacta
+        current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
+        log_file = log_dir / f"pascal_ndvi_{current_datetime}.log"
+
+        if "console_id" not in _state:
+            # Configurar contexto para auditoría
+            logger.configure(
+                extra={
+                    "user": os.getenv("USERNAME", "unknown"),
+                    "hash": CHAIN_PLACEHOLDER,
+                }
+            )
+            # Sustituir el sink por defecto de loguru por el de consola
+            try:
+                logger.remove(0)
+            except ValueError:
+                pass
+
+            # Log a consola (formato simplificado)
+            _state["console_id"] = logger.add(
+                _console,
+                colorize=sys.stderr.isatty(),
+                format=(
+                    "<green>{time:HH:mm:ss}</green> | "
+                    "<level>{level: <8}</level> | "
+                    "<cyan>{name}</cyan> | {message}"
+                ),
+                level="INFO",
+            )
+            # Backup final al terminar el proceso
+            atexit.register(_finalize)
+
+        # Log a archivo (sin rotación - permanente), escrito en segundo plano
+        sink = HashChainSink(log_file)
+        _state.update(
+            {
+                "output_dir": output_dir,
+                "backup_dir": backup_dir,
+                "sink": sink,
+                "sink_id": logger.add(
+                    sink,
+                    format=log_format,
+                    level="INFO",
+                    enqueue=True,  # Escritor en segundo plano, thread-safe
+                    backtrace=True,  # Más info para debug
+                    diagnose=True,  # Más info para diagnóstico
+                ),
+            }
+        )
 
     # Registrar inicio con metadata
     logger.info("🚀 Iniciando P.A.S.C.A.L NDVI Block")
     logger.info(f"📁 Directorio de salida: {output_dir}")
     logger.info(f"📝 Archivo de log: {log_file}")
-
-    # Crear backup inmediatamente
-    backup_log(log_file, backup_dir)
-
-    # Registrar también backup al finalizar por si hay cambios
-    import atexit
-
-    atexit.register(backup_log, log_file, backup_dir)
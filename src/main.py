@@ -7,14 +7,106 @@ imagery and calculating vegetation indices following ISO 42001 guidelines.
 from pathlib import Path
 import typer
 from loguru import logger
-from typing import Optional, List, Dict
-from src.preprocessor import clip_image_with_shapefile
-from src.indices import calculate_all_indices
+from typing import Any, Optional, List, Dict, Tuple, Union
+from src.config import (
+    COMPRESSIONS,
+    DEFAULT_BATCH_WORKERS,
+    DEFAULT_OUTPUT_PROFILE,
+    DEFAULT_SAVI_L,
+    DEFAULT_WORKERS,
+    MAX_CLOUD_COVERAGE,
+    MAX_IMAGE_SIZE_GB,
+    OUTPUT_PROFILES,
+)
+from src.preprocessor import (
+    SceneRejected,
+    clip_features,
+    clip_image_with_shapefile,
+    preflight,
+)
+from src.bandstack import parse_band_files
+from src.cache import ResultCache
+from src.expressions import INDEX_REGISTRY, parse_formulas
+from src.indices import plan_indices
+from src.pipeline import process_features, process_scene
+from src.batch import collect_scenes, run_batch
 from src.logging_config import setup_logging
+from src.metrics import run_metrics
+from src.timeseries import compute_timeseries
 
 app = typer.Typer()
 
 
+def resolve_input(
+    image: Optional[Path], band_file: Optional[List[str]]
+) -> Tuple[Path, Optional[Dict[str, Path]]]:
+    """Resolves the input image or per-band files given on the command line."""
+    band_files = parse_band_files(band_file) if band_file else None
+    if band_files:
+        return image or next(iter(band_files.values())), band_files
+    if image is None:
+        raise typer.BadParameter("Indique --image o --band-file")
+    return image, None
+
+
+def split_indices(indices: Optional[List[str]]) -> Optional[List[str]]:
+    """Splits comma-separated index lists given on the command line."""
+    if not indices:
+        return None
+    return [
+        name.strip() for item in indices for name in item.split(",") if name.strip()
+    ]
+
+
+def resolve_formulas(formula: Optional[List[str]]) -> Optional[Dict[str, str]]:
+    """Parses --formula before any work is done."""
+    if not formula:
+        return None
+    try:
+        return parse_formulas(formula)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="'--formula'") from None
+
+
+def resolve_indices(
+    indices_list: Optional[List[str]],
+    savi_l: Optional[List[float]],
+    formulas: Optional[Dict[str, str]] = None,
+) -> Tuple[Optional[List[str]], Union[float, List[float]]]:
+    """Parses --indices-list and --savi-l and checks them before any work is done."""
+    indices = split_indices(indices_list)
+    factors: Union[float, List[float]] = savi_l or DEFAULT_SAVI_L
+    try:
+        plan_indices(indices, factors, formulas)
+    except ValueError as e:
+        available = ", ".join([*INDEX_REGISTRY, "savi_<L>"])
+        raise typer.BadParameter(
+            f"{e} (disponibles: {available})",
+            param_hint="'--indices-list' / '--savi-l'",
+        ) from None
+    return indices, factors
+
+
+def check_output_profile(value: str) -> str:
+    """Validates --output-profile before any work is done."""
+    if value not in OUTPUT_PROFILES:
+        raise typer.BadParameter(
+            f"Perfil de salida no soportado: {value} "
+            f"(disponibles: {', '.join(OUTPUT_PROFILES)})"
+        )
+    return value
+
+
+def check_compress(value: Optional[str]) -> Optional[str]:
+    """Validates --compress before any work is done."""
+    if value is not None and value not in COMPRESSIONS:
+        raise typer.BadParameter(
+            f"Compresión no soportada: {value} "
+            f"(disponibles: {', '.join(COMPRESSIONS)})"
+        )
+    return value
+
+
 def init_logging(output_dir: Path) -> None:
     """Initializes the ISO 42001 compliant logging system."""
     setup_logging(output_dir)
@@ -27,7 +119,34 @@ def clip(
     image: Path = typer.Option(..., exists=True, help="Multiband .tif file"),
     shapefile: Path = typer.Option(..., exists=True, help="Polygon .shp file"),
     output: Path = typer.Option("results", help="Output directory"),
-) -> Path:
+    output_profile: str = typer.Option(
+        DEFAULT_OUTPUT_PROFILE,
+        help="Output layout: default, tiled or cog",
+        callback=check_output_profile,
+    ),
+    compress: Optional[str] = typer.Option(
+        None,
+        help="Output compression: deflate, zstd, lerc or none",
+        callback=check_compress,
+    ),
+    per_feature: bool = typer.Option(
+        False, help="Write one clipped image per shapefile feature"
+    ),
+    id_field: Optional[str] = typer.Option(
+        None, help="Feature attribute used to name per-feature outputs"
+    ),
+    workers: int = typer.Option(
+        DEFAULT_WORKERS, min=1, help="Number of features clipped concurrently"
+    ),
+    max_image_gb: float = typer.Option(
+        MAX_IMAGE_SIZE_GB,
+        min=0,
+        help="Reject scenes whose data to read exceeds this size in GB",
+    ),
+    metrics_json: Optional[Path] = typer.Option(
+        None, help="Write a JSON report of per-stage timings and throughput"
+    ),
+) -> Union[Path, Dict[str, Path]]:
     """Clips a satellite image using a shapefile.
 
     Clips input raster to the extent of provided shapefile while preserving
@@ -37,34 +156,137 @@ def clip(
         image: Path to multiband image file
         shapefile: Path to polygon shapefile
         output: Directory to save results
+        output_profile: Output layout (default, tiled, cog)
+        compress: Output compression
+        per_feature: Write one clipped image per feature
+        id_field: Feature attribute used to name per-feature outputs
+        workers: Number of features clipped concurrently
+        max_image_gb: Maximum size of the data to read in GB
+        metrics_json: Optional path of the JSON metrics report
 
     Returns:
-        Path: Path to clipped file
+        Path: Path to clipped file (dictionary of feature ids to files in
+        per-feature mode)
     """
     # Inicializar logging
     init_logging(Path(output))
     """
     Recorta una imagen satelital usando un shapefile de polígonos.
     """
-    logger.info(f"🛰️ Iniciando recorte de: {image}")
-    logger.info(f"🗺️ Usando shapefile: {shapefile}")
+    with run_metrics("clip", metrics_json):
+        logger.info(f"🛰️ Iniciando recorte de: {image}")
+        logger.info(f"🗺️ Usando shapefile: {shapefile}")
+
+        # Verificación previa con los metadatos antes de leer píxeles
+        try:
+            preflight(image, shapefile, max_size_gb=max_image_gb)
+        except SceneRejected as e:
+            logger.error(f"❌ {e}")
+            raise typer.Exit(code=1)
 
-    output.mkdir(parents=True, exist_ok=True)
+        output.mkdir(parents=True, exist_ok=True)
 
-    clipped_path = clip_image_with_shapefile(image, shapefile, output)
-    logger.success(f"✅ Imagen recortada guardada en: {clipped_path}")
+        if per_feature:
+            return clip_features(
+                image, shapefile, output, id_field, workers, output_profile, compress
+            )
 
-    return clipped_path
+        clipped_path = clip_image_with_shapefile(
+            image, shapefile, output, output_profile, compress
+        )
+        logger.success(f"✅ Imagen recortada guardada en: {clipped_path}")
+
+        return clipped_path
 
 
 @app.command("indices")
 def indices(
-    image: Path = typer.Option(..., exists=True, help="Multiband .tif file"),
+    image: Optional[Path] = typer.Option(
+        None,
+        exists=True,
+        help="Multiband .tif file or product directory with per-band files",
+    ),
+    band_file: Optional[List[str]] = typer.Option(
+        None, help="Per-band file as name=path (repeatable), instead of --image"
+    ),
     output: Path = typer.Option("results", help="Output directory"),
+    output_profile: str = typer.Option(
+        DEFAULT_OUTPUT_PROFILE,
+        help="Output layout: default, tiled or cog",
+        callback=check_output_profile,
+    ),
+    compress: Optional[str] = typer.Option(
+        None,
+        help="Output compression: deflate, zstd, lerc or none",
+        callback=check_compress,
+    ),
+    stack: bool = typer.Option(
+        False, help="Write all indices as bands of a single GeoTIFF"
+    ),
+    cache: bool = typer.Option(
+        True, help="Reuse cached outputs of unchanged images (--no-cache to recompute)"
+    ),
+    cache_dir: Optional[Path] = typer.Option(
+        None, help="Result cache directory (PASCAL_CACHE_DIR or ~/.cache by default)"
+    ),
     indices_list: Optional[List[str]] = typer.Option(
         None,
         help="List of indices to calculate (ndvi,ndre,savi). Calculates all by default.",
     ),
+    savi_l: Optional[List[float]] = typer.Option(
+        None, help="SAVI soil factor L (repeatable for several SAVI outputs)"
+    ),
+    streaming: bool = typer.Option(
+        False, help="Process the image by windows with bounded memory"
+    ),
+    tile_size: Optional[int] = typer.Option(
+        None,
+        help="Square tile size in pixels for streaming (internal blocks by default)",
+    ),
+    memory_mb: Optional[float] = typer.Option(
+        None, help="Memory budget per window in MB for streaming"
+    ),
+    workers: int = typer.Option(
+        DEFAULT_WORKERS, min=1, help="Number of threads computing windows in parallel"
+    ),
+    incremental: bool = typer.Option(
+        False, help="Only recompute the windows whose input pixels changed"
+    ),
+    sensor: Optional[str] = typer.Option(
+        None, help="Sensor profile for band identification (sentinel2, landsat8...)"
+    ),
+    resolution: Optional[float] = typer.Option(
+        None, help="Output pixel size in CRS units, e.g. 20 (native grid by default)"
+    ),
+    scale: Optional[float] = typer.Option(
+        None, min=1.0, help="Preview at reduced resolution, e.g. 8 for 1/8"
+    ),
+    max_size: Optional[int] = typer.Option(
+        None, min=1, help="Preview with the longest side limited to this many pixels"
+    ),
+    formula: Optional[List[str]] = typer.Option(
+        None, help="Custom index as name=expression over band names (repeatable)"
+    ),
+    cloud_mask: bool = typer.Option(
+        True, help="Mask clouds and shadows with the SCL/QA_PIXEL quality band"
+    ),
+    quality_file: Optional[Path] = typer.Option(
+        None, exists=True, help="Separate SCL or QA_PIXEL quality file"
+    ),
+    max_cloud: float = typer.Option(
+        MAX_CLOUD_COVERAGE,
+        min=0,
+        max=100,
+        help="Reject scenes whose AOI cloud percentage exceeds this value",
+    ),
+    max_image_gb: float = typer.Option(
+        MAX_IMAGE_SIZE_GB,
+        min=0,
+        help="Reject scenes whose data to read exceeds this size in GB",
+    ),
+    metrics_json: Optional[Path] = typer.Option(
+        None, help="Write a JSON report of per-stage timings and throughput"
+    ),
 ) -> Dict[str, Path]:
     """Calculates vegetation indices for a satellite image.
 
@@ -72,38 +294,186 @@ def indices(
     ISO 42001 calculation standards.
 
     Args:
-        image: Path to multiband image file
+        image: Path to multiband image file or product directory
+        band_file: Per-band files as name=path, instead of ``image``
         output: Directory to save results
+        output_profile: Output layout (default, tiled, cog)
+        compress: Output compression
+        stack: Write all indices as bands of a single GeoTIFF
+        cache: Reuse cached outputs of unchanged images
+        cache_dir: Result cache directory
         indices_list: Optional list of indices to calculate
+        savi_l: SAVI soil factors (0.5 by default)
+        streaming: Process the image by windows with bounded memory
+        tile_size: Square tile size for streaming
+        memory_mb: Memory budget per window for streaming
+        workers: Number of threads computing windows in parallel
+        incremental: Only recompute the windows whose input pixels changed
+        sensor: Sensor profile used to identify the bands
+        resolution: Output pixel size (native grid by default)
+        scale: Preview reduction factor
+        max_size: Preview size limit for the longest side
+        formula: Custom indices as name=expression
+        cloud_mask: Mask clouds and shadows with the scene quality band
+        quality_file: Separate quality band file
+        max_cloud: Maximum cloud percentage of the scene or AOI
+        max_image_gb: Maximum size of the data to read in GB
+        metrics_json: Optional path of the JSON metrics report
 
     Returns:
         Dict[str, Path]: Dictionary mapping index names to result files
     """
+    image, band_files = resolve_input(image, band_file)
+    formulas = resolve_formulas(formula)
+    index_names, factors = resolve_indices(indices_list, savi_l, formulas)
     # Inicializar logging
     init_logging(Path(output))
     """
     Calcula índices vegetativos (NDVI, NDRE, SAVI) a partir de una imagen.
     """
-    logger.info(f"🛰️ Procesando imagen: {image}")
-    logger.info("📊 Calculando índices vegetativos")  # Removido f-string innecesario
-
-    output.mkdir(parents=True, exist_ok=True)
-
-    result_paths = calculate_all_indices(image, output)
-
-    for index_name, path in result_paths.items():
-        logger.success(f"✅ Índice {index_name.upper()} guardado en: {path}")
+    with run_metrics("indices", metrics_json):
+        logger.info(f"🛰️ Procesando imagen: {image}")
+        logger.info(
+            "📊 Calculando índices vegetativos"
+        )  # Removido f-string innecesario
+
+        output.mkdir(parents=True, exist_ok=True)
+
+        try:
+            result_paths = process_scene(
+                image,
+                output,
+                cache=ResultCache(cache_dir) if cache else None,
+                band_files=band_files,
+                indices=index_names,
+                L=factors,
+                formulas=formulas,
+                streaming=streaming,
+                tile_size=tile_size,
+                memory_mb=memory_mb,
+                workers=workers,
+                output_profile=output_profile,
+                compress=compress,
+                stack=stack,
+                incremental=incremental,
+                sensor=sensor,
+                resolution=resolution,
+                scale=scale,
+                max_size=max_size,
+                cloud_mask=cloud_mask,
+                quality_file=quality_file,
+                max_cloud_coverage=max_cloud,
+                max_image_gb=max_image_gb,
+            )
+        except SceneRejected as e:
+            logger.warning(f"⏭️ {e}")
+            return {}
+
+        for index_name, path in result_paths.items():
+            logger.success(f"✅ Índice {index_name.upper()} guardado en: {path}")
 
-    return result_paths
+        return result_paths
 
 
 @app.command("auto")
 def auto_process(
-    image: Path = typer.Option(..., exists=True, help="Multiband .tif file"),
+    image: Optional[Path] = typer.Option(
+        None,
+        exists=True,
+        help="Multiband .tif file or product directory with per-band files",
+    ),
+    band_file: Optional[List[str]] = typer.Option(
+        None, help="Per-band file as name=path (repeatable), instead of --image"
+    ),
     shapefile: Optional[Path] = typer.Option(
         None, exists=True, help="Optional .shp file"
     ),
     output: Path = typer.Option("results", help="Output directory"),
+    output_profile: str = typer.Option(
+        DEFAULT_OUTPUT_PROFILE,
+        help="Output layout: default, tiled or cog",
+        callback=check_output_profile,
+    ),
+    compress: Optional[str] = typer.Option(
+        None,
+        help="Output compression: deflate, zstd, lerc or none",
+        callback=check_compress,
+    ),
+    stack: bool = typer.Option(
+        False, help="Write all indices as bands of a single GeoTIFF"
+    ),
+    cache: bool = typer.Option(
+        True, help="Reuse cached outputs of unchanged images (--no-cache to recompute)"
+    ),
+    cache_dir: Optional[Path] = typer.Option(
+        None, help="Result cache directory (PASCAL_CACHE_DIR or ~/.cache by default)"
+    ),
+    keep_clipped: bool = typer.Option(
+        False, help="Also write the intermediate clipped multiband image"
+    ),
+    per_feature: bool = typer.Option(
+        False, help="Compute the indices separately for every shapefile feature"
+    ),
+    id_field: Optional[str] = typer.Option(
+        None, help="Feature attribute used to name per-feature outputs"
+    ),
+    zonal_stats: Optional[str] = typer.Option(
+        None, help="Write per-polygon statistics table (csv, parquet, geojson)"
+    ),
+    write_rasters: bool = typer.Option(
+        True, help="Write the index rasters (disable to keep only zonal statistics)"
+    ),
+    streaming: bool = typer.Option(
+        False, help="Process the image by windows with bounded memory"
+    ),
+    tile_size: Optional[int] = typer.Option(
+        None,
+        help="Square tile size in pixels for streaming (internal blocks by default)",
+    ),
+    memory_mb: Optional[float] = typer.Option(
+        None, help="Memory budget per window in MB for streaming"
+    ),
+    workers: int = typer.Option(
+        DEFAULT_WORKERS, min=1, help="Number of threads computing windows in parallel"
+    ),
+    incremental: bool = typer.Option(
+        False, help="Only recompute the windows whose input pixels changed"
+    ),
+    sensor: Optional[str] = typer.Option(
+        None, help="Sensor profile for band identification (sentinel2, landsat8...)"
+    ),
+    resolution: Optional[float] = typer.Option(
+        None, help="Output pixel size in CRS units, e.g. 20 (native grid by default)"
+    ),
+    scale: Optional[float] = typer.Option(
+        None, min=1.0, help="Preview at reduced resolution, e.g. 8 for 1/8"
+    ),
+    max_size: Optional[int] = typer.Option(
+        None, min=1, help="Preview with the longest side limited to this many pixels"
+    ),
+    formula: Optional[List[str]] = typer.Option(
+        None, help="Custom index as name=expression over band names (repeatable)"
+    ),
+    cloud_mask: bool = typer.Option(
+        True, help="Mask clouds and shadows with the SCL/QA_PIXEL quality band"
+    ),
+    quality_file: Optional[Path] = typer.Option(
+        None, exists=True, help="Separate SCL or QA_PIXEL quality file"
+    ),
+    max_cloud: float = typer.Option(
+        MAX_CLOUD_COVERAGE,
+        min=0,
+        max=100,
+        help="Reject scenes whose AOI cloud percentage exceeds this value",
+    ),
+    max_image_gb: float = typer.Option(
+        MAX_IMAGE_SIZE_GB,
+        min=0,
+        help="Reject scenes whose data to read exceeds this size in GB",
+    ),
+    metrics_json: Optional[Path] = typer.Option(
+        None, help="Write a JSON report of per-stage timings and throughput"
+    ),
 ) -> Dict[str, Path]:
     """Processes an image automatically, optionally with clipping.
 
@@ -111,44 +481,360 @@ def auto_process(
     calculation of all vegetation indices.
 
     Args:
-        image: Path to multiband image file
+        image: Path to multiband image file or product directory
+        band_file: Per-band files as name=path, instead of ``image``
         shapefile: Optional path to clipping shapefile
         output: Directory to save results
+        output_profile: Output layout (default, tiled, cog)
+        compress: Output compression
+        stack: Write all indices as bands of a single GeoTIFF
+        cache: Reuse cached outputs of unchanged images
+        cache_dir: Result cache directory
+        keep_clipped: Also write the intermediate clipped image
+        per_feature: Compute the indices separately for every feature
+        id_field: Feature attribute used to name per-feature outputs
+        zonal_stats: Format of the per-polygon statistics table
+        write_rasters: Write the index rasters
+        streaming: Process the image by windows with bounded memory
+        tile_size: Square tile size for streaming
+        memory_mb: Memory budget per window for streaming
+        workers: Number of threads computing windows in parallel (features
+            in per-feature mode)
+        incremental: Only recompute the windows whose input pixels changed
+        sensor: Sensor profile used to identify the bands
+        resolution: Output pixel size (native grid by default)
+        scale: Preview reduction factor
+        max_size: Preview size limit for the longest side
+        formula: Custom indices as name=expression
+        cloud_mask: Mask clouds and shadows with the scene quality band
+        quality_file: Separate quality band file
+        max_cloud: Maximum cloud percentage of the scene or AOI
+        max_image_gb: Maximum size of the data to read in GB
+        metrics_json: Optional path of the JSON metrics report
 
     Returns:
         Dict[str, Path]: Dictionary mapping index names to result files
     """
+    image, band_files = resolve_input(image, band_file)
+    formulas = resolve_formulas(formula)
     # Inicializar logging
     init_logging(Path(output))
     """
     Proceso automático: opcional recorte + cálculo de todos los índices.
     """
-    logger.info(f"🚀 Iniciando procesamiento automático de {image}")
+    with run_metrics("auto", metrics_json):
+        logger.info(f"🚀 Iniciando procesamiento automático de {image}")
+
+        if per_feature and shapefile:
+            feature_paths = process_features(
+                image,
+                output,
+                shapefile,
+                id_field=id_field,
+                workers=workers,
+                band_files=band_files,
+                streaming=streaming,
+                tile_size=tile_size,
+                memory_mb=memory_mb,
+                output_profile=output_profile,
+                compress=compress,
+                stack=stack,
+                incremental=incremental,
+                sensor=sensor,
+                resolution=resolution,
+                scale=scale,
+                max_size=max_size,
+                formulas=formulas,
+                cloud_mask=cloud_mask,
+                quality_file=quality_file,
+                max_cloud_coverage=max_cloud,
+                max_image_gb=max_image_gb,
+            )
+            logger.success(
+                f"🏁 Procesamiento completo de {len(feature_paths)} polígonos. "
+                f"Resultados en: {output}"
+            )
+            return {
+                f"{fid}_{index_name}": path
+                for fid, paths in feature_paths.items()
+                for index_name, path in paths.items()
+            }
+
+        try:
+            result_paths = process_scene(
+                image,
+                output,
+                shapefile,
+                keep_clipped=keep_clipped,
+                cache=ResultCache(cache_dir) if cache else None,
+                band_files=band_files,
+                zonal_format=zonal_stats,
+                id_field=id_field,
+                write_rasters=write_rasters,
+                streaming=streaming,
+                tile_size=tile_size,
+                memory_mb=memory_mb,
+                workers=workers,
+                output_profile=output_profile,
+                compress=compress,
+                stack=stack,
+                incremental=incremental,
+                sensor=sensor,
+                resolution=resolution,
+                scale=scale,
+                max_size=max_size,
+                formulas=formulas,
+                cloud_mask=cloud_mask,
+                quality_file=quality_file,
+                max_cloud_coverage=max_cloud,
+                max_image_gb=max_image_gb,
+            )
+        except SceneRejected as e:
+            logger.warning(f"⏭️ {e}")
+            return {}
+
+        for index_name, path in result_paths.items():
+            logger.success(f"✅ Índice {index_name.upper()} guardado en: {path}")
+
+        logger.success(f"🏁 Procesamiento completo. Resultados en: {output}")
+        return result_paths
+
+
+@app.command("batch")
+def batch(
+    source: str = typer.Option(
+        ..., help="Directory, glob pattern or manifest (.json/.csv/.txt) of images"
+    ),
+    shapefile: Optional[Path] = typer.Option(
+        None, exists=True, help="Optional .shp file for images without their own"
+    ),
+    output: Path = typer.Option("results", help="Output directory"),
+    output_profile: str = typer.Option(
+        DEFAULT_OUTPUT_PROFILE,
+        help="Output layout: default, tiled or cog",
+        callback=check_output_profile,
+    ),
+    compress: Optional[str] = typer.Option(
+        None,
+        help="Output compression: deflate, zstd, lerc or none",
+        callback=check_compress,
+    ),
+    stack: bool = typer.Option(
+        False, help="Write all indices as bands of a single GeoTIFF"
+    ),
+    cache: bool = typer.Option(
+        True, help="Reuse cached outputs of unchanged images (--no-cache to recompute)"
+    ),
+    cache_dir: Optional[Path] = typer.Option(
+        None, help="Result cache directory (PASCAL_CACHE_DIR or ~/.cache by default)"
+    ),
+    workers: int = typer.Option(
+        DEFAULT_BATCH_WORKERS, min=1, help="Number of scenes processed concurrently"
+    ),
+    keep_clipped: bool = typer.Option(
+        False, help="Also write the intermediate clipped multiband images"
+    ),
+    streaming: bool = typer.Option(
+        False, help="Process each image by windows with bounded memory"
+    ),
+    tile_size: Optional[int] = typer.Option(
+        None,
+        help="Square tile size in pixels for streaming (internal blocks by default)",
+    ),
+    memory_mb: Optional[float] = typer.Option(
+        None, help="Memory budget per window in MB for streaming"
+    ),
+    cloud_mask: bool = typer.Option(
+        True, help="Mask clouds and shadows with the SCL/QA_PIXEL quality band"
+    ),
+    max_cloud: float = typer.Option(
+        MAX_CLOUD_COVERAGE,
+        min=0,
+        max=100,
+        help="Skip scenes whose AOI cloud percentage exceeds this value",
+    ),
+    max_image_gb: float = typer.Option(
+        MAX_IMAGE_SIZE_GB,
+        min=0,
+        help="Skip scenes whose data to read exceeds this size in GB",
+    ),
+    metrics_json: Optional[Path] = typer.Option(
+        None, help="Write a JSON report of per-stage timings and throughput"
+    ),
+) -> Dict[str, Any]:
+    """Processes many images concurrently with a single summary.
+
+    Runs the automatic pipeline (optional clipping plus all indices) for every
+    scene on a bounded worker pool. Failed scenes, and scenes rejected by the
+    pre-flight or cloud checks (e.g. tiles outside the AOI), are skipped and
+    reported in the summary without aborting the run.
+
+    Args:
+        source: Directory, glob pattern or manifest file of images
+        shapefile: Default clipping shapefile
+        output: Directory to save results
+        output_profile: Output layout (default, tiled, cog)
+        compress: Output compression
+        stack: Write all indices as bands of a single GeoTIFF
+        cache: Reuse cached outputs of unchanged images
+        cache_dir: Result cache directory
+        workers: Number of scenes processed concurrently
+        keep_clipped: Also write the intermediate clipped images
+        streaming: Process each image by windows with bounded memory
+        tile_size: Square tile size for streaming
+        memory_mb: Memory budget per window for streaming
+        cloud_mask: Mask clouds and shadows with the scene quality band
+        max_cloud: Maximum cloud percentage of a scene or AOI
+        max_image_gb: Maximum size of the data to read in GB
+        metrics_json: Optional path of the JSON metrics report
+
+    Returns:
+        Dict[str, Any]: Batch summary
+    """
+    # Inicializar logging una sola vez para todo el lote
+    init_logging(Path(output))
 
-    output.mkdir(parents=True, exist_ok=True)
+    with run_metrics("batch", metrics_json):
+        scenes = collect_scenes(source, shapefile)
+        if not scenes:
+            logger.error(f"❌ No se encontraron imágenes en: {source}")
+            raise typer.Exit(code=1)
+
+        return run_batch(
+            scenes,
+            output,
+            workers=workers,
+            keep_clipped=keep_clipped,
+            cache=ResultCache(cache_dir) if cache else None,
+            streaming=streaming,
+            tile_size=tile_size,
+            memory_mb=memory_mb,
+            output_profile=output_profile,
+            compress=compress,
+            stack=stack,
+            cloud_mask=cloud_mask,
+            max_cloud_coverage=max_cloud,
+            max_image_gb=max_image_gb,
+        )
+
+
+@app.command("timeseries")
+def timeseries(
+    source: str = typer.Option(
+        ..., help="Directory, glob pattern or manifest of co-registered scenes"
+    ),
+    output: Path = typer.Option("results", help="Output directory"),
+    indices_list: Optional[List[str]] = typer.Option(
+        None, help="Indices to compute per date (ndvi by default)"
+    ),
+    savi_l: Optional[List[float]] = typer.Option(
+        None, help="SAVI soil factor L (repeatable for several SAVI outputs)"
+    ),
+    formula: Optional[List[str]] = typer.Option(
+        None, help="Custom index as name=expression over band names (repeatable)"
+    ),
+    reduce: Optional[List[str]] = typer.Option(
+        None,
+        help="Per-pixel temporal reduction: max, mean, slope or count (repeatable)",
+    ),
+    cube: bool = typer.Option(
+        True, help="Write the per-date cube (--no-cube for reductions only)"
+    ),
+    stem: str = typer.Option("timeseries", help="Base name of the outputs"),
+    output_profile: str = typer.Option(
+        DEFAULT_OUTPUT_PROFILE,
+        help="Output layout: default, tiled or cog",
+        callback=check_output_profile,
+    ),
+    compress: Optional[str] = typer.Option(
+        None,
+        help="Output compression: deflate, zstd, lerc or none",
+        callback=check_compress,
+    ),
+    tile_size: Optional[int] = typer.Option(
+        None, help="Square tile size in pixels (internal blocks by default)"
+    ),
+    memory_mb: Optional[float] = typer.Option(
+        None, help="Memory budget per window in MB"
+    ),
+    workers: int = typer.Option(
+        DEFAULT_WORKERS, min=1, help="Number of threads computing windows in parallel"
+    ),
+    cloud_mask: bool = typer.Option(
+        True, help="Mask clouds and shadows with the SCL/QA_PIXEL quality band"
+    ),
+    sensor: Optional[str] = typer.Option(
+        None, help="Sensor profile for band identification (sentinel2, landsat8...)"
+    ),
+    metrics_json: Optional[Path] = typer.Option(
+        None, help="Write a JSON report of per-stage timings and throughput"
+    ),
+) -> Dict[str, Path]:
+    """Computes indices for many dates of the same tile into one cube.
 
-    # Paso 1: Recortar si se proporciona shapefile
-    processed_image = image
-    if shapefile:
-        logger.info("✂️ Recortando imagen")
-        logger.debug(f"Usando shapefile: {shapefile}")
-        processed_image = clip_image_with_shapefile(
-            image_path=image, shapefile_path=shapefile, output_path=output
-        )  # Realizar recorte
+    Processes the co-registered scenes window by window, writing one band per
+    date and streaming the requested per-pixel temporal reductions.
 
-    # Paso 2: Calcular índices
-    logger.info("📊 Calculando índices vegetativos")
-    result_paths = calculate_all_indices(processed_image, output)
+    Args:
+        source: Directory, glob pattern or manifest file of scenes
+        output: Directory to save results
+        indices_list: Indices to compute per date
+        savi_l: SAVI soil factors (0.5 by default)
+        formula: Custom indices as name=expression
+        reduce: Temporal reductions (max, mean, slope, count)
+        cube: Write the per-date cube
+        stem: Base name of the outputs
+        output_profile: Output layout (default, tiled, cog)
+        compress: Output compression
+        tile_size: Square tile size
+        memory_mb: Memory budget per window
+        workers: Number of threads computing windows in parallel
+        cloud_mask: Mask clouds and shadows with the scene quality bands
+        sensor: Sensor profile used to identify the bands
+        metrics_json: Optional path of the JSON metrics report
 
-    for index_name, path in result_paths.items():
-        logger.success(f"✅ Índice {index_name.upper()} guardado en: {path}")
+    Returns:
+        Dict[str, Path]: Dictionary mapping cube and reduction names to files
+    """
+    formulas = resolve_formulas(formula)
+    index_names, factors = resolve_indices(indices_list, savi_l, formulas)
+    init_logging(Path(output))
 
-    logger.success(f"🏁 Procesamiento completo. Resultados en: {output}")
-    return result_paths
+    with run_metrics("timeseries", metrics_json):
+        scenes = [image for image, _ in collect_scenes(source)]
+        if not scenes:
+            logger.error(f"❌ No se encontraron imágenes en: {source}")
+            raise typer.Exit(code=1)
+
+        result_paths = compute_timeseries(
+            scenes,
+            output,
+            indices=index_names,
+            L=factors,
+            reductions=split_indices(reduce) or (),
+            write_cube=cube,
+            stem=stem,
+            tile_size=tile_size,
+            memory_mb=memory_mb,
+            workers=workers,
+            output_profile=output_profile,
+            compress=compress,
+            sensor=sensor,
+            formulas=formulas,
+            cloud_mask=cloud_mask,
+        )
+        logger.success(f"🏁 Serie temporal de {len(scenes)} escenas en: {output}")
+        return result_paths
 
 
 def process_image(
-    image_path: Path, output_dir: Path, indices: List[str], savi_l: float = 0.5
+    image_path: Path,
+    output_dir: Path,
+    indices: List[str],
+    savi_l: Union[float, List[float]] = DEFAULT_SAVI_L,
+    use_cache: bool = False,
+    metrics_json: Optional[Path] = None,
+    **options: Any,
 ) -> Dict[str, Path]:
     """Main function for processing satellite imagery and calculating indices.
 
@@ -158,8 +844,15 @@ def process_image(
     Args:
         image_path: Path to multiband satellite image
         output_dir: Directory to save results
-        indices: List of indices to calculate (ndvi, savi, ndre)
-        savi_l: Adjustment factor for SAVI index
+        indices: List of indices to calculate (ndvi, savi, ndre, savi_<L>).
+            Only these are read, computed and written.
+        savi_l: Adjustment factor for SAVI index, or a list of factors to
+            write one SAVI output per factor
+        use_cache: Reuse previous outputs of an unchanged image from the
+            result cache (PASCAL_CACHE_DIR or ~/.cache). Off by default.
+        metrics_json: Optional path of the JSON metrics report
+        **options: Execution options forwarded to the index engine
+            (``streaming``, ``tile_size``, ``memory_mb``, ``workers``)
 
     Returns:
         Dictionary mapping index names to generated file paths
@@ -167,22 +860,24 @@ def process_image(
     # Inicializar logging
     init_logging(output_dir)
 
-    # Crear directorio de salida
-    output_dir.mkdir(parents=True, exist_ok=True)
+    with run_metrics("process_image", metrics_json):
+        # Crear directorio de salida
+        output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Procesar imagen y calcular índices
-    logger.info(f"🛰️ Procesando imagen: {image_path}")
-    logger.info(f"📊 Calculando índices: {', '.join(indices)}")
+        # Procesar imagen y calcular índices
+        logger.info(f"🛰️ Procesando imagen: {image_path}")
+        logger.info(f"📊 Calculando índices: {', '.join(indices)}")
 
-    result_paths = calculate_all_indices(image_path, output_dir)
+        cache = ResultCache() if use_cache else None
+        result_paths = process_scene(
+            image_path, output_dir, cache=cache, indices=indices, L=savi_l, **options
+        )
 
-    # Registrar resultados
-    for index_name, path in result_paths.items():
-        if index_name in indices:
+        # Registrar resultados
+        for index_name, path in result_paths.items():
             logger.success(f"✅ Índice {index_name.upper()} guardado en: {path}")
 
-    # Filtrar solo los índices solicitados
-    return {k: v for k, v in result_paths.items() if k in indices}
+        return result_paths
 
 
 if __name__ == "__main__":
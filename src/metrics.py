@@ -0,0 +1,167 @@
+"""Per-stage performance instrumentation for PASCAL NDVI Block.
+
+Measures wall time, bytes read and written, pixel throughput and peak memory
+of the pipeline stages (opening, band identification, reads, computation,
+writes, compression...). Stages are reported as ``key=value`` fields in the
+ISO 42001 audit log and aggregated per run into a machine-readable report
+that monitoring can scrape to catch performance regressions.
+"""
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from loguru import logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+_lock = threading.Lock()
+_current: Optional["RunMetrics"] = None
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak resident memory of the process in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _fields(name: str, totals: Dict[str, float]) -> Dict[str, Any]:
+    """Derived fields of a stage: throughput in pixels and MB per second."""
+    seconds = totals["seconds"]
+    fields: Dict[str, Any] = {"stage": name, **totals}
+    fields["pixels_per_second"] = (
+        round(totals["pixels"] / seconds, 1) if seconds and totals["pixels"] else None
+    )
+    moved = totals["bytes_read"] + totals["bytes_written"]
+    fields["mb_per_second"] = round(moved / 1024**2 / seconds, 2) if seconds else None
+    return fields
+
+
+def _message(fields: Dict[str, Any]) -> str:
+    return " ".join(f"{k}={v}" for k, v in fields.items() if v is not None)
+
+
+class RunMetrics:
+    """Aggregates the stage measurements of one command run.
+
+    Stage times measured on worker threads are summed, so the time of a
+    parallel stage can exceed the wall time of the run.
+
+    Args:
+        command: Name of the command being measured
+    """
+
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, seconds: float, fields: Dict[str, float]) -> None:
+        """Adds one measurement to the totals of a stage."""
+        with _lock:
+            totals = self.stages.setdefault(
+                name,
+                {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "bytes_read": 0,
+                    "bytes_written": 0,
+                    "pixels": 0,
+                },
+            )
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            for key, value in fields.items():
+                totals[key] = totals.get(key, 0) + value
+
+    def report(self) -> Dict[str, Any]:
+        """Machine-readable report of the run."""
+        with _lock:
+            stages = {
+                name: _fields(name, {**totals, "seconds": round(totals["seconds"], 4)})
+                for name, totals in self.stages.items()
+            }
+        return {
+            "command": self.command,
+            "started": self.started.isoformat(),
+            "seconds": round(time.perf_counter() - self._start, 4),
+            "peak_memory_mb": peak_memory_mb(),
+            "stages": stages,
+        }
+
+
+@contextmanager
+def stage(name: str, log: bool = True) -> Iterator[Dict[str, float]]:
+    """Measures one pipeline stage.
+
+    The caller adds ``bytes_read``, ``bytes_written`` and ``pixels`` to the
+    yielded dictionary. Stages run once per scene are logged immediately;
+    per-window stages (``log=False``) are only aggregated and appear in the
+    run summary.
+
+    Args:
+        name: Stage name
+        log: Write the measurement to the audit log
+
+    Yields:
+        Counters of the stage
+    """
+    fields: Dict[str, float] = {"bytes_read": 0, "bytes_written": 0, "pixels": 0}
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        seconds = time.perf_counter() - start
+        run = _current
+        if run is not None:
+            run.record(name, seconds, fields)
+        if log:
+            totals = {"calls": 1, "seconds": round(seconds, 4), **fields}
+            summary = _fields(name, totals)
+            summary["peak_memory_mb"] = peak_memory_mb()
+            logger.bind(metrics=summary).info(f"⏱️ {_message(summary)}")
+
+
+@contextmanager
+def run_metrics(
+    command: str, metrics_json: Optional[Path] = None
+) -> Iterator[RunMetrics]:
+    """Collects the stage measurements of a command run.
+
+    At the end the per-stage totals are written to the audit log and, with
+    ``metrics_json``, the report is saved as JSON.
+
+    Args:
+        command: Name of the command
+        metrics_json: Optional path of the JSON report
+    """
+    global _current
+    run = RunMetrics(command)
+    previous, _current = _current, run
+    try:
+        yield run
+    finally:
+        _current = previous
+        report = run.report()
+        for fields in report["stages"].values():
+            logger.bind(metrics=fields).info(f"📈 {_message(fields)}")
+        logger.info(
+            f"📈 comando={command} segundos={report['seconds']} "
+            f"memoria_pico_mb={report['peak_memory_mb']}"
+        )
+        if metrics_json is not None:
+            metrics_json.parent.mkdir(parents=True, exist_ok=True)
+            metrics_json.write_text(json.dumps(report, indent=2))
+            logger.info(f"📈 Métricas guardadas en {metrics_json}")
@@ -0,0 +1,297 @@
+"""Scene processing pipeline for PASCAL NDVI Block.
+
+Chains the preprocessing and index calculation steps for one scene without
+touching the logging configuration, so it can be reused by the CLI commands
+and by batch runs that initialize logging only once.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import rasterio
+from loguru import logger
+
+from .bandstack import find_band_files, scene_input, scene_stem
+from .cache import ResultCache
+from .config import DEFAULT_OUTPUT_PROFILE, MAX_IMAGE_SIZE_GB, QUALITY_BANDS
+from .indices import (
+    calculate_all_indices,
+    calculate_indices,
+    identify_bands,
+    plan_indices,
+    required_bands,
+)
+from .preprocessor import (
+    clip_image_with_shapefile,
+    load_features,
+    load_geometries,
+    preflight,
+)
+from .tiling import map_ordered
+from .zonal import TABLE_FORMATS, ZonalStats
+
+# Opciones que solo afectan a la ejecución, no al contenido de los resultados
+EXECUTION_OPTIONS = ("streaming", "tile_size", "memory_mb", "workers", "incremental")
+
+
+def result_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Filters the engine options that change the generated outputs."""
+    return {k: v for k, v in options.items() if k not in EXECUTION_OPTIONS}
+
+
+def _stack_bands(options: Dict[str, Any]) -> Tuple[str, ...]:
+    """Bands to take from a product directory: index bands and quality band."""
+    bands = required_bands(options.get("indices"), options.get("formulas"))
+    if options.get("cloud_mask", True):
+        bands += tuple(QUALITY_BANDS)
+    return bands
+
+
+def _preflight(
+    image_path: Path,
+    shapefile_path: Optional[Path],
+    max_image_gb: Optional[float],
+    options: Dict[str, Any],
+) -> None:
+    """Header-only checks of a scene for the indices requested in ``options``."""
+    plan = plan_indices(options.get("indices"), formulas=options.get("formulas"))
+    preflight(
+        image_path,
+        shapefile_path,
+        {key: definition.bands for key, definition in plan.items()},
+        options.get("sensor"),
+        max_image_gb,
+    )
+
+
+def _process_source(
+    image_path: Path,
+    output_dir: Path,
+    shapefile_path: Optional[Path],
+    keep_clipped: bool,
+    zonal_format: Optional[str],
+    id_field: Optional[str],
+    max_image_gb: Optional[float],
+    options: Dict[str, Any],
+) -> Dict[str, Path]:
+    """Clipping, index calculation and zonal statistics of one readable image."""
+    # Paso 0: Verificación previa con los metadatos, sin leer píxeles
+    _preflight(image_path, shapefile_path, max_image_gb, options)
+
+    # Paso 1: Recortar si se proporciona shapefile
+    processed_image = image_path
+    if shapefile_path:
+        logger.debug(f"Usando shapefile: {shapefile_path}")
+        if keep_clipped:
+            logger.info("✂️ Recortando imagen")
+            processed_image = clip_image_with_shapefile(
+                image_path=image_path,
+                shapefile_path=shapefile_path,
+                output_path=output_dir,
+                output_profile=options.get("output_profile", DEFAULT_OUTPUT_PROFILE),
+                compress=options.get("compress"),
+            )
+        elif not zonal_format:
+            logger.info("✂️ Recortando durante la lectura")
+            with rasterio.open(image_path) as src:
+                options["geometries"] = load_geometries(shapefile_path, src.crs)
+
+    # Estadísticas zonales calculadas junto con los índices
+    zonal = None
+    if zonal_format:
+        if not shapefile_path:
+            raise ValueError("Las estadísticas zonales requieren un shapefile")
+        if zonal_format not in TABLE_FORMATS:
+            raise ValueError(f"Formato de tabla no soportado: {zonal_format}")
+        with rasterio.open(processed_image) as src:
+            crs = src.crs
+            zonal = ZonalStats(load_features(shapefile_path, src, id_field))
+        options["zonal"] = zonal
+
+    # Paso 2: Calcular índices
+    logger.info("📊 Calculando índices vegetativos")
+    results = calculate_all_indices(processed_image, output_dir, **options)
+
+    if zonal is not None:
+        table = output_dir / f"{image_path.stem}_zonal_stats.{zonal_format}"
+        results["zonal_stats"] = zonal.write(table, crs)
+        logger.success(f"✅ Estadísticas zonales guardadas en {table}")
+
+    return results
+
+
+def process_scene(
+    image_path: Path,
+    output_dir: Path,
+    shapefile_path: Optional[Path] = None,
+    keep_clipped: bool = False,
+    zonal_format: Optional[str] = None,
+    id_field: Optional[str] = None,
+    cache: Optional[ResultCache] = None,
+    band_files: Optional[Dict[str, Path]] = None,
+    max_image_gb: Optional[float] = MAX_IMAGE_SIZE_GB,
+    **options: Any,
+) -> Dict[str, Path]:
+    """Processes one scene: optional clipping followed by index calculation.
+
+    By default clipping is fused with the index calculation (clip-on-read):
+    only the bands needed by the indices are read, within the window of the
+    shapefile polygons. With ``keep_clipped`` the full multiband clipped image
+    is written first and the indices are computed from it.
+
+    With ``zonal_format`` per-polygon statistics of every index are
+    accumulated in the same pass and written as ``<stem>_zonal_stats.<fmt>``
+    (returned under the ``zonal_stats`` key). Pass ``write_rasters=False`` to
+    skip the index rasters when only the table is needed.
+
+    With a ``cache``, an unchanged scene processed with the same parameters
+    restores the previous outputs into ``output_dir`` without recomputing.
+
+    Products delivered as one file per band are read through an in-memory
+    VRT, either from a product directory given as ``image_path`` or from an
+    explicit ``band_files`` mapping.
+
+    Before any pixel is read the scene is validated from its metadata
+    (``preprocessor.preflight``): a scene without the bands of the requested
+    indices, without overlap with the shapefile or larger than
+    ``max_image_gb`` is rejected with ``SceneRejected``.
+
+    Args:
+        image_path: Path to multiband satellite image or product directory
+        output_dir: Directory to save results
+        shapefile_path: Optional polygon shapefile to clip the image with
+        keep_clipped: Also write the intermediate ``_clipped.tif`` image
+        zonal_format: Zonal statistics table format (csv, parquet, geojson)
+        id_field: Feature attribute identifying the polygons in the table
+        cache: Optional result cache
+        band_files: Optional mapping of band names to per-band files
+        max_image_gb: Maximum size of the data to read in GB (None disables
+            the check)
+        **options: Execution options forwarded to the index engine
+
+    Returns:
+        Dictionary mapping index names to generated file paths
+
+    Raises:
+        SceneRejected: If the scene fails the pre-flight or cloud checks
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if band_files is None and image_path.is_dir():
+        # Solo los archivos de las bandas que leen los índices pedidos (y la
+        # banda de calidad para enmascarar nubes)
+        band_files = find_band_files(
+            image_path,
+            options.get("sensor"),
+            _stack_bands(options),
+            options.get("resolution"),
+        )
+
+    if cache is not None:
+        # El archivo de calidad entra en la clave por su huella, no por su ruta
+        params = result_options(options)
+        quality_file = params.pop("quality_file", None)
+        # Los nombres de las salidas restauradas dependen del nombre de la escena
+        params["stem"] = params.get("stem") or scene_stem(image_path, band_files)
+        key = cache.key(
+            band_files or image_path,
+            shapefile_path,
+            quality_file=Path(quality_file) if quality_file else None,
+            keep_clipped=keep_clipped,
+            zonal_format=zonal_format,
+            id_field=id_field,
+            **params,
+        )
+        cached = cache.get(key, output_dir)
+        if cached:
+            logger.info(f"♻️ Resultados recuperados de la caché para {image_path}")
+            return cached
+
+    with scene_input(
+        image_path, band_files, resolution=options.get("resolution")
+    ) as source:
+        results = _process_source(
+            source,
+            output_dir,
+            shapefile_path,
+            keep_clipped,
+            zonal_format,
+            id_field,
+            max_image_gb,
+            options,
+        )
+
+    if cache is not None and results:
+        cache.put(key, results)
+
+    return results
+
+
+def process_features(
+    image_path: Path,
+    output_dir: Path,
+    shapefile_path: Path,
+    id_field: Optional[str] = None,
+    workers: int = 1,
+    band_files: Optional[Dict[str, Path]] = None,
+    max_image_gb: Optional[float] = MAX_IMAGE_SIZE_GB,
+    **options: Any,
+) -> Dict[str, Dict[str, Path]]:
+    """Computes the indices separately for every shapefile feature.
+
+    Each parcel is clipped on read to its own window, so scattered parcels do
+    not force reading the bounding box of all of them. Features outside the
+    image are discarded through the shapefile spatial index and the remaining
+    ones are processed in parallel. A failing feature is logged and skipped.
+
+    Args:
+        image_path: Path to multiband satellite image or product directory
+        output_dir: Directory to save results
+        shapefile_path: Polygon shapefile with one feature per parcel
+        id_field: Attribute used to name the outputs (row index by default)
+        workers: Number of features processed concurrently
+        band_files: Optional mapping of band names to per-band files
+        max_image_gb: Maximum size of the data to read in GB (None disables
+            the check)
+        **options: Execution options forwarded to ``calculate_indices``
+
+    Returns:
+        Dictionary mapping feature ids to their index files
+
+    Raises:
+        SceneRejected: If the scene fails the pre-flight checks
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with scene_input(
+        image_path,
+        band_files,
+        options.get("sensor"),
+        options.get("resolution"),
+        _stack_bands(options),
+    ) as source:
+        _preflight(source, shapefile_path, max_image_gb, options)
+        with rasterio.open(source) as src:
+            features = load_features(shapefile_path, src, id_field)
+            # Mapeo de bandas resuelto una sola vez para todos los polígonos
+            if options.get("bands") is None:
+                options["bands"] = identify_bands(src, options.get("sensor"))
+        logger.info(f"🧩 Procesando {len(features)} polígonos con {workers} hilo(s)")
+
+        def run(feature: Tuple[str, Dict[str, Any]]) -> Dict[str, Path]:
+            fid, geom = feature
+            try:
+                return calculate_indices(
+                    source,
+                    output_dir,
+                    geometries=[geom],
+                    stem=f"{source.stem}_{fid}",
+                    **options,
+                )
+            except Exception as e:
+                logger.error(f"❌ Error procesando polígono {fid}: {e}")
+                return {}
+
+        return {
+            fid: paths
+            for (fid, _), paths in map_ordered(run, features, workers)
+            if paths
+        }
@@ -4,16 +4,292 @@ Provides functions for preparing images before index calculation, including
 shapefile clipping and data validation according to ISO 42001 standards.
 """
 
+import re
+import threading
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
 import rasterio
 import geopandas as gpd
+from affine import Affine
+from rasterio.errors import WindowError
+from rasterio.features import geometry_mask, geometry_window
 from rasterio.mask import mask
-from shapely.geometry import mapping
+from rasterio.crs import CRS
+from rasterio.warp import transform_bounds
+from rasterio.windows import Window
+from shapely.geometry import box, mapping
 from loguru import logger
+from .config import DEFAULT_OUTPUT_PROFILE, MAX_IMAGE_SIZE_GB
+from .metrics import stage
+from .sensors import band_mapping
+from .tiling import map_ordered
+from .writers import build_profile, finalize_output
+
+try:
+    import pyogrio
+except ImportError:  # geopandas con fiona
+    pyogrio = None
+
+
+class SceneRejected(ValueError):
+    """Raised when a scene cannot or should not be processed.
+
+    Pre-flight checks (size, bands, CRS, AOI overlap) and quality checks
+    (cloud coverage) raise it so batch runs can skip the scene.
+    """
+
+
+def _read_shapefile(shapefile_path: Path, crs: Any) -> gpd.GeoDataFrame:
+    """Reads a shapefile and reprojects it to the given CRS if needed."""
+    logger.info("🧩 Cargando shapefile...")
+    gdf = gpd.read_file(shapefile_path)
+    if gdf.crs != crs:
+        logger.warning(f"⚠️ Reproyectando shapefile desde {gdf.crs} a {crs}")
+        gdf = gdf.to_crs(crs)
+    return gdf
+
+
+def load_geometries(shapefile_path: Path, crs: Any) -> List[Dict[str, Any]]:
+    """Loads the polygons of a shapefile in the coordinate system of an image.
+
+    Args:
+        shapefile_path: Path to the .shp file
+        crs: Target coordinate reference system (usually ``src.crs``)
+
+    Returns:
+        List of GeoJSON-like geometry mappings
+    """
+    gdf = _read_shapefile(shapefile_path, crs)
+    return [mapping(geom) for geom in gdf.geometry]
+
+
+def load_features(
+    shapefile_path: Path, src: rasterio.DatasetReader, id_field: Optional[str] = None
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """Loads the shapefile features that overlap an image.
+
+    Uses the spatial index of the GeoDataFrame to discard features outside
+    the raster bounds before any pixel is read. Repeated identifiers (after
+    sanitizing them for file names) get the row index appended, so every
+    feature keeps its own outputs.
+
+    Args:
+        shapefile_path: Path to the .shp file
+        src: Rasterio dataset object
+        id_field: Attribute used as feature identifier (row index by default)
+
+    Returns:
+        List of (feature id, geometry mapping) tuples in shapefile order
+    """
+    gdf = _read_shapefile(shapefile_path, src.crs)
+    hits = sorted(gdf.sindex.query(box(*src.bounds), predicate="intersects"))
+    if len(hits) < len(gdf):
+        logger.warning(
+            f"⚠️ {len(gdf) - len(hits)} polígonos fuera de la imagen serán omitidos"
+        )
+
+    features = []
+    seen: Set[str] = set()
+    repeated: List[str] = []
+    for pos in hits:
+        row = gdf.iloc[pos]
+        fid = row[id_field] if id_field else gdf.index[pos]
+        # Identificador seguro para nombres de archivo
+        fid = re.sub(r"[^\w.-]+", "_", str(fid))
+        if fid in seen:
+            # Identificador repetido: se distingue con el índice de la fila
+            repeated.append(fid)
+            base = fid = f"{fid}_{gdf.index[pos]}"
+            n = 1
+            while fid in seen:
+                n += 1
+                fid = f"{base}_{n}"
+        seen.add(fid)
+        features.append((fid, mapping(row.geometry)))
+    if repeated:
+        logger.warning(
+            f"⚠️ Identificadores repetidos en {id_field or 'el índice'}: "
+            f"{', '.join(sorted(set(repeated)))}. Se añade el índice de la fila"
+        )
+    return features
+
+
+def aoi_window(src: rasterio.DatasetReader, geoms: List[Dict[str, Any]]) -> Window:
+    """Computes the raster window covered by a set of geometries.
+
+    Uses the same window as ``rasterio.mask.mask(..., crop=True)``.
+
+    Args:
+        src: Rasterio dataset object
+        geoms: Geometries in the dataset coordinate system
+
+    Returns:
+        Window of the dataset covering the geometries
+
+    Raises:
+        ValueError: If the geometries do not overlap the raster
+    """
+    try:
+        return geometry_window(src, geoms)
+    except WindowError:
+        raise ValueError("Las geometrías no se superponen con la imagen")
+
+
+def aoi_mask(
+    src: rasterio.DatasetReader,
+    geoms: List[Dict[str, Any]],
+    window: Window,
+    out_shape: Optional[Tuple[int, int]] = None,
+) -> np.ndarray:
+    """Rasterizes the geometries over a window of the dataset.
+
+    Args:
+        src: Rasterio dataset object
+        geoms: Geometries in the dataset coordinate system
+        window: Window of the dataset to rasterize
+        out_shape: Shape of the mask when the window is read resampled.
+            The window shape by default.
+
+    Returns:
+        Boolean array, True for pixels inside the geometries
+    """
+    transform = src.window_transform(window)
+    if out_shape is None:
+        out_shape = (int(window.height), int(window.width))
+    else:
+        transform *= Affine.scale(
+            window.width / out_shape[1], window.height / out_shape[0]
+        )
+    mask = geometry_mask(geoms, out_shape=out_shape, transform=transform, invert=True)
+    return np.asarray(mask, dtype=bool)
+
+
+def shapefile_extent(
+    shapefile_path: Path,
+) -> Tuple[Tuple[float, float, float, float], Any, int]:
+    """Reads the extent of a shapefile from its header.
+
+    Args:
+        shapefile_path: Path to the .shp file
+
+    Returns:
+        Tuple of (bounds, CRS, number of features). The CRS is None when the
+        shapefile has no projection.
+    """
+    if pyogrio is not None:
+        info = pyogrio.read_info(shapefile_path)
+        return tuple(info["total_bounds"]), info["crs"], int(info["features"])
+    # Sin pyogrio se leen las geometrías
+    gdf = gpd.read_file(shapefile_path)
+    return tuple(gdf.total_bounds), gdf.crs, len(gdf)
+
+
+def _aoi_region(src: rasterio.DatasetReader, shapefile_path: Path) -> Window:
+    """Window of the raster covered by the extent of a shapefile."""
+    if src.crs is None:
+        raise SceneRejected(
+            "Escena rechazada: la imagen no tiene sistema de coordenadas"
+        )
+    bounds, crs, count = shapefile_extent(shapefile_path)
+    if not count:
+        raise SceneRejected(
+            f"Escena rechazada: {shapefile_path.name} no tiene polígonos"
+        )
+    if crs is None:
+        raise SceneRejected(
+            f"Escena rechazada: {shapefile_path.name} no tiene sistema de coordenadas"
+        )
+    if CRS.from_user_input(crs) != src.crs:
+        bounds = transform_bounds(crs, src.crs, *bounds)
+
+    left, bottom = max(bounds[0], src.bounds.left), max(bounds[1], src.bounds.bottom)
+    right, top = min(bounds[2], src.bounds.right), min(bounds[3], src.bounds.top)
+    if left >= right or bottom >= top:
+        raise SceneRejected(
+            f"Escena rechazada: {shapefile_path.name} no se superpone con la imagen"
+        )
+    return src.window(left, bottom, right, top)
+
+
+def preflight(
+    image_path: Path,
+    shapefile_path: Optional[Path] = None,
+    index_bands: Optional[Dict[str, Tuple[str, ...]]] = None,
+    sensor: Optional[str] = None,
+    max_size_gb: Optional[float] = MAX_IMAGE_SIZE_GB,
+) -> Dict[str, int]:
+    """Validates a scene from its metadata before any pixel is read.
+
+    Only the raster header (size, data types, CRS, band descriptions and
+    tags) and the shapefile header (extent, CRS) are read, so a scene that
+    cannot be processed is rejected in milliseconds instead of failing after
+    its bands have been read. The scene is rejected when:
+
+    - the image or the shapefile has no CRS, or the shapefile extent does
+      not overlap the raster bounds;
+    - none of the requested indices has all its bands (e.g. no NIR band);
+    - the uncompressed size of the data to read (bands used by the indices,
+      every band without ``index_bands``, within the AOI extent) exceeds
+      ``max_size_gb``.
+
+    Args:
+        image_path: Path to the image (any dataset readable by rasterio)
+        shapefile_path: Optional AOI shapefile
+        index_bands: Mapping of requested indices to the bands they read
+        sensor: Sensor profile used to resolve the band mapping
+        max_size_gb: Maximum size of the data to read in GB. None disables
+            the check.
+
+    Returns:
+        Band mapping of the image (see ``sensors.band_mapping``)
+
+    Raises:
+        SceneRejected: If the scene fails a check
+    """
+    with stage("preflight"):
+        with rasterio.open(image_path) as src:
+            region = Window(0, 0, src.width, src.height)
+            if shapefile_path is not None:
+                region = _aoi_region(src, shapefile_path)
+
+            bands = band_mapping(src, sensor)
+            used = list(range(1, src.count + 1))
+            if index_bands is not None:
+                computable = [
+                    required
+                    for required in index_bands.values()
+                    if all(b in bands for b in required)
+                ]
+                if not computable:
+                    missing = sorted(
+                        {b for r in index_bands.values() for b in r if b not in bands}
+                    )
+                    raise SceneRejected(
+                        f"Escena rechazada: faltan las bandas {', '.join(missing)} "
+                        "de los índices pedidos"
+                    )
+                used = sorted({bands[b] for required in computable for b in required})
+
+            if max_size_gb is not None:
+                itemsize = sum(np.dtype(src.dtypes[i - 1]).itemsize for i in used)
+                size_gb = region.width * region.height * itemsize / 1024**3
+                if size_gb > max_size_gb:
+                    raise SceneRejected(
+                        f"Escena rechazada: {size_gb:.1f} GB a leer superan el "
+                        f"máximo de {max_size_gb:g} GB"
+                    )
+
+    logger.debug(f"Verificación previa superada: {image_path}")
+    return bands
 
 
 def clip_image_with_shapefile(
-    image_path: Path, shapefile_path: Path, output_path: Path
+    image_path: Path,
+    shapefile_path: Path,
+    output_path: Path,
+    output_profile: str = DEFAULT_OUTPUT_PROFILE,
+    compress: Optional[str] = None,
 ) -> Path:
     """Clips a multiband satellite image using a polygon shapefile.
 
@@ -24,38 +300,129 @@ def clip_image_with_shapefile(
         image_path: Path to the .tif file
         shapefile_path: Path to the .shp file
         output_path: Directory to save the result
+        output_profile: Output layout (default, tiled, cog)
+        compress: Output compression (deflate, zstd, lerc, none)
 
     Returns:
         Path to the new clipped TIFF file
     """
-    logger.info("🧩 Cargando shapefile...")
-    gdf = gpd.read_file(shapefile_path)
-
     logger.info("🌍 Cargando imagen satelital...")
     with rasterio.open(image_path) as src:
-        image_crs = src.crs
-        if gdf.crs != image_crs:
-            logger.warning(f"⚠️ Reproyectando shapefile desde {gdf.crs} a {image_crs}")
-            gdf = gdf.to_crs(image_crs)
-
-        geoms = [mapping(geom) for geom in gdf.geometry]
-        clipped_image, clipped_transform = mask(src, geoms, crop=True)
+        with stage("load_geometries"):
+            geoms = load_geometries(shapefile_path, src.crs)
+        with stage("clip_read") as counters:
+            clipped_image, clipped_transform = mask(src, geoms, crop=True)
+            counters["bytes_read"] += clipped_image.nbytes
+            counters["pixels"] += clipped_image.shape[1] * clipped_image.shape[2]
 
         meta = src.meta.copy()
         meta.update(
             {
-                "driver": "GTiff",
                 "height": clipped_image.shape[1],
                 "width": clipped_image.shape[2],
                 "transform": clipped_transform,
             }
         )
+        meta = build_profile(meta, output_profile, compress)
 
         output_path.mkdir(parents=True, exist_ok=True)
         out_file = output_path / f"{image_path.stem}_clipped.tif"
-        with rasterio.open(out_file, "w", **meta) as dst:
-            dst.write(clipped_image)
+        with stage("clip_write") as counters:
+            with rasterio.open(out_file, "w", **meta) as dst:
+                dst.write(clipped_image)
+                # Conservar metadatos por banda para la identificación de bandas
+                dst.descriptions = src.descriptions
+                for i in range(1, src.count + 1):
+                    dst.update_tags(i, **src.tags(i))
+            finalize_output(out_file, output_profile, compress)
+            counters["bytes_written"] += out_file.stat().st_size
+            counters["pixels"] += clipped_image.shape[1] * clipped_image.shape[2]
 
         logger.success(f"✅ Imagen recortada guardada en {out_file}")
 
         return out_file
+
+
+def clip_features(
+    image_path: Path,
+    shapefile_path: Path,
+    output_path: Path,
+    id_field: Optional[str] = None,
+    workers: int = 1,
+    output_profile: str = DEFAULT_OUTPUT_PROFILE,
+    compress: Optional[str] = None,
+) -> Dict[str, Path]:
+    """Clips an image once per shapefile feature.
+
+    Each feature is clipped to its own window, so only the pixels under that
+    feature are read, instead of the bounding box of all features. Features
+    are processed in parallel with one dataset handle per thread.
+
+    Args:
+        image_path: Path to the .tif file
+        shapefile_path: Path to the .shp file
+        output_path: Directory to save the results
+        id_field: Attribute used to name the outputs (row index by default)
+        workers: Number of features clipped concurrently
+        output_profile: Output layout (default, tiled, cog)
+        compress: Output compression (deflate, zstd, lerc, none)
+
+    Returns:
+        Dictionary mapping feature ids to clipped TIFF files
+    """
+    output_path.mkdir(parents=True, exist_ok=True)
+    local = threading.local()
+    handles: List[rasterio.DatasetReader] = []
+    lock = threading.Lock()
+
+    with rasterio.open(image_path) as src:
+        features = load_features(shapefile_path, src, id_field)
+        meta = src.meta.copy()
+        descriptions = src.descriptions
+        tags = [src.tags(i) for i in range(1, src.count + 1)]
+
+    def clip_one(feature: Tuple[str, Dict[str, Any]]) -> Path:
+        fid, geom = feature
+        reader = getattr(local, "src", None)
+        if reader is None:
+            reader = local.src = rasterio.open(image_path)
+            with lock:
+                handles.append(reader)
+
+        with stage("clip_read", log=False) as counters:
+            clipped_image, clipped_transform = mask(reader, [geom], crop=True)
+            counters["bytes_read"] += clipped_image.nbytes
+            counters["pixels"] += clipped_image.shape[1] * clipped_image.shape[2]
+        feature_meta = dict(meta)
+        feature_meta.update(
+            {
+                "height": clipped_image.shape[1],
+                "width": clipped_image.shape[2],
+                "transform": clipped_transform,
+            }
+        )
+        feature_meta = build_profile(feature_meta, output_profile, compress)
+        out_file = output_path / f"{image_path.stem}_{fid}_clipped.tif"
+        with stage("clip_write", log=False) as counters:
+            with rasterio.open(out_file, "w", **feature_meta) as dst:
+                dst.write(clipped_image)
+                dst.descriptions = descriptions
+                for i, band_tags in enumerate(tags, start=1):
+                    dst.update_tags(i, **band_tags)
+            finalize_output(out_file, output_profile, compress)
+            counters["bytes_written"] += out_file.stat().st_size
+            counters["pixels"] += clipped_image.shape[1] * clipped_image.shape[2]
+        return out_file
+
+    results = {}
+    try:
+        for (fid, _), out_file in map_ordered(clip_one, features, workers):
+            results[fid] = out_file
+    finally:
+        for reader in handles:
+            reader.close()
+
+    logger.success(
+        f"✅ {len(results)} recortes por polígono guardados en {output_path}"
+    )
+    return results
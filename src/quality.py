@@ -0,0 +1,206 @@
+"""Cloud and quality masking for PASCAL NDVI Block.
+
+Sentinel-2 L2A products carry a scene classification layer (SCL) and Landsat
+Collection 2 products a QA_PIXEL bit mask. When one of them is available,
+as a band of the image (described ``SCL``/``QA_PIXEL`` or stacked from the
+per-band files of a product) or as a separate file, cloud and cloud shadow
+pixels are masked inside the index windows like any other invalid pixel.
+
+The cloud percentage of the scene or AOI is estimated from a decimated read
+of the quality band alone, so scenes too cloudy to be useful are rejected
+before any spectral band is read.
+"""
+
+import math
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.windows import Window, bounds
+
+from .config import QUALITY_BANDS, QUALITY_PREVIEW_SIZE
+from .preprocessor import aoi_mask
+
+
+def classify(kind: str, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Classifies the pixels of a quality band.
+
+    Args:
+        kind: Quality band type (``scl`` or ``qa_pixel``)
+        values: Quality band values
+
+    Returns:
+        Tuple of boolean arrays (cloudy, nodata)
+    """
+    spec = QUALITY_BANDS[kind]
+    if "cloud_bits" in spec:
+        cloud_bits = sum(1 << bit for bit in spec["cloud_bits"])
+        nodata_bits = sum(1 << bit for bit in spec["nodata_bits"])
+        values = values.astype(np.uint32, copy=False)
+        return (values & cloud_bits) > 0, (values & nodata_bits) > 0
+    return np.isin(values, spec["cloud_values"]), np.isin(values, spec["nodata_values"])
+
+
+def _kind_from_name(path: Path, dtype: str) -> str:
+    """Quality band type of a separate file, from its name or data type."""
+    name = path.stem.upper()
+    if "QA_PIXEL" in name:
+        return "qa_pixel"
+    if "SCL" in name:
+        return "scl"
+    return "scl" if dtype == "uint8" else "qa_pixel"
+
+
+class QualityMask:
+    """Clear-sky masks from the quality band of a scene.
+
+    A separate quality file is opened once per thread, since rasterio
+    datasets are not thread-safe. Call ``close`` when done.
+
+    Args:
+        kind: Quality band type (``scl`` or ``qa_pixel``)
+        band: Index of the quality band in its dataset
+        path: Separate quality file. The band belongs to the image otherwise.
+    """
+
+    def __init__(self, kind: str, band: int, path: Optional[Path] = None) -> None:
+        self.kind = kind
+        self.band = band
+        self.path = path
+        spec = QUALITY_BANDS[kind]
+        # Valor de relleno fuera del archivo de calidad: sin dato
+        if "nodata_bits" in spec:
+            self.fill = 1 << spec["nodata_bits"][0]
+        else:
+            self.fill = spec["nodata_values"][0]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._handles: List[Any] = []
+
+    def _dataset(self, reader: rasterio.DatasetReader) -> rasterio.DatasetReader:
+        if self.path is None:
+            return reader
+        dataset = getattr(self._local, "src", None)
+        if dataset is None:
+            dataset = self._local.src = rasterio.open(self.path)
+            with self._lock:
+                self._handles.append(dataset)
+        return dataset
+
+    def read(
+        self,
+        reader: rasterio.DatasetReader,
+        window: Window,
+        out_shape: Optional[Tuple[int, int]] = None,
+    ) -> np.ndarray:
+        """Reads the quality values covering a window of the image.
+
+        Args:
+            reader: Open image dataset
+            window: Window of the image
+            out_shape: Shape of the result. The window shape by default.
+
+        Returns:
+            Quality values resampled with nearest neighbour
+        """
+        if out_shape is None:
+            out_shape = (int(window.height), int(window.width))
+        dataset = self._dataset(reader)
+        if dataset is reader:
+            values = reader.read(
+                self.band,
+                window=window,
+                out_shape=out_shape,
+                resampling=Resampling.nearest,
+            )
+        else:
+            # Archivo aparte: misma extensión, en su propia malla
+            values = dataset.read(
+                self.band,
+                window=dataset.window(*bounds(window, reader.transform)),
+                out_shape=out_shape,
+                resampling=Resampling.nearest,
+                boundless=True,
+                fill_value=self.fill,
+            )
+        return np.asarray(values)
+
+    def clear(
+        self,
+        reader: rasterio.DatasetReader,
+        window: Window,
+        out_shape: Optional[Tuple[int, int]] = None,
+    ) -> np.ndarray:
+        """Boolean mask of a window, True for pixels free of clouds and shadows."""
+        cloudy, nodata = classify(self.kind, self.read(reader, window, out_shape))
+        return np.asarray(~(cloudy | nodata), dtype=bool)
+
+    def coverage(
+        self,
+        reader: rasterio.DatasetReader,
+        region: Window,
+        geometries: Optional[List[Dict[str, Any]]] = None,
+        max_size: int = QUALITY_PREVIEW_SIZE,
+    ) -> Optional[float]:
+        """Estimates the cloud percentage of a region of the image.
+
+        Reads the quality band decimated until its longest side fits
+        ``max_size`` pixels (served from overviews when they exist) and
+        counts cloudy pixels among the valid ones, inside the geometries
+        when given.
+
+        Args:
+            reader: Open image dataset
+            region: Window of the image to assess
+            geometries: Optional AOI geometries in the image CRS
+            max_size: Longest side of the decimated read in pixels
+
+        Returns:
+            Cloud percentage (0-100), or None without valid quality pixels
+        """
+        factor = max(1.0, max(region.width, region.height) / max_size)
+        out_shape = (
+            max(1, math.floor(region.height / factor)),
+            max(1, math.floor(region.width / factor)),
+        )
+        cloudy, nodata = classify(self.kind, self.read(reader, region, out_shape))
+        valid = ~nodata
+        if geometries is not None:
+            valid &= aoi_mask(reader, geometries, region, out_shape)
+        total = int(valid.sum())
+        if not total:
+            return None
+        return 100.0 * int((cloudy & valid).sum()) / total
+
+    def close(self) -> None:
+        """Closes the quality files opened by the worker threads."""
+        with self._lock:
+            for dataset in self._handles:
+                dataset.close()
+            self._handles.clear()
+
+
+def quality_mask(
+    bands: Dict[str, int], quality_file: Optional[Path] = None
+) -> Optional[QualityMask]:
+    """Locates the quality band of a scene.
+
+    Args:
+        bands: Band mapping of the image (see ``identify_bands``)
+        quality_file: Separate SCL or QA_PIXEL file. Takes precedence over a
+            quality band of the image.
+
+    Returns:
+        QualityMask, or None when the scene has no quality band
+    """
+    if quality_file is not None:
+        with rasterio.open(quality_file) as src:
+            kind = _kind_from_name(quality_file, src.dtypes[0])
+        return QualityMask(kind, 1, quality_file)
+    for kind in QUALITY_BANDS:
+        if kind in bands:
+            return QualityMask(kind, bands[kind])
+    return None
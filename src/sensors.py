@@ -0,0 +1,199 @@
+"""Sensor profiles and band identification for PASCAL NDVI Block.
+
+Resolves which dataset band holds each logical band (red, nir, red_edge1...)
+from the band descriptions, the wavelength tags or the sensor profiles in
+``config.SUPPORTED_SATELLITES``. The mapping is resolved once per file and
+memoized, so repeated index computations on the same image (or on remote/VSI
+files, where every metadata access is a request) do not walk the band
+metadata again.
+"""
+
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import rasterio
+from loguru import logger
+
+from .config import (
+    BAND_WAVELENGTHS,
+    GENERIC_BAND_ORDER,
+    SUPPORTED_SATELLITES,
+    SensorProfile,
+)
+
+# Mapeos de bandas memorizados por archivo
+BAND_CACHE_SIZE = 256
+
+_cache: Dict[Tuple[str, Any, Optional[str]], Dict[str, int]] = {}
+_lock = threading.Lock()
+
+
+def normalize_band_name(name: str) -> str:
+    """Normalizes a band name: ``b04``, ``B4`` and ``B04`` compare equal."""
+    name = name.strip().upper()
+    return re.sub(r"^B0*(?=\w)", "B", name)
+
+
+def sensor_profile(sensor: str) -> SensorProfile:
+    """Returns the configuration entry of a sensor profile."""
+    try:
+        return SUPPORTED_SATELLITES[sensor]
+    except KeyError:
+        raise ValueError(f"Sensor no soportado: {sensor}") from None
+
+
+def detect_sensor(names: Iterable[str]) -> Optional[str]:
+    """Detects the sensor of a product from its directory or file names."""
+    for name in names:
+        for sensor, profile in SUPPORTED_SATELLITES.items():
+            pattern = profile.get("product_pattern")
+            if pattern and re.match(pattern, name):
+                return sensor
+    return None
+
+
+def _from_descriptions(
+    descriptions: Tuple[Optional[str], ...], sensor: Optional[str]
+) -> Dict[str, int]:
+    """Matches band descriptions with logical or sensor band names.
+
+    Without ``sensor`` every profile is scored by its number of matched
+    descriptions and, on a tie, by how many match its band names literally
+    (``B5`` is Landsat NIR, ``B05`` Sentinel-2 red-edge). Profiles that stay
+    tied with different mappings are ambiguous and none of them is used.
+    """
+    literal = [d.strip().upper() if d else None for d in descriptions]
+    names = [normalize_band_name(d) if d else None for d in literal]
+    sensors = [sensor] if sensor else list(SUPPORTED_SATELLITES)
+
+    scored = []
+    for candidate in sensors:
+        profile_bands = sensor_profile(candidate).get("bands", {})
+        lookup = {
+            normalize_band_name(band): logical
+            for logical, band in profile_bands.items()
+        }
+        exact = {band.upper() for band in profile_bands.values()}
+        bands = {
+            lookup[name]: i for i, name in enumerate(names, start=1) if name in lookup
+        }
+        score = (len(bands), sum(1 for d in literal if d in exact))
+        scored.append((score, bands))
+
+    best: Dict[str, int] = {}
+    if scored:
+        top = max(score for score, _ in scored)
+        mappings = [bands for score, bands in scored if score == top]
+        if all(bands == mappings[0] for bands in mappings):
+            best = dict(mappings[0])
+        else:
+            logger.debug("Descripciones de banda ambiguas entre perfiles de sensor")
+
+    # Descripciones con el nombre lógico de la banda ("red", "nir"...)
+    logical = {normalize_band_name(band): band for band in BAND_WAVELENGTHS}
+    for i, name in enumerate(names, start=1):
+        if name in logical:
+            best.setdefault(logical[name], i)
+    return best
+
+
+def _from_wavelengths(src: rasterio.DatasetReader) -> Dict[str, int]:
+    """Identifies bands from their ``wavelength_nm`` tags."""
+    bands: Dict[str, int] = {}
+    for i in range(1, src.count + 1):
+        tags = src.tags(i)
+        if "wavelength_nm" not in tags:
+            continue
+        wavelength = float(tags["wavelength_nm"])
+        for band, (low, high) in BAND_WAVELENGTHS.items():
+            if low <= wavelength <= high:
+                bands[band] = i
+                break
+    return bands
+
+
+def _from_positions(count: int, sensor: Optional[str]) -> Dict[str, int]:
+    """Assumes the band order of a sensor profile (or a generic order)."""
+    if sensor:
+        return dict(sensor_profile(sensor).get("positions", {}))
+
+    # Perfil con más bandas compatible con el número de bandas de la imagen
+    candidates = [
+        profile
+        for profile in SUPPORTED_SATELLITES.values()
+        if "positions" in profile and count >= profile.get("min_count", 0)
+    ]
+    if candidates:
+        profile = max(candidates, key=lambda p: p.get("min_count", 0))
+        return dict(profile["positions"])
+    return {band: i for i, band in enumerate(GENERIC_BAND_ORDER[:count], start=1)}
+
+
+def resolve_bands(
+    src: rasterio.DatasetReader, sensor: Optional[str] = None
+) -> Dict[str, int]:
+    """Resolves the logical band mapping of a dataset.
+
+    Band descriptions are tried first (sensor band names such as ``B04`` or
+    logical names such as ``nir``), then the ``wavelength_nm`` tags and
+    finally the positional layout of a sensor profile. When the descriptions
+    do not identify the NIR band, the wavelength tags take precedence for
+    the bands they identify.
+
+    Args:
+        src: Open dataset
+        sensor: Sensor profile from ``config.SUPPORTED_SATELLITES``. Without
+            it every profile is considered.
+
+    Returns:
+        Dictionary mapping band names to their indices in the dataset
+    """
+    bands = _from_descriptions(src.descriptions, sensor)
+    if "nir" not in bands:
+        # Coincidencia parcial sin NIR: mandan las longitudes de onda
+        measured = _from_wavelengths(src)
+        used = set(measured.values())
+        bands = {
+            **{name: i for name, i in bands.items() if i not in used},
+            **measured,
+        }
+    if not bands:
+        bands = _from_positions(src.count, sensor)
+    bands = {name: i for name, i in bands.items() if i <= src.count}
+
+    if "nir" not in bands:
+        logger.warning(
+            "⚠️ No se pudo identificar la banda NIR, necesaria para índices vegetativos"
+        )
+    return bands
+
+
+def _file_stamp(name: str) -> Optional[Tuple[int, int]]:
+    """Size and modification time of a local file (None for remote files)."""
+    try:
+        stat = os.stat(name)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def band_mapping(
+    src: rasterio.DatasetReader, sensor: Optional[str] = None
+) -> Dict[str, int]:
+    """Memoized ``resolve_bands``: resolves each file only once.
+
+    Local files are keyed by path, size and modification time, so an updated
+    file is resolved again; remote files are keyed by their name.
+    """
+    key = (src.name, _file_stamp(src.name), sensor)
+    with _lock:
+        cached = _cache.get(key)
+    if cached is None:
+        cached = resolve_bands(src, sensor)
+        with _lock:
+            if len(_cache) >= BAND_CACHE_SIZE:
+                _cache.pop(next(iter(_cache)))
+            _cache[key] = cached
+    return dict(cached)
@@ -0,0 +1,159 @@
+"""Window planning for block-streaming raster processing.
+
+Splits a raster grid into windows aligned with its internal block layout (or
+a fixed tile size) so that index computation runs with bounded memory,
+regardless of the scene size, and distributes windows over a thread pool.
+Window sizing for a memory budget and the per-window validity masks are
+shared by the single-scene and time-series engines.
+"""
+
+import math
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def plan_windows(
+    width: int,
+    height: int,
+    block_shape: Tuple[int, int],
+    tile_size: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+) -> List[Window]:
+    """Plans the windows that cover a raster grid.
+
+    Args:
+        width: Raster width in pixels
+        height: Raster height in pixels
+        block_shape: Internal block shape of the dataset as (rows, cols)
+        tile_size: Fixed square tile size. Takes precedence over the blocks.
+        max_pixels: Maximum pixels per window. Blocks are grouped up to this
+            limit; without it every internal block is one window.
+
+    Returns:
+        List of windows covering the grid in row-major order
+    """
+    if tile_size is not None:
+        if tile_size <= 0:
+            raise ValueError(f"Tamaño de tile inválido: {tile_size}")
+        win_h = win_w = tile_size
+    else:
+        block_h, block_w = block_shape
+        block_h, block_w = max(1, min(block_h, height)), max(1, min(block_w, width))
+        if max_pixels is None:
+            win_h, win_w = block_h, block_w
+        elif max_pixels >= width * block_h:
+            # Filas completas de bloques
+            win_w = width
+            win_h = max(block_h, (max_pixels // width) // block_h * block_h)
+        else:
+            side = int(math.sqrt(max_pixels))
+            win_w = max(block_w, side // block_w * block_w)
+            win_h = max(block_h, (max_pixels // win_w) // block_h * block_h)
+
+    return [
+        Window(col, row, min(win_w, width - col), min(win_h, height - row))
+        for row in range(0, height, win_h)
+        for col in range(0, width, win_w)
+    ]
+
+
+def max_window_pixels(
+    memory_mb: float, n_bands: int, n_indices: int, n_scratch: int = 2
+) -> int:
+    """Estimates how many pixels fit in a window for a memory budget.
+
+    Accounts for the float32 band arrays, the intermediate buffers of the
+    evaluation plan, the source validity and zone label masks and the float32
+    outputs of every index.
+    """
+    bytes_per_pixel = (n_bands + n_scratch + n_indices) * 4 + 2
+    return max(1, int(memory_mb * 1024 * 1024 // bytes_per_pixel))
+
+
+def window_masks(
+    reader: rasterio.DatasetReader,
+    window: Window,
+    bands: Dict[str, int],
+    masked_bands: List[str],
+    index_bands: Dict[str, Tuple[str, ...]],
+    region_mask: Optional[np.ndarray] = None,
+    out_shape: Optional[Tuple[int, int]] = None,
+) -> Dict[str, Optional[np.ndarray]]:
+    """Builds the validity mask of each index for one window.
+
+    Reads one mask per band, combines them once per band set and shares the
+    result between the indices using the same bands (NDVI and SAVI). The
+    indices are given as a mapping of result keys to their bands. The
+    optional ``region_mask`` (e.g. a rasterized AOI) applies to every index.
+    With ``out_shape`` the masks are resampled to the output grid.
+
+    Returns:
+        Mapping of index names to boolean masks (None when all pixels are valid)
+    """
+    band_masks = {
+        b: reader.read_masks(bands[b], window=window, out_shape=out_shape) > 0
+        for b in masked_bands
+    }
+    combined: Dict[Tuple[str, ...], Optional[np.ndarray]] = {}
+    masks: Dict[str, Optional[np.ndarray]] = {}
+    for name, required in index_bands.items():
+        key = tuple(b for b in required if b in band_masks)
+        if key not in combined:
+            mask = region_mask
+            for b in key:
+                mask = band_masks[b] if mask is None else mask & band_masks[b]
+            combined[key] = mask
+        masks[name] = combined[key]
+    return masks
+
+
+def map_ordered(
+    func: Callable[[T], R], items: Sequence[T], workers: int = 1
+) -> Iterator[Tuple[T, R]]:
+    """Applies a function to items on a thread pool, yielding results in order.
+
+    At most ``2 * workers`` items are in flight at any time, so results are
+    consumed (e.g. written to disk) as they complete without accumulating the
+    whole raster in memory.
+
+    Args:
+        func: Function to apply to each item
+        items: Items to process (typically windows)
+        workers: Number of worker threads. 1 runs sequentially.
+
+    Yields:
+        Tuples of (item, result) in the original order
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: Deque[Tuple[T, "Future[R]"]] = deque()
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= 2 * workers:
+                done_item, future = pending.popleft()
+                yield done_item, future.result()
+        while pending:
+            done_item, future = pending.popleft()
+            yield done_item, future.result()
@@ -0,0 +1,347 @@
+"""Time-series index cubes for PASCAL NDVI Block.
+
+Computes an index for many acquisition dates of the same tile in a single
+run. The co-registered scenes are processed window by window: for each
+window the bands of every date are read, the index is evaluated and written
+as one band per date of a cube GeoTIFF, and per-pixel temporal reductions
+(maximum composite, mean, trend slope, valid observation count) are updated
+date by date with running sums. Neither the cube nor the reductions of the
+whole tile are ever held in memory.
+"""
+
+import re
+import threading
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import rasterio
+from loguru import logger
+from rasterio.enums import MaskFlags
+from rasterio.windows import Window
+
+from .config import DEFAULT_MEMORY_BUDGET_MB, DEFAULT_OUTPUT_PROFILE, DEFAULT_SAVI_L
+from .expressions import compile_indices
+from .indices import plan_indices
+from .metrics import stage
+from .quality import quality_mask
+from .sensors import band_mapping
+from .tiling import map_ordered, max_window_pixels, plan_windows, window_masks
+from .writers import build_profile, finalize_output
+
+# Reducciones temporales por píxel disponibles
+REDUCTIONS = ("max", "mean", "slope", "count")
+# Fecha de adquisición en el nombre de la escena (20240115, 2024-01-15...)
+_DATE_PATTERN = re.compile(r"(?<!\d)(\d{4})-?(\d{2})-?(\d{2})(?!\d)")
+
+
+def scene_date(path: Path) -> Optional[datetime]:
+    """Acquisition date in a scene file name, if any."""
+    for match in _DATE_PATTERN.finditer(path.stem):
+        try:
+            year, month, day = (int(g) for g in match.groups())
+            return datetime(year, month, day)
+        except ValueError:
+            continue
+    return None
+
+
+def order_scenes(
+    scenes: Sequence[Path],
+) -> Tuple[List[Path], Optional[List[datetime]]]:
+    """Sorts scenes by the date in their names.
+
+    Returns:
+        Sorted scenes and their dates, or the input order and None when a
+        scene name has no date
+    """
+    pairs: List[Tuple[Path, datetime]] = []
+    for path in scenes:
+        date = scene_date(path)
+        if date is None:
+            return list(scenes), None
+        pairs.append((path, date))
+    pairs.sort(key=lambda pair: pair[1])
+    return [p for p, _ in pairs], [d for _, d in pairs]
+
+
+def _check_grid(sources: List[rasterio.DatasetReader]) -> None:
+    """Ensures every scene is on the grid of the first one."""
+    first = sources[0]
+    for src in sources[1:]:
+        if (
+            src.crs != first.crs
+            or src.transform != first.transform
+            or src.shape != first.shape
+        ):
+            raise ValueError(
+                f"La escena {src.name} no está co-registrada con {first.name}"
+            )
+
+
+class _Reducer:
+    """Running per-pixel temporal statistics of one index in one window."""
+
+    def __init__(self, shape: Tuple[int, int]) -> None:
+        self.maximum = np.full(shape, np.nan, dtype=np.float32)
+        self.count = np.zeros(shape, dtype=np.float64)
+        self.sum_y = np.zeros(shape, dtype=np.float64)
+        self.sum_t = np.zeros(shape, dtype=np.float64)
+        self.sum_tt = np.zeros(shape, dtype=np.float64)
+        self.sum_ty = np.zeros(shape, dtype=np.float64)
+
+    def update(self, values: np.ndarray, t: float) -> None:
+        valid = ~np.isnan(values)
+        # fmax ignora los NaN: el máximo es el de las fechas válidas
+        np.fmax(self.maximum, values, out=self.maximum)
+        y = np.where(valid, values, 0.0)
+        self.count += valid
+        self.sum_y += y
+        self.sum_t += valid * t
+        self.sum_tt += valid * (t * t)
+        self.sum_ty += y * t
+
+    def result(self, reduction: str) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if reduction == "max":
+                return self.maximum
+            if reduction == "count":
+                return self.count.astype(np.float32)
+            if reduction == "mean":
+                mean = self.sum_y / self.count
+                return np.where(self.count > 0, mean, np.nan).astype(np.float32)
+            # Pendiente de mínimos cuadrados con las observaciones válidas
+            n = self.count
+            denominator = n * self.sum_tt - self.sum_t**2
+            slope = (n * self.sum_ty - self.sum_t * self.sum_y) / denominator
+            ok = (n >= 2) & (denominator > 0)
+            return np.where(ok, slope, np.nan).astype(np.float32)
+
+
+def compute_timeseries(
+    scenes: Sequence[Path],
+    output_dir: Path,
+    indices: Optional[List[str]] = None,
+    L: Union[float, Sequence[float]] = DEFAULT_SAVI_L,
+    reductions: Sequence[str] = (),
+    write_cube: bool = True,
+    stem: str = "timeseries",
+    tile_size: Optional[int] = None,
+    memory_mb: Optional[float] = None,
+    workers: int = 1,
+    output_profile: str = DEFAULT_OUTPUT_PROFILE,
+    compress: Optional[str] = None,
+    sensor: Optional[str] = None,
+    formulas: Optional[Dict[str, str]] = None,
+    cloud_mask: bool = True,
+) -> Dict[str, Path]:
+    """Computes indices for every date of a stack of co-registered scenes.
+
+    Scenes with a date in their names (``..._20240115_...``) are sorted by
+    date and the trend slope is expressed per day; otherwise the input order
+    is kept and the slope is per scene. Invalid pixels of a date (nodata,
+    masks, non-positive denominators) are NaN in the cube and ignored by the
+    reductions. With ``cloud_mask``, clouds and shadows flagged by the SCL or
+    QA_PIXEL band of a scene are invalid too, so they never reach the
+    composites.
+
+    Outputs are ``<stem>_<index>_cube.tif`` (one band per date, described
+    with its date or scene name) and ``<stem>_<index>_<reduction>.tif``.
+
+    Args:
+        scenes: Co-registered images of the same tile
+        output_dir: Directory to save results
+        indices: Indices to compute (``ndvi`` by default)
+        L: Soil adjustment factor(s) for SAVI
+        reductions: Temporal reductions to write (max, mean, slope, count)
+        write_cube: Write the per-date cube
+        stem: Base name of the outputs
+        tile_size: Square tile size. Internal blocks by default.
+        memory_mb: Memory budget per window
+        workers: Number of threads computing windows in parallel
+        output_profile: Output layout (default, tiled, cog)
+        compress: Output compression (deflate, zstd, lerc, none)
+        sensor: Sensor profile used to resolve the band mapping
+        formulas: Custom ``name -> expression`` indices
+        cloud_mask: Mask clouds and shadows using the scene quality bands
+
+    Returns:
+        Mapping of ``<index>_cube`` and ``<index>_<reduction>`` names to files
+    """
+    unknown = [r for r in reductions if r not in REDUCTIONS]
+    if unknown:
+        raise ValueError(f"Reducción temporal no soportada: {', '.join(unknown)}")
+    if not scenes:
+        raise ValueError("La serie temporal no contiene escenas")
+    if not write_cube and not reductions:
+        raise ValueError("Indique al menos una reducción o escriba el cubo")
+
+    scenes, dates = order_scenes(scenes)
+    if dates is not None:
+        times = [(d - dates[0]).days for d in dates]
+        labels = [d.date().isoformat() for d in dates]
+    else:
+        times = list(range(len(scenes)))
+        labels = [p.stem for p in scenes]
+
+    plan = plan_indices(indices or ["ndvi"], L, formulas)
+    evaluator = compile_indices(plan)
+    keys = list(plan)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with ExitStack() as files:
+        with stage("open"):
+            sources = [files.enter_context(rasterio.open(p)) for p in scenes]
+        _check_grid(sources)
+        with stage("identify_bands"):
+            mappings = [band_mapping(src, sensor) for src in sources]
+        for path, bands in zip(scenes, mappings):
+            missing = [b for b in evaluator.bands if b not in bands]
+            if missing:
+                raise ValueError(
+                    f"No se encontraron bandas {', '.join(missing)} en {path.name}"
+                )
+
+        first = sources[0]
+        width, height = first.width, first.height
+        # Solo se leen máscaras de las bandas con nodata o máscara propia
+        masked = [
+            [
+                b
+                for b in evaluator.bands
+                if MaskFlags.all_valid not in src.mask_flag_enums[bands[b] - 1]
+            ]
+            for src, bands in zip(sources, mappings)
+        ]
+        # Banda de calidad (SCL/QA_PIXEL) de cada fecha, si la tiene
+        qualities = [quality_mask(bands) if cloud_mask else None for bands in mappings]
+
+        budget = memory_mb if memory_mb is not None else DEFAULT_MEMORY_BUDGET_MB
+        # Por índice: valores float32 de cada fecha del cubo (o de una sola) y
+        # las cinco sumas float64 de las reducciones (diez float32)
+        per_index = (len(scenes) if write_cube else 1) + 10
+        max_pixels = max_window_pixels(
+            budget,
+            len(evaluator.bands),
+            len(keys) * per_index,
+            evaluator.scratch_buffers,
+        )
+        windows = plan_windows(
+            width, height, first.block_shapes[0], tile_size, max_pixels
+        )
+        logger.info(
+            f"🗓️ Serie temporal de {len(scenes)} fechas en {len(windows)} ventanas "
+            f"con {workers} hilo(s)"
+        )
+
+        meta = build_profile(
+            {
+                **first.meta,
+                "count": 1,
+                "dtype": "float32",
+                "nodata": np.nan,
+            },
+            output_profile,
+            compress,
+        )
+        outputs: Dict[str, Path] = {}
+        dsts: Dict[str, Any] = {}
+        for key in keys:
+            if write_cube:
+                name = f"{key}_cube"
+                outputs[name] = output_dir / f"{stem}_{key}_cube.tif"
+                # Intercalado por banda: cada fecha se lee sin tocar las demás
+                cube_meta = {**meta, "count": len(scenes), "interleave": "band"}
+                dsts[name] = files.enter_context(
+                    rasterio.open(outputs[name], "w", **cube_meta)
+                )
+                dsts[name].descriptions = tuple(labels)
+            for reduction in reductions:
+                name = f"{key}_{reduction}"
+                outputs[name] = output_dir / f"{stem}_{key}_{reduction}.tif"
+                dsts[name] = files.enter_context(
+                    rasterio.open(outputs[name], "w", **meta)
+                )
+                dsts[name].update_tags(reduction=reduction, dates=len(scenes))
+
+        local = threading.local()
+        lock = threading.Lock()
+        itemsize = [
+            sum(np.dtype(src.dtypes[bands[b] - 1]).itemsize for b in evaluator.bands)
+            for src, bands in zip(sources, mappings)
+        ]
+
+        def compute_window(
+            window: Window,
+        ) -> Tuple[Dict[str, List[np.ndarray]], Dict[str, np.ndarray]]:
+            # Los datasets de rasterio no son thread-safe: uno por hilo
+            readers: List[rasterio.DatasetReader] = sources
+            if workers > 1:
+                opened = getattr(local, "sources", None)
+                if opened is None:
+                    opened = local.sources = [rasterio.open(p) for p in scenes]
+                    with lock:
+                        for reader in opened:
+                            files.callback(reader.close)
+                readers = opened
+
+            shape = (int(window.height), int(window.width))
+            pixels = shape[0] * shape[1]
+            cube: Dict[str, List[np.ndarray]] = {key: [] for key in keys}
+            reducers = {key: _Reducer(shape) for key in keys} if reductions else {}
+            for i, reader in enumerate(readers):
+                bands = mappings[i]
+                with stage("read", log=False) as counters:
+                    data = {
+                        b: reader.read(bands[b], window=window, out_dtype=np.float32)
+                        for b in evaluator.bands
+                    }
+                    # Nubes y sombras para todos los índices; el nodata de cada
+                    # banda solo para los índices que la leen
+                    quality = qualities[i]
+                    clear = quality.clear(reader, window) if quality else None
+                    masks = window_masks(
+                        reader,
+                        window,
+                        bands,
+                        masked[i],
+                        evaluator.index_bands,
+                        clear,
+                    )
+                    counters["pixels"] += pixels
+                    counters["bytes_read"] += pixels * itemsize[i]
+                with stage("compute", log=False) as counters:
+                    values = evaluator.evaluate(data, masks)
+                    for key in keys:
+                        if write_cube:
+                            cube[key].append(values[key])
+                        if reductions:
+                            reducers[key].update(values[key], times[i])
+                    counters["pixels"] += pixels
+            reduced = {
+                f"{key}_{reduction}": reducers[key].result(reduction)
+                for key in reducers
+                for reduction in reductions
+            }
+            return cube, reduced
+
+        for window, (cube, reduced) in map_ordered(compute_window, windows, workers):
+            with stage("write", log=False) as counters:
+                for key, layers in cube.items():
+                    if layers:
+                        stacked = np.stack(layers)
+                        dsts[f"{key}_cube"].write(stacked, window=window)
+                        counters["bytes_written"] += stacked.nbytes
+                for name, values in reduced.items():
+                    dsts[name].write(values, 1, window=window)
+                    counters["bytes_written"] += values.nbytes
+                counters["pixels"] += int(window.width) * int(window.height)
+
+    for name, path in outputs.items():
+        with stage("finalize") as counters:
+            finalize_output(path, output_profile, compress)
+            counters["bytes_written"] += path.stat().st_size
+        logger.success(f"✅ {name.upper()} guardado en {path}")
+    return outputs
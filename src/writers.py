@@ -0,0 +1,139 @@
+"""Output layout profiles for the generated GeoTIFF files.
+
+Selects the block layout, compression and overviews of the written rasters:
+``default`` keeps the plain GeoTIFF layout derived from the input metadata,
+``tiled`` writes internally tiled and compressed files with overviews, and
+``cog`` produces Cloud-Optimized GeoTIFFs suitable for fast partial reads
+from tile servers and GIS clients.
+"""
+
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.shutil import copy as raster_copy
+from loguru import logger
+
+from .config import (
+    COMPRESSIONS,
+    DEFAULT_COMPRESSION,
+    OUTPUT_BLOCK_SIZE,
+    OUTPUT_PROFILES,
+)
+
+
+def _predictor(dtype: str, compress: str) -> Optional[int]:
+    """Chooses the TIFF predictor for a data type and compression."""
+    if compress not in ("deflate", "zstd"):
+        return None
+    return 3 if np.issubdtype(np.dtype(dtype), np.floating) else 2
+
+
+def _creation_options(dtype: str, compress: str) -> Dict[str, Any]:
+    """Creation options shared by the tiled and COG layouts."""
+    options: Dict[str, Any] = {"num_threads": "all_cpus", "compress": compress}
+    predictor = _predictor(dtype, compress)
+    if predictor:
+        options["predictor"] = predictor
+    return options
+
+
+def build_profile(
+    meta: Dict[str, Any], profile: str = "default", compress: Optional[str] = None
+) -> Dict[str, Any]:
+    """Adapts a rasterio profile to an output layout.
+
+    Args:
+        meta: Base profile (usually derived from ``src.meta``)
+        profile: Output profile (default, tiled, cog)
+        compress: Compression (deflate, zstd, lerc, none). Without it the
+            default profile keeps the input compression and the tiled/COG
+            profiles use ``DEFAULT_COMPRESSION``.
+
+    Returns:
+        Profile to open the output file with (always a GTiff; COG layout is
+        applied afterwards by ``finalize_output``)
+    """
+    if profile not in OUTPUT_PROFILES:
+        raise ValueError(f"Perfil de salida no soportado: {profile}")
+    if compress and compress not in COMPRESSIONS:
+        raise ValueError(f"Compresión no soportada: {compress}")
+
+    out = dict(meta)
+    out["driver"] = "GTiff"
+    if profile == "default":
+        if compress:
+            out.update(_creation_options(out["dtype"], compress))
+        return out
+
+    block = OUTPUT_BLOCK_SIZE
+    out.update({"tiled": True, "blockxsize": block, "blockysize": block})
+    # En COG se escribe un intermedio sin comprimir: la compresión se hace una
+    # sola vez, con todos los núcleos, al generar el COG
+    if profile == "cog":
+        compress = "none"
+    out.update(_creation_options(out["dtype"], compress or DEFAULT_COMPRESSION))
+    # Imágenes menores que un bloque se escriben sin tiles
+    if out["width"] < block or out["height"] < block:
+        out.pop("tiled")
+        out.pop("blockxsize")
+        out.pop("blockysize")
+    return out
+
+
+def _overview_factors(width: int, height: int) -> List[int]:
+    """Overview decimation factors down to about one output block."""
+    factors = []
+    factor = 2
+    while min(width, height) / factor >= OUTPUT_BLOCK_SIZE / 2:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def finalize_output(
+    path: Path, profile: str = "default", compress: Optional[str] = None
+) -> Path:
+    """Applies the post-write steps of an output profile.
+
+    ``tiled`` builds internal overviews in place. ``cog`` rewrites the file
+    with the GDAL COG driver (tiles, overviews and COG layout), using
+    multithreaded compression.
+
+    Args:
+        path: File written with a profile from ``build_profile``
+        profile: Output profile (default, tiled, cog)
+        compress: Compression used for the file
+
+    Returns:
+        Path of the final file (same as ``path``)
+    """
+    if profile == "default":
+        return path
+
+    compress = compress or DEFAULT_COMPRESSION
+    if profile == "tiled":
+        with rasterio.open(path, "r+") as dst:
+            factors = _overview_factors(dst.width, dst.height)
+            if factors:
+                dst.build_overviews(factors, Resampling.average)
+        return path
+
+    tmp = path.with_name(f".{path.stem}.cog{path.suffix}")
+    with rasterio.open(path) as src:
+        dtype = src.dtypes[0]
+    options = _creation_options(dtype, compress)
+    raster_copy(
+        path,
+        tmp,
+        driver="COG",
+        blocksize=OUTPUT_BLOCK_SIZE,
+        overview_resampling="average",
+        **options,
+    )
+    os.replace(tmp, path)
+    logger.debug(f"Archivo convertido a COG: {path}")
+    return path
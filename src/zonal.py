@@ -0,0 +1,234 @@
+"""Per-polygon zonal statistics computed while the indices are calculated.
+
+Accumulates per-feature statistics window by window, from the same index
+values that are written to the rasters, so parcel-level results do not need
+a second pass over the index files.
+"""
+
+import csv
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from affine import Affine
+from loguru import logger
+from rasterio.features import rasterize
+from rasterio.windows import Window, bounds as window_bounds
+from shapely import STRtree
+from shapely.geometry import box, shape
+
+# Histograma para mediana y percentiles: rango y resolución (0.002)
+HISTOGRAM_RANGE = (-2.0, 2.0)
+HISTOGRAM_BINS = 2000
+DEFAULT_PERCENTILES = (10, 25, 75, 90)
+TABLE_FORMATS = ("csv", "parquet", "geojson")
+
+
+class ZonalStats:
+    """Streaming accumulator of per-feature statistics for several indices.
+
+    Count, mean, standard deviation, minimum and maximum are exact. The
+    median and percentiles come from a fixed histogram over
+    ``HISTOGRAM_RANGE`` with ``HISTOGRAM_BINS`` bins, so they are accurate to
+    half a bin (values outside the range are clamped to its edges).
+
+    Overlapping features are split into layers without overlaps, each
+    rasterized on its own, so a pixel shared by several features counts for
+    every one of them.
+
+    Args:
+        features: List of (feature id, geometry mapping) tuples in the
+            raster CRS
+        percentiles: Percentiles to report besides the median
+    """
+
+    def __init__(
+        self,
+        features: List[Tuple[str, Dict[str, Any]]],
+        percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    ) -> None:
+        self.ids = [fid for fid, _ in features]
+        self.geometries = [geom for _, geom in features]
+        self.percentiles = tuple(percentiles)
+        self._shapes = [shape(geom) for geom in self.geometries]
+        self._tree = STRtree(self._shapes)
+        self._layer_of = self._overlap_layers()
+        self.layers = int(self._layer_of.max()) + 1 if len(self.ids) else 1
+        self._stats: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def _overlap_layers(self) -> np.ndarray:
+        """Assigns every feature to a layer without overlapping features."""
+        layer_of = np.zeros(len(self._shapes), dtype=np.int64)
+        overlaps = 0
+        for i, geom in enumerate(self._shapes):
+            # Polígonos anteriores que comparten interior (no solo el borde)
+            taken = {
+                int(layer_of[j])
+                for j in self._tree.query(geom, predicate="intersects")
+                if j < i and not geom.touches(self._shapes[j])
+            }
+            overlaps += len(taken) > 0
+            layer_of[i] = next(k for k in range(len(taken) + 1) if k not in taken)
+        if overlaps:
+            logger.warning(
+                f"⚠️ {overlaps} polígonos se superponen con otros: sus píxeles "
+                "comunes cuentan en las estadísticas de cada uno"
+            )
+        return layer_of
+
+    def labels(self, transform: Affine, window: Window) -> np.ndarray:
+        """Rasterizes feature labels (1-based, 0 = outside) over a window.
+
+        Only the features whose bounds intersect the window are rasterized.
+
+        Returns:
+            Array of shape (layers, rows, cols), one label plane per layer of
+            non-overlapping features
+        """
+        out_shape = (int(window.height), int(window.width))
+        labels = np.zeros((self.layers, *out_shape), dtype=np.int32)
+        win_transform = transform * Affine.translation(window.col_off, window.row_off)
+        hits = sorted(self._tree.query(box(*window_bounds(window, transform))))
+        for layer in range(self.layers):
+            shapes = [
+                (self.geometries[i], int(i) + 1)
+                for i in hits
+                if self._layer_of[i] == layer
+            ]
+            if shapes:
+                rasterize(shapes, transform=win_transform, out=labels[layer])
+        return labels
+
+    def _init_index(self, name: str) -> Dict[str, np.ndarray]:
+        n = len(self.ids) + 1
+        stats = {
+            "count": np.zeros(n, dtype=np.int64),
+            "sum": np.zeros(n, dtype=np.float64),
+            "sumsq": np.zeros(n, dtype=np.float64),
+            "min": np.full(n, np.inf),
+            "max": np.full(n, -np.inf),
+            "hist": np.zeros(n * HISTOGRAM_BINS, dtype=np.int64),
+        }
+        self._stats[name] = stats
+        return stats
+
+    def update(self, name: str, values: np.ndarray, labels: np.ndarray) -> None:
+        """Adds the valid pixels of one window of an index to the statistics.
+
+        Args:
+            name: Index name
+            values: Index values of the window
+            labels: Label planes of the window (see ``labels``)
+        """
+        stats = self._stats.get(name) or self._init_index(name)
+        for plane in labels:
+            self._accumulate(stats, values, plane)
+
+    def _accumulate(
+        self, stats: Dict[str, np.ndarray], values: np.ndarray, labels: np.ndarray
+    ) -> None:
+        inside = labels > 0
+        inside &= ~np.isnan(values)
+        if not inside.any():
+            return
+
+        lab = labels[inside]
+        vals = values[inside].astype(np.float64)
+        n = len(self.ids) + 1
+        stats["count"] += np.bincount(lab, minlength=n)
+        stats["sum"] += np.bincount(lab, weights=vals, minlength=n)
+        stats["sumsq"] += np.bincount(lab, weights=vals * vals, minlength=n)
+        np.minimum.at(stats["min"], lab, vals)
+        np.maximum.at(stats["max"], lab, vals)
+
+        low, high = HISTOGRAM_RANGE
+        bins = ((vals - low) * (HISTOGRAM_BINS / (high - low))).astype(np.int64)
+        np.clip(bins, 0, HISTOGRAM_BINS - 1, out=bins)
+        stats["hist"] += np.bincount(
+            lab * HISTOGRAM_BINS + bins, minlength=n * HISTOGRAM_BINS
+        )
+
+    def _quantiles(self, hist: np.ndarray, qs: Sequence[float]) -> List[float]:
+        """Approximates quantiles from a histogram (bin centers)."""
+        total = hist.sum()
+        if total == 0:
+            return [float("nan")] * len(qs)
+        cumulative = np.cumsum(hist)
+        low, high = HISTOGRAM_RANGE
+        width = (high - low) / HISTOGRAM_BINS
+        idx = np.searchsorted(cumulative, [q / 100 * total for q in qs])
+        return [low + (i + 0.5) * width for i in np.minimum(idx, HISTOGRAM_BINS - 1)]
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Returns one row per feature and index with the final statistics."""
+        rows = []
+        qs = (50.0,) + self.percentiles
+        for name, stats in self._stats.items():
+            hist = stats["hist"].reshape(-1, HISTOGRAM_BINS)
+            for i, fid in enumerate(self.ids, start=1):
+                count = int(stats["count"][i])
+                row: Dict[str, Any] = {"feature_id": fid, "index": name, "count": count}
+                if count:
+                    mean = stats["sum"][i] / count
+                    var = max(stats["sumsq"][i] / count - mean * mean, 0.0)
+                    row.update(
+                        {
+                            "mean": mean,
+                            "std": float(np.sqrt(var)),
+                            "min": stats["min"][i],
+                            "max": stats["max"][i],
+                        }
+                    )
+                else:
+                    row.update({k: float("nan") for k in ("mean", "std", "min", "max")})
+                quantiles = self._quantiles(hist[i], qs)
+                row["median"] = quantiles[0]
+                for q, value in zip(self.percentiles, quantiles[1:]):
+                    row[f"p{q:g}"] = value
+                rows.append(row)
+        return rows
+
+    def write(self, path: Path, crs: Optional[Any] = None) -> Path:
+        """Writes the statistics table as CSV, Parquet or GeoJSON.
+
+        The format is taken from the file extension. Parquet requires the
+        optional ``pyarrow`` dependency; GeoJSON includes the feature
+        geometries.
+
+        Args:
+            path: Output file (.csv, .parquet or .geojson)
+            crs: Coordinate system of the geometries, for GeoJSON output
+
+        Returns:
+            Path of the written table
+        """
+        rows = self.records()
+        fmt = path.suffix.lower().lstrip(".")
+        if fmt not in TABLE_FORMATS:
+            raise ValueError(f"Formato de tabla no soportado: {path.suffix}")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if fmt == "csv":
+            fields = list(rows[0]) if rows else ["feature_id", "index", "count"]
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+            return path
+
+        import geopandas as gpd
+
+        geoms = dict(zip(self.ids, self._shapes))
+        gdf = gpd.GeoDataFrame(
+            rows, geometry=[geoms[r["feature_id"]] for r in rows], crs=crs
+        )
+        if fmt == "parquet":
+            try:
+                gdf.to_parquet(path)
+            except ImportError as e:
+                raise ImportError(
+                    "La salida Parquet requiere el paquete opcional 'pyarrow'"
+                ) from e
+        else:
+            gdf.to_file(path, driver="GeoJSON")
+        return path
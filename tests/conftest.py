@@ -1,5 +1,81 @@
 import os
 import sys
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_bounds
 
 # Añade el directorio raíz del proyecto al PYTHONPATH
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Redirige la caché de resultados a un directorio temporal."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("PASCAL_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture
+def make_image(tmp_path: Path) -> Callable[..., Path]:
+    """Crea imágenes multiespectrales sintéticas con etiquetas de longitud de onda."""
+
+    def _make(
+        name: str = "scene.tif",
+        width: int = 64,
+        height: int = 48,
+        wavelengths: tuple = (665, 842, 705),
+        seed: int = 0,
+        **profile_kwargs: object,
+    ) -> Path:
+        rng = np.random.default_rng(seed)
+        path = tmp_path / name
+        profile = {
+            "driver": "GTiff",
+            "width": width,
+            "height": height,
+            "count": len(wavelengths),
+            "dtype": "float32",
+            "crs": "EPSG:32719",
+            "transform": from_bounds(
+                300000,
+                6000000,
+                300000 + width * 10,
+                6000000 + height * 10,
+                width,
+                height,
+            ),
+        }
+        profile.update(profile_kwargs)
+        with rasterio.open(path, "w", **profile) as dst:
+            for i, wavelength in enumerate(wavelengths, start=1):
+                band = rng.uniform(0.01, 0.6, (height, width)).astype(profile["dtype"])
+                dst.write(band, i)
+                dst.update_tags(i, wavelength_nm=wavelength)
+        return path
+
+    return _make
+
+
+@pytest.fixture
+def make_shapefile(tmp_path: Path) -> Callable[..., Path]:
+    """Crea shapefiles de polígonos en coordenadas de las imágenes sintéticas."""
+
+    def _make(boxes: list, name: str = "aoi.shp", crs: str = "EPSG:32719") -> Path:
+        import geopandas as gpd
+        from shapely.geometry import box
+
+        path = tmp_path / name
+        gdf = gpd.GeoDataFrame(
+            {"parcel": [f"p{i}" for i in range(len(boxes))]},
+            geometry=[box(*b) for b in boxes],
+            crs="EPSG:32719",
+        )
+        gdf.to_crs(crs).to_file(path)
+        return path
+
+    return _make
@@ -2,11 +2,23 @@
 
 Tests end-to-end functionality following ISO 42001 validation requirements."""
 
+import csv
+
 import numpy as np
+import pytest
 import rasterio
 from rasterio.transform import from_bounds
 from pathlib import Path
+from typing import Callable
 from src.main import process_image
+from src.batch import collect_scenes, run_batch
+from src.pipeline import process_features, process_scene
+from src.cache import ResultCache
+from src.preprocessor import clip_features
+from src.indices import calculate_indices
+from src.timeseries import compute_timeseries
+from rasterio.features import geometry_mask
+from shapely.geometry import box, mapping
 from src.config import DEFAULT_SAVI_L
 from src.logging_config import setup_logging
 
@@ -68,3 +80,399 @@ def test_full_workflow(tmp_path: Path) -> None:
         ndvi = src.read(1)
         expected_ndvi = (0.8 - 0.3) / (0.8 + 0.3)  # (NIR - RED) / (NIR + RED)
         np.testing.assert_allclose(ndvi, expected_ndvi, rtol=1e-3)
+
+
+def test_batch_skips_failures(make_image: Callable[..., Path], tmp_path: Path) -> None:
+    """Verifica que el modo batch procesa varias escenas y registra los fallos."""
+    make_image(name="a.tif")
+    make_image(name="b.tif", seed=1)
+    (tmp_path / "broken.tif").write_text("no es un raster")
+
+    scenes = collect_scenes(str(tmp_path))
+    assert [image.name for image, _ in scenes] == ["a.tif", "b.tif", "broken.tif"]
+
+    summary = run_batch(scenes, tmp_path / "out", workers=2)
+    assert summary["succeeded"] == 2
+    assert summary["failed"] == 1
+    assert summary["scenes"][2]["status"] == "failed"
+    assert (tmp_path / "out" / "batch_summary.json").exists()
+    assert (tmp_path / "out" / "a" / "a_ndvi.tif").exists()
+
+    # Escenas con el mismo nombre en directorios distintos no se pisan
+    (tmp_path / "x").mkdir()
+    (tmp_path / "y").mkdir()
+    make_image(name="x/scene.tif")
+    make_image(name="y/scene.tif", seed=2)
+    summary = run_batch(
+        collect_scenes(str(tmp_path / "*" / "scene.tif")), tmp_path / "dup"
+    )
+    assert summary["succeeded"] == 2
+    with rasterio.open(tmp_path / "dup" / "x_scene" / "scene_ndvi.tif") as a:
+        with rasterio.open(tmp_path / "dup" / "y_scene" / "scene_ndvi.tif") as b:
+            assert not np.array_equal(a.read(1), b.read(1))
+
+
+def test_clip_on_read_matches_clipped_file(
+    make_image: Callable[..., Path],
+    make_shapefile: Callable[..., Path],
+    tmp_path: Path,
+) -> None:
+    """Verifica que el recorte durante la lectura equivale al recorte previo."""
+    image = make_image(width=64, height=48)
+    # Polígono en L dentro de la imagen (coordenadas UTM de la imagen sintética)
+    shapefile = make_shapefile(
+        [(300050, 6000050, 300200, 6000300), (300200, 6000050, 300400, 6000120)]
+    )
+
+    fused = process_scene(image, tmp_path / "fused", shapefile)
+    staged = process_scene(image, tmp_path / "staged", shapefile, keep_clipped=True)
+
+    assert not (tmp_path / "fused" / "scene_clipped.tif").exists()
+    assert (tmp_path / "staged" / "scene_clipped.tif").exists()
+    assert set(fused) == set(staged)
+    for key in fused:
+        assert fused[key].name == staged[key].name
+        with rasterio.open(fused[key]) as a, rasterio.open(staged[key]) as b:
+            assert a.transform == b.transform
+            fused_values, staged_values = a.read(1), b.read(1)
+        # Fuera del polígono el recorte previo deja ceros (SAVI = 0), el
+        # recorte durante la lectura deja nodata
+        valid = ~np.isnan(fused_values)
+        assert np.isnan(fused_values[np.isnan(staged_values)]).all()
+        np.testing.assert_array_equal(fused_values[valid], staged_values[valid])
+
+
+def test_preflight_rejects_scenes_from_metadata(
+    make_image: Callable[..., Path],
+    make_shapefile: Callable[..., Path],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Verifica el rechazo de escenas con los metadatos, sin leer píxeles."""
+    from rasterio.io import DatasetReader
+    from src.preprocessor import SceneRejected, preflight
+
+    inside = make_image(name="inside.tif")
+    outside = make_image(
+        name="outside.tif",
+        transform=from_bounds(400000, 6000000, 400640, 6000480, 64, 48),
+    )
+    no_nir = make_image(name="no_nir.tif", wavelengths=(665, 490))
+    aoi = make_shapefile([(300050, 6000050, 300200, 6000300)])
+    geographic = make_shapefile(
+        [(300050, 6000050, 300200, 6000300)], name="aoi_4326.shp", crs="EPSG:4326"
+    )
+
+    # La verificación no lee ningún píxel
+    monkeypatch.setattr(
+        DatasetReader, "read", lambda *a, **k: pytest.fail("lectura de píxeles")
+    )
+    assert preflight(inside, geographic, {"ndvi": ("nir", "red")})["nir"] == 2
+    with pytest.raises(SceneRejected, match="no se superpone"):
+        preflight(outside, aoi)
+    with pytest.raises(SceneRejected, match="nir"):
+        preflight(no_nir, aoi, {"ndvi": ("nir", "red")})
+    # 15 x 25 píxeles del AOI x 2 bandas float32
+    with pytest.raises(SceneRejected, match="GB"):
+        preflight(inside, aoi, {"ndvi": ("nir", "red")}, max_size_gb=2e-6)
+    preflight(inside, aoi, {"ndvi": ("nir", "red")}, max_size_gb=4e-6)
+    monkeypatch.undo()
+
+    scenes = [(inside, aoi), (outside, aoi), (no_nir, aoi)]
+    summary = run_batch(scenes, tmp_path / "batch")
+    assert [r["status"] for r in summary["scenes"]] == ["ok", "rejected", "rejected"]
+    assert not list((tmp_path / "batch").glob("outside/*.tif"))
+
+
+def test_per_feature_processing(
+    make_image: Callable[..., Path],
+    make_shapefile: Callable[..., Path],
+    tmp_path: Path,
+) -> None:
+    """Verifica el recorte y cálculo por polígono con ventanas individuales."""
+    image = make_image(width=64, height=48)
+    shapefile = make_shapefile(
+        [
+            (300000, 6000000, 300050, 6000050),  # Esquina inferior izquierda
+            (300550, 6000400, 300640, 6000480),  # Esquina superior derecha
+            (900000, 6000000, 900100, 6000100),  # Fuera de la imagen
+        ]
+    )
+
+    clipped = clip_features(image, shapefile, tmp_path / "clip", workers=2)
+    assert list(clipped) == ["0", "1"]
+    with rasterio.open(clipped["0"]) as src:
+        # Solo la ventana del polígono, no la unión de todos
+        assert (src.width, src.height) == (5, 5)
+
+    results = process_features(image, tmp_path / "idx", shapefile, workers=2)
+    assert set(results) == {"0", "1"}
+    assert results["1"]["ndvi"].name == "scene_1_clipped_ndvi.tif"
+    with rasterio.open(results["1"]["ndvi"]) as src:
+        assert (src.width, src.height) == (9, 8)
+        assert not np.isnan(src.read(1)).any()
+
+    # Identificadores repetidos: cada polígono conserva sus propias salidas
+    import geopandas as gpd
+
+    repeated = gpd.read_file(shapefile)
+    repeated["parcel"] = "p"
+    repeated.to_file(tmp_path / "repeated.shp")
+    clipped = clip_features(image, tmp_path / "repeated.shp", tmp_path / "rc", "parcel")
+    assert list(clipped) == ["p", "p_1"]
+    results = process_features(
+        image, tmp_path / "ri", tmp_path / "repeated.shp", id_field="parcel"
+    )
+    assert set(results) == {"p", "p_1"}
+    assert results["p"]["ndvi"] != results["p_1"]["ndvi"]
+
+
+def test_zonal_statistics_in_same_pass(
+    make_image: Callable[..., Path],
+    make_shapefile: Callable[..., Path],
+    tmp_path: Path,
+) -> None:
+    """Verifica las estadísticas por polígono calculadas junto con los índices."""
+    image = make_image(width=64, height=48)
+    boxes = [
+        (300050, 6000050, 300200, 6000300),
+        (300300, 6000100, 300600, 6000400),
+        # Se superpone con los dos anteriores: sus píxeles comunes cuentan en ambos
+        (300100, 6000100, 300350, 6000250),
+    ]
+    shapefile = make_shapefile(boxes)
+
+    results = process_scene(
+        image, tmp_path / "out", shapefile, zonal_format="csv", write_rasters=False
+    )
+    assert list(results) == ["zonal_stats"]
+    assert not list((tmp_path / "out").glob("*.tif"))
+    with open(results["zonal_stats"]) as f:
+        rows = {(r["feature_id"], r["index"]): r for r in csv.DictReader(f)}
+    assert len(rows) == 3 * len(boxes)
+
+    # Referencia: NDVI completo enmascarado con cada polígono
+    full = calculate_indices(image, tmp_path / "ref", ["ndvi"])
+    with rasterio.open(full["ndvi"]) as src:
+        ndvi = src.read(1)
+        for fid, b in enumerate(boxes):
+            inside = geometry_mask(
+                [mapping(box(*b))], ndvi.shape, src.transform, invert=True
+            )
+            values = ndvi[inside]
+            row = rows[(str(fid), "ndvi")]
+            assert int(row["count"]) == values.size
+            np.testing.assert_allclose(float(row["mean"]), values.mean(), rtol=1e-5)
+            np.testing.assert_allclose(float(row["max"]), values.max(), rtol=1e-6)
+            assert abs(float(row["median"]) - np.median(values)) <= 0.002
+
+
+def test_result_cache_hit_miss_and_eviction(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que la caché evita recalcular escenas sin cambios."""
+    image = make_image()
+    cache = ResultCache(tmp_path / "cache")
+    out = tmp_path / "out"
+
+    first = process_scene(image, out, cache=cache)
+    for path in first.values():
+        path.unlink()
+
+    # Acierto: los resultados se restauran sin recalcular
+    second = process_scene(image, out, cache=cache, workers=4)
+    assert second == first
+    assert all(path.exists() for path in second.values())
+
+    # Parámetros distintos o imagen modificada generan otra entrada
+    cache.max_bytes = 1
+    process_scene(image, out, cache=cache, output_profile="tiled")
+    make_image(seed=5)
+    assert process_scene(image, out, cache=cache) == first
+    entries = [p for p in (tmp_path / "cache").iterdir() if not p.name.startswith(".")]
+    # Solo sobrevive la entrada más reciente (LRU con límite de tamaño)
+    assert len(entries) == 1
+
+    # Un archivo de calidad editado en su sitio invalida la entrada
+    quality = tmp_path / "T19HCC_SCL_20m.tif"
+    quality.write_bytes(bytes(64))
+    key = cache.key(image, quality_file=quality)
+    quality.write_bytes(bytes([9]) * 64)
+    assert cache.key(image, quality_file=quality) != key
+
+
+def test_result_cache_keeps_scene_names(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que dos copias idénticas con otro nombre no comparten salidas."""
+    import shutil
+
+    scene_a = make_image(name="sceneA.tif")
+    scene_b = tmp_path / "sceneB.tif"
+    shutil.copy2(scene_a, scene_b)
+    cache = ResultCache(tmp_path / "cache")
+
+    first = process_scene(scene_a, tmp_path / "outA", cache=cache)
+    second = process_scene(scene_b, tmp_path / "outB", cache=cache)
+    assert set(second) == set(first)
+    for key, path in second.items():
+        assert path == tmp_path / "outB" / first[key].name.replace("sceneA", "sceneB")
+        assert path.exists()
+    assert not list((tmp_path / "outB").glob("sceneA*"))
+
+
+def _write_band(path: Path, data: np.ndarray, size: int) -> None:
+    profile = {
+        "driver": "GTiff",
+        "width": data.shape[1],
+        "height": data.shape[0],
+        "count": 1,
+        "dtype": "uint16",
+        "crs": "EPSG:32719",
+        "transform": from_bounds(
+            300000,
+            6000000,
+            300000 + size * 10,
+            6000000 + size * 10,
+            data.shape[1],
+            data.shape[0],
+        ),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data, 1)
+
+
+def test_per_band_product_via_virtual_stack(tmp_path: Path) -> None:
+    """Verifica el cálculo desde archivos por banda sin apilar la imagen."""
+    rng = np.random.default_rng(3)
+    product = tmp_path / "S2A_MSIL2A_20240101T143731.SAFE"
+    img = product / "GRANULE" / "L2A_T19HCC" / "IMG_DATA"
+    red = rng.integers(100, 3000, (32, 32), dtype=np.uint16)
+    nir = rng.integers(100, 3000, (32, 32), dtype=np.uint16)
+    red_edge = rng.integers(100, 3000, (16, 16), dtype=np.uint16)
+    _write_band(img / "R10m" / "T19HCC_20240101T143731_B04_10m.tif", red, 32)
+    _write_band(img / "R10m" / "T19HCC_20240101T143731_B08_10m.tif", nir, 32)
+    _write_band(img / "R20m" / "T19HCC_20240101T143731_B04_20m.tif", red[::2, ::2], 32)
+    _write_band(img / "R20m" / "T19HCC_20240101T143731_B05_20m.tif", red_edge, 32)
+    _write_band(img / "R10m" / "T19HCC_20240101T143731_TCI_10m.tif", red, 32)
+
+    results = process_scene(product, tmp_path / "out")
+    assert results["ndvi"].name == "S2A_MSIL2A_20240101T143731_ndvi.tif"
+
+    r, n = red.astype(float), nir.astype(float)
+    with rasterio.open(results["ndvi"]) as src:
+        np.testing.assert_allclose(src.read(1), (n - r) / (n + r), rtol=1e-5)
+    with rasterio.open(results["ndre"]) as src:
+        assert src.shape == (32, 32)
+        e = np.repeat(np.repeat(red_edge, 2, axis=0), 2, axis=1).astype(float)
+        np.testing.assert_allclose(src.read(1), (n - e) / (n + e), rtol=1e-5)
+
+    # Malla de 20 m: B04_20m se lee directamente y NDRE usa B05 nativa
+    coarse = process_scene(product, tmp_path / "out20", resolution=20)
+    n20 = nir.reshape(16, 2, 16, 2).mean(axis=(1, 3))
+    r20 = red[::2, ::2].astype(float)
+    with rasterio.open(coarse["ndvi"]) as src:
+        assert src.shape == (16, 16) and src.res == (20.0, 20.0)
+        np.testing.assert_allclose(src.read(1), (n20 - r20) / (n20 + r20), atol=1e-3)
+
+
+def test_product_scl_band_masks_and_rejects_cloudy_scenes(tmp_path: Path) -> None:
+    """Verifica el enmascarado con la SCL del producto y el rechazo en lote."""
+    rng = np.random.default_rng(5)
+    products = {"S2A_MSIL2A_20240101T143731": 4, "S2B_MSIL2A_20240111T143731": 12}
+    for name, cloudy_rows in products.items():
+        img = tmp_path / "products" / f"{name}.SAFE" / "IMG_DATA"
+        scl = np.full((16, 16), 4, dtype=np.uint16)
+        scl[:cloudy_rows] = 8
+        for band in ("B04", "B08"):
+            data = rng.integers(100, 3000, (32, 32), dtype=np.uint16)
+            _write_band(img / f"T19HCC_{band}_10m.tif", data, 32)
+        _write_band(img / "T19HCC_SCL_20m.tif", scl, 32)
+
+    clear = tmp_path / "products" / "S2A_MSIL2A_20240101T143731.SAFE"
+    results = process_scene(clear, tmp_path / "out", indices=["ndvi"])
+    with rasterio.open(results["ndvi"]) as src:
+        ndvi = src.read(1)
+    # Filas de 20 m con nubes: 4 -> 8 filas de 10 m enmascaradas
+    assert np.isnan(ndvi[:8]).all() and not np.isnan(ndvi[8:]).any()
+
+    scenes = [(p, None) for p in sorted((tmp_path / "products").iterdir())]
+    summary = run_batch(scenes, tmp_path / "batch", indices=["ndvi"])
+    assert summary["succeeded"] == 1 and summary["rejected"] == 1
+    assert summary["failed"] == 0
+    assert "nubosidad" in summary["scenes"][1]["error"]
+
+
+def test_timeseries_cube_and_reductions(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica el cubo temporal y las reducciones calculadas por ventanas."""
+    dates = ["20240301", "20240111", "20240131"]
+    scenes = [
+        make_image(name=f"T19HBC_{date}.tif", width=40, height=30, seed=i)
+        for i, date in enumerate(dates)
+    ]
+    # Un píxel sin dato en una fecha queda fuera de las reducciones
+    with rasterio.open(scenes[0], "r+") as dst:
+        dst.nodata = -1
+        dst.write(
+            np.full((1, 1), -1, dtype=np.float32),
+            2,
+            window=rasterio.windows.Window(0, 0, 1, 1),
+        )
+        # Sin dato solo en red_edge1: invalida NDRE pero no NDVI
+        dst.write(
+            np.full((1, 1), -1, dtype=np.float32),
+            3,
+            window=rasterio.windows.Window(3, 3, 1, 1),
+        )
+
+    out = tmp_path / "ts"
+    reductions = ["max", "mean", "slope", "count"]
+    results = compute_timeseries(
+        scenes,
+        out,
+        indices=["ndvi", "ndre"],
+        reductions=reductions,
+        tile_size=16,
+        workers=2,
+    )
+    assert set(results) == {
+        f"{key}_{suffix}"
+        for key in ("ndvi", "ndre")
+        for suffix in ["cube", *reductions]
+    }
+
+    # Fechas ordenadas: 11-01, 31-01, 01-03
+    order = [1, 2, 0]
+    layers = []
+    for i in order:
+        paths = calculate_indices(scenes[i], tmp_path / f"ref{i}", ["ndvi"])
+        with rasterio.open(paths["ndvi"]) as src:
+            layers.append(src.read(1))
+    reference = np.stack(layers)
+
+    with rasterio.open(results["ndvi_cube"]) as src:
+        assert src.descriptions == ("2024-01-11", "2024-01-31", "2024-03-01")
+        np.testing.assert_allclose(src.read(), reference, rtol=1e-6)
+    assert np.isnan(reference[2, 0, 0])
+    with rasterio.open(results["ndre_cube"]) as src:
+        assert np.isnan(src.read(3)[3, 3]) and not np.isnan(src.read(2)[3, 3])
+
+    days = np.array([0.0, 20.0, 50.0])
+    stats = {}
+    for name, path in results.items():
+        with rasterio.open(path) as src:
+            stats[name] = src.read(1)
+    np.testing.assert_allclose(
+        stats["ndvi_max"], np.nanmax(reference, axis=0), rtol=1e-6
+    )
+    np.testing.assert_allclose(
+        stats["ndvi_mean"], np.nanmean(reference, axis=0), rtol=1e-5, atol=1e-7
+    )
+    assert stats["ndvi_count"][0, 0] == 2 and stats["ndvi_count"][5, 5] == 3
+    slope = np.polyfit(days, reference[:, 5, 5], 1)[0]
+    np.testing.assert_allclose(stats["ndvi_slope"][5, 5], slope, rtol=1e-4)
+    slope = np.polyfit(days[:2], reference[:2, 0, 0], 1)[0]
+    np.testing.assert_allclose(stats["ndvi_slope"][0, 0], slope, rtol=1e-4)
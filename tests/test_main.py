@@ -1,5 +1,8 @@
 # tests/test_main.py
 
+from pathlib import Path
+from typing import Callable
+
 from typer.testing import CliRunner
 from src.main import app
 
@@ -13,3 +16,154 @@ def test_help_command() -> None:
     assert "clip" in result.output
     assert "indices" in result.output
     assert "auto" in result.output
+    assert "batch" in result.output
+    assert "timeseries" in result.output
+
+
+def test_indices_metrics_json(tmp_path: Path) -> None:
+    """Verifica el informe de métricas por etapa del comando indices."""
+    import json
+
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+
+    image = tmp_path / "scene.tif"
+    profile = {
+        "driver": "GTiff",
+        "width": 32,
+        "height": 32,
+        "count": 2,
+        "dtype": "float32",
+        "crs": "EPSG:32719",
+        "transform": from_origin(300000, 6000320, 10, 10),
+    }
+    with rasterio.open(image, "w", **profile) as dst:
+        dst.write(np.full((2, 32, 32), 0.5, dtype=np.float32))
+
+    report = tmp_path / "metrics.json"
+    result = runner.invoke(
+        app,
+        [
+            "indices",
+            "--image",
+            str(image),
+            "--output",
+            str(tmp_path / "out"),
+            "--no-cache",
+            "--metrics-json",
+            str(report),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    metrics = json.loads(report.read_text())
+    assert metrics["command"] == "indices"
+    assert {"open", "read", "compute", "write", "finalize"} <= set(metrics["stages"])
+    assert metrics["stages"]["read"]["pixels"] == 32 * 32
+
+
+def test_indices_list_computes_only_requested(tmp_path: Path) -> None:
+    """Verifica que --indices-list, --savi-l y --formula definen los índices escritos."""
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+
+    image = tmp_path / "scene.tif"
+    profile = {
+        "driver": "GTiff",
+        "width": 16,
+        "height": 16,
+        "count": 2,
+        "dtype": "float32",
+        "crs": "EPSG:32719",
+        "transform": from_origin(300000, 6000160, 10, 10),
+    }
+    with rasterio.open(image, "w", **profile) as dst:
+        dst.write(np.full((2, 16, 16), 0.5, dtype=np.float32))
+
+    out = tmp_path / "out"
+    result = runner.invoke(
+        app,
+        [
+            "indices",
+            "--image",
+            str(image),
+            "--output",
+            str(out),
+            "--no-cache",
+            "--indices-list",
+            "ndvi,savi",
+            "--savi-l",
+            "0.25",
+            "--savi-l",
+            "1",
+            "--formula",
+            "sr=nir / red",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert sorted(p.name for p in out.glob("*.tif")) == [
+        "scene_ndvi.tif",
+        "scene_savi_L0.25.tif",
+        "scene_savi_L1.00.tif",
+        "scene_sr.tif",
+    ]
+
+
+def test_invalid_output_options_fail_before_processing(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que un perfil o compresión desconocidos terminan con error."""
+    image = make_image()
+    out = tmp_path / "out"
+    for option, value in (("--output-profile", "xyz"), ("--compress", "rar")):
+        result = runner.invoke(
+            app,
+            ["auto", "--image", str(image), "--output", str(out), option, value],
+        )
+        assert result.exit_code != 0
+        assert not list(out.glob("*.tif"))
+
+
+def test_unknown_indices_are_usage_errors(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que índices desconocidos o factores L inválidos son errores de uso."""
+    image = make_image()
+    for option, value in (("--indices-list", "foo"), ("--indices-list", "savi_x")):
+        result = runner.invoke(
+            app,
+            [
+                "indices",
+                "--image",
+                str(image),
+                "--output",
+                str(tmp_path),
+                option,
+                value,
+            ],
+        )
+        assert result.exit_code == 2
+        assert "ndvi" in result.output
+
+
+def test_invalid_formulas_are_usage_errors(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que fórmulas mal escritas o con bandas desconocidas son errores de uso."""
+    image = make_image()
+    for formula in ("x=nir +", "x=foo / red", "nir / red"):
+        result = runner.invoke(
+            app,
+            [
+                "auto",
+                "--image",
+                str(image),
+                "--output",
+                str(tmp_path),
+                "--formula",
+                formula,
+            ],
+        )
+        assert result.exit_code == 2
+        assert "--formula" in result.output
@@ -0,0 +1,34 @@
+"""Unit tests for the benchmark suite helpers."""
+
+from pathlib import Path
+
+import rasterio
+
+from benchmarks.run_benchmarks import compare, synthetic_scene
+from src.sensors import resolve_bands
+
+
+def test_synthetic_scenes_and_report_comparison(tmp_path: Path) -> None:
+    """Las escenas sintéticas se identifican como S2/Landsat y los informes se comparan."""
+    image = synthetic_scene(tmp_path / "s2.tif", 600, bands=12, compress="deflate")
+    with rasterio.open(image) as src:
+        assert src.count == 12
+        assert src.block_shapes[0] == (512, 512)
+        bands = resolve_bands(src)
+        assert bands["red"] == 4 and bands["red_edge1"] == 5 and "nir" in bands
+        red, nir = src.read(4), src.read(8)
+    assert (nir > red).mean() > 0.4
+
+    case = {
+        "target": "ndvi",
+        "size": 600,
+        "bands": 12,
+        "layout": "tiled",
+        "compress": "deflate",
+    }
+    baseline = {"results": [{**case, "median_seconds": 2.0, "peak_rss_mb": 200.0}]}
+    report = {"results": [{**case, "median_seconds": 1.0, "peak_rss_mb": 300.0}]}
+    (row,) = compare(report, baseline)
+    assert row["case"] == "ndvi/600/12/tiled/deflate"
+    assert row["time_ratio"] == 0.5
+    assert row["memory_ratio"] == 1.5
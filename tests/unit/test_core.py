@@ -3,6 +3,9 @@
 Validates individual components according to ISO 42001 test requirements."""
 
 from pathlib import Path
+
+import pytest
+
 from src.config import (
     get_config,
     DEFAULT_SAVI_L,
@@ -60,3 +63,38 @@ def test_l_factor_range() -> None:
     assert "l_factor" in config["indices"]["savi"]
     l_factor = config["indices"]["savi"]["l_factor"]
     assert 0 <= l_factor <= 1
+
+
+def test_logging_setup_is_idempotent(tmp_path: Path) -> None:
+    """Verifica un único sink por proceso y la cadena de hashes del log."""
+    from loguru import logger
+    from src.logging_config import setup_logging, verify_log_chain
+
+    setup_logging(tmp_path)
+    handlers = len(logger._core.handlers)  # type: ignore[attr-defined]
+    setup_logging(tmp_path)
+    assert len(logger._core.handlers) == handlers  # type: ignore[attr-defined]
+
+    logger.info("Mensaje de auditoría")
+    logger.complete()
+    log_files = list((tmp_path / "logs").glob("*.log"))
+    assert len(log_files) == 1
+    assert log_files[0].read_text(encoding="utf-8").count("Mensaje de auditoría") == 1
+    assert verify_log_chain(log_files[0])
+
+
+def test_console_log_follows_replaced_stderr(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Verifica que la consola escribe en el stderr vigente, no en el inicial."""
+    import io
+    import sys
+
+    from loguru import logger
+    from src.logging_config import setup_logging
+
+    setup_logging(tmp_path)
+    stream = io.StringIO()
+    monkeypatch.setattr(sys, "stderr", stream)
+    logger.info("Mensaje tras cambiar stderr")
+    assert "Mensaje tras cambiar stderr" in stream.getvalue()
@@ -0,0 +1,531 @@
+"""Unit tests for the vegetation index engine.
+
+Validates index values against reference formulas following ISO 42001 test
+requirements."""
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pytest
+import rasterio
+
+from src.indices import (
+    IndexResult,
+    calculate_all_indices,
+    calculate_indices,
+    calculate_ndvi,
+    compute_indices,
+    plan_indices,
+)
+from src.tiling import plan_windows
+
+
+def _read_bands(image: Path) -> dict:
+    with rasterio.open(image) as src:
+        return {
+            "red": src.read(1).astype(float),
+            "nir": src.read(2).astype(float),
+            "red_edge1": src.read(3).astype(float),
+        }
+
+
+def test_single_pass_matches_formulas(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que el motor conjunto produce los valores de cada fórmula."""
+    image = make_image()
+    bands = _read_bands(image)
+    results = calculate_indices(
+        image, tmp_path / "out", ["ndvi", "ndre", "savi"], L=0.3
+    )
+
+    assert set(results) == {"ndvi", "ndre", "savi_0.3"}
+    nir, red, re = bands["nir"], bands["red"], bands["red_edge1"]
+    expected = {
+        "ndvi": (nir - red) / (nir + red),
+        "ndre": (nir - re) / (nir + re),
+        "savi_0.3": (nir - red) / (nir + red + 0.3) * 1.3,
+    }
+    for key, path in results.items():
+        with rasterio.open(path) as src:
+            np.testing.assert_allclose(src.read(1), expected[key], rtol=1e-5)
+
+
+def test_wrappers_and_all_indices(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que las funciones por índice siguen funcionando como envoltorios."""
+    image = make_image(wavelengths=(665, 842))
+    out = tmp_path / "out"
+
+    assert calculate_ndvi(image, out) == out / "scene_ndvi.tif"
+    results = calculate_all_indices(image, out)
+    # Sin banda Red Edge no se calcula NDRE
+    assert set(results) == {"ndvi", "savi_0.5"}
+
+
+def test_requested_indices_plan(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que solo se calculan los índices pedidos, con varios factores L."""
+    plan = plan_indices(["ndvi", "savi", "savi_L0.30", "ndvi"], [0.25, 0.5])
+    assert list(plan) == ["ndvi", "savi_0.25", "savi_0.5", "savi_0.3"]
+    assert plan["savi_0.3"].params == {"L": 0.3}
+    with pytest.raises(ValueError):
+        plan_indices(["foo"])
+    with pytest.raises(ValueError):
+        plan_indices(["savi"], 1.5)
+
+    image = make_image()
+    bands = _read_bands(image)
+    out = tmp_path / "out"
+    results = calculate_indices(image, out, ["savi"], L=[0.25, 0.75])
+
+    assert set(results) == {"savi_0.25", "savi_0.75"}
+    assert sorted(p.name for p in out.iterdir()) == [
+        "scene_savi_L0.25.tif",
+        "scene_savi_L0.75.tif",
+    ]
+    nir, red = bands["nir"], bands["red"]
+    with rasterio.open(results["savi_0.75"]) as src:
+        np.testing.assert_allclose(
+            src.read(1), (nir - red) / (nir + red + 0.75) * 1.75, rtol=1e-5
+        )
+
+    # Factores que coinciden con dos decimales no comparten archivo
+    close = calculate_indices(image, tmp_path / "close", ["savi"], L=[0.12, 0.125])
+    assert [p.name for p in close.values()] == [
+        "scene_savi_L0.12.tif",
+        "scene_savi_L0.125.tif",
+    ]
+
+
+def test_expression_indices_share_subexpressions(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica los índices por expresión, las fórmulas propias y la reutilización."""
+    from src.expressions import INDEX_REGISTRY, compile_indices
+
+    plan = compile_indices({k: INDEX_REGISTRY[k] for k in ("ndvi", "savi", "msavi2")})
+    # nir - red y nir + red se calculan una sola vez para los tres índices
+    assert sum(node[0] == "subtract" and node[1:] == (0, 1) for node in plan.nodes) == 1
+    assert sum(node[0] == "add" and node[1:] == (0, 1) for node in plan.nodes) == 1
+
+    image = make_image(wavelengths=(490, 560, 665, 842, 2200))
+    with rasterio.open(image) as src:
+        blue, green, red, nir, swir2 = src.read().astype(float)
+    results = calculate_indices(
+        image,
+        tmp_path / "out",
+        ["evi", "gndvi", "ndwi", "nbr", "msavi2"],
+        formulas={"sr": "nir / red"},
+    )
+
+    expected = {
+        "evi": 2.5 * (nir - red) / (nir + 6 * red - 7.5 * blue + 1),
+        "gndvi": (nir - green) / (nir + green),
+        "ndwi": (green - nir) / (green + nir),
+        "nbr": (nir - swir2) / (nir + swir2),
+        "msavi2": (2 * nir + 1 - np.sqrt((2 * nir + 1) ** 2 - 8 * (nir - red))) / 2,
+        "sr": nir / red,
+    }
+    assert set(results) == set(expected)
+    for key, path in results.items():
+        with rasterio.open(path) as src:
+            values = src.read(1)
+        # EVI: denominadores no positivos quedan como NaN
+        valid = ~np.isnan(values)
+        assert valid.mean() > 0.5
+        np.testing.assert_allclose(values[valid], expected[key][valid], rtol=1e-4)
+
+    with pytest.raises(ValueError):
+        calculate_indices(image, tmp_path / "bad", formulas={"x": "nir.__class__"})
+
+    # Las fórmulas propias admiten denominadores negativos; solo /0 es NaN
+    custom = calculate_indices(
+        image,
+        tmp_path / "custom",
+        [],
+        formulas={"neg": "nir / (red - nir - 1)", "half": "nir / -2", "inf": "nir / 0"},
+    )
+    with rasterio.open(custom["neg"]) as src:
+        np.testing.assert_allclose(src.read(1), nir / (red - nir - 1), rtol=1e-5)
+    with rasterio.open(custom["half"]) as src:
+        np.testing.assert_allclose(src.read(1), nir / -2, rtol=1e-6)
+    with rasterio.open(custom["inf"]) as src:
+        assert np.isnan(src.read(1)).all()
+
+
+def test_plan_windows_cover_grid() -> None:
+    """Verifica que las ventanas cubren la imagen respetando el presupuesto."""
+    # Imagen con bloques en franjas (1 fila x ancho completo)
+    windows = plan_windows(100, 30, (1, 100), max_pixels=1000)
+    assert all(w.width == 100 and w.height <= 10 for w in windows)
+    assert sum(w.width * w.height for w in windows) == 100 * 30
+
+    # Tiles fijos con bordes recortados
+    windows = plan_windows(100, 30, (1, 100), tile_size=32)
+    assert len(windows) == 4
+    assert windows[-1].width == 4 and windows[-1].height == 30
+
+
+def test_streaming_matches_full_read(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que el modo streaming produce los mismos resultados."""
+    image = make_image(width=70, height=50)
+    full = calculate_indices(image, tmp_path / "full")
+    tiled = calculate_indices(image, tmp_path / "tiled", streaming=True, tile_size=16)
+    budget = calculate_indices(
+        image, tmp_path / "budget", streaming=True, memory_mb=0.01
+    )
+
+    for key, path in full.items():
+        with rasterio.open(path) as ref:
+            expected = ref.read(1)
+        for other in (tiled, budget):
+            with rasterio.open(other[key]) as src:
+                np.testing.assert_array_equal(src.read(1), expected)
+
+
+def test_parallel_matches_sequential(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica que el cálculo con varios hilos escribe las ventanas en orden."""
+    image = make_image(width=90, height=70)
+    sequential = calculate_indices(image, tmp_path / "seq")
+    parallel = calculate_indices(image, tmp_path / "par", tile_size=16, workers=4)
+
+    for key, path in sequential.items():
+        with rasterio.open(path) as ref, rasterio.open(parallel[key]) as src:
+            np.testing.assert_array_equal(src.read(1), ref.read(1))
+
+
+def test_float32_path_matches_float64_reference(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica la equivalencia numérica del cálculo float32 con la versión float64."""
+    image = make_image(dtype="uint16", wavelengths=(665, 842, 705))
+    with rasterio.open(image, "r+") as dst:
+        data = np.random.default_rng(3).integers(0, 10000, (3, 48, 64), dtype="uint16")
+        data[:, :4, :4] = 0  # Denominador nulo
+        dst.write(data)
+
+    bands = _read_bands(image)
+    nir, red, re = bands["nir"], bands["red"], bands["red_edge1"]
+
+    def reference(a: np.ndarray, b: np.ndarray, L: float = 0.0) -> np.ndarray:
+        # Implementación float64 original (denominador no positivo -> nodata)
+        denominator = a + b + L
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(denominator > 0, ((a - b) / denominator) * (1 + L), np.nan)
+
+    expected = {
+        "ndvi": reference(nir, red),
+        "ndre": reference(nir, re),
+        "savi_0.5": reference(nir, red, 0.5),
+    }
+    results = calculate_indices(image, tmp_path / "out")
+    for key, path in results.items():
+        with rasterio.open(path) as src:
+            values = src.read(1)
+        assert values.dtype == np.float32
+        np.testing.assert_allclose(values, expected[key], rtol=1e-6, atol=1e-6)
+
+
+def test_nodata_mask_shared_and_empty_windows_skipped(
+    make_image: Callable[..., Path], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Verifica que el nodata de origen se propaga como NaN a todos los índices."""
+    from src.expressions import EvaluationPlan
+
+    image = make_image(width=64, height=64, nodata=0)
+    with rasterio.open(image, "r+") as dst:
+        data = dst.read()
+        data[:, :32, :] = 0  # Mitad superior sin datos
+        data[0, 40, 40] = 0  # Un píxel sin dato solo en la banda roja
+        dst.write(data)
+
+    calls = []
+    original = EvaluationPlan.evaluate
+
+    def counting_evaluate(plan: EvaluationPlan, *args: Any, **kwargs: Any) -> Any:
+        calls.append(plan)
+        return original(plan, *args, **kwargs)
+
+    monkeypatch.setattr(EvaluationPlan, "evaluate", counting_evaluate)
+    results = calculate_indices(image, tmp_path / "out", tile_size=16, streaming=True)
+    # 16 ventanas de 16x16: las 8 de la mitad sin datos no se leen ni se calculan
+    assert len(calls) == 8
+    for key, path in results.items():
+        with rasterio.open(path) as src:
+            values = src.read(1)
+        assert np.isnan(values[:32]).all()
+        assert not np.isnan(values[32:40]).any()
+        # El píxel sin rojo invalida NDVI/SAVI pero no NDRE
+        assert np.isnan(values[40, 40]) == (key != "ndre")
+
+
+def test_cog_output_profile(make_image: Callable[..., Path], tmp_path: Path) -> None:
+    """Verifica la salida COG con tiles, compresión y overviews."""
+    image = make_image(width=1024, height=1024, wavelengths=(665, 842))
+    plain = calculate_indices(image, tmp_path / "plain", ["ndvi"])
+    cog = calculate_indices(
+        image, tmp_path / "cog", ["ndvi"], output_profile="cog", compress="zstd"
+    )
+
+    with rasterio.open(cog["ndvi"]) as src, rasterio.open(plain["ndvi"]) as ref:
+        assert src.tags(ns="IMAGE_STRUCTURE").get("LAYOUT") == "COG"
+        assert src.block_shapes[0] == (512, 512)
+        assert src.compression.value == "ZSTD"
+        assert src.overviews(1) == [2]
+        np.testing.assert_array_equal(src.read(1), ref.read(1))
+
+
+def test_stacked_output_and_in_memory_arrays(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica la salida apilada y la API que devuelve los arreglos."""
+    image = make_image()
+    separate = calculate_indices(image, tmp_path / "sep")
+    stacked = calculate_indices(image, tmp_path / "stack", stack=True)
+
+    stack_file = tmp_path / "stack" / "scene_indices.tif"
+    assert set(stacked.values()) == {stack_file}
+    with rasterio.open(stack_file) as src:
+        assert src.descriptions == tuple(separate)
+        for band, path in enumerate(separate.values(), start=1):
+            with rasterio.open(path) as ref:
+                np.testing.assert_array_equal(src.read(band), ref.read(1))
+
+    result = compute_indices(image, indices=["ndvi"], return_arrays=True)
+    assert result.paths == {}
+    with rasterio.open(separate["ndvi"]) as ref:
+        np.testing.assert_array_equal(result.arrays["ndvi"], ref.read(1))
+        assert result.transform == ref.transform
+        assert result.crs == ref.crs
+    assert result.profile["width"] == 64
+
+    # Sin arrays la malla de salida sigue disponible; sin malla, un error claro
+    written = compute_indices(image, tmp_path / "written", indices=["ndvi"])
+    assert written.arrays == {}
+    assert written.profile["height"] == result.profile["height"]
+    with pytest.raises(ValueError, match="malla"):
+        IndexResult().profile
+
+
+def test_incremental_rewrites_only_changed_windows(
+    make_image: Callable[..., Path], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Verifica que el modo incremental solo recalcula las ventanas modificadas."""
+    from src.expressions import EvaluationPlan
+
+    image = make_image(width=64, height=64)
+    out = tmp_path / "out"
+    options: Dict[str, Any] = {
+        "incremental": True,
+        "tile_size": 32,
+        "indices": ["ndvi"],
+    }
+    calculate_indices(image, out, **options)
+
+    # Parchear una región de la imagen que cae en una sola ventana
+    with rasterio.open(image, "r+") as dst:
+        dst.write(
+            np.full((10, 10), 0.9, dtype=np.float32),
+            2,
+            window=rasterio.windows.Window(40, 40, 10, 10),
+        )
+
+    calls: List[str] = []
+    original = EvaluationPlan.evaluate
+
+    def recording_evaluate(plan: EvaluationPlan, *args: Any, **kwargs: Any) -> Any:
+        calls.extend(plan.outputs)
+        return original(plan, *args, **kwargs)
+
+    monkeypatch.setattr(EvaluationPlan, "evaluate", recording_evaluate)
+    updated = calculate_indices(image, out, **options)
+    assert calls == ["ndvi"]
+
+    reference = calculate_indices(image, tmp_path / "reference", indices=["ndvi"])
+    with rasterio.open(updated["ndvi"]) as src, rasterio.open(reference["ndvi"]) as ref:
+        np.testing.assert_array_equal(src.read(1), ref.read(1))
+
+    # Sin cambios no se recalcula ninguna ventana
+    calls.clear()
+    calculate_indices(image, out, **options)
+    assert calls == []
+
+
+def test_band_identification_from_sensor_profiles(
+    make_image: Callable[..., Path], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Verifica la identificación por descripciones y su memorización por archivo."""
+    import src.sensors as sensors
+    from src.indices import identify_bands
+
+    image = make_image(name="described.tif", wavelengths=(0, 0, 0, 0))
+    with rasterio.open(image, "r+") as dst:
+        dst.descriptions = ("B02", "B8", "B4", "B05")
+
+    calls: List[str] = []
+    original = sensors.resolve_bands
+
+    def recording_resolve(src: Any, sensor: Optional[str] = None) -> Dict[str, int]:
+        calls.append(src.name)
+        return original(src, sensor)
+
+    monkeypatch.setattr(sensors, "resolve_bands", recording_resolve)
+    with rasterio.open(image) as src:
+        assert identify_bands(src) == {"blue": 1, "nir": 2, "red": 3, "red_edge1": 4}
+        identify_bands(src)
+    calculate_indices(image, image.parent / "out")
+    assert len(calls) == 1
+
+    # Un sensor nuevo es solo una entrada de configuración
+    monkeypatch.setitem(
+        sensors.SUPPORTED_SATELLITES,
+        "drone",
+        {"bands": {"red": "R650", "nir": "NIR840"}},
+    )
+    with rasterio.open(image, "r+") as dst:
+        dst.descriptions = ("R650", "NIR840", "x", "y")
+    with rasterio.open(image) as src:
+        assert identify_bands(src, "drone") == {"red": 1, "nir": 2}
+
+
+def test_band_identification_between_sensor_names(
+    make_image: Callable[..., Path],
+) -> None:
+    """Verifica que B5 de Landsat (NIR) no se confunde con B05 de Sentinel-2."""
+    from src.indices import identify_bands
+
+    landsat = make_image(name="landsat.tif", wavelengths=(0, 0, 0, 0))
+    with rasterio.open(landsat, "r+") as dst:
+        dst.descriptions = ("B2", "B3", "B4", "B5")
+    with rasterio.open(landsat) as src:
+        assert identify_bands(src) == {"blue": 1, "green": 2, "red": 3, "nir": 4}
+
+    # Descripciones que no identifican el NIR: mandan las longitudes de onda
+    tagged = make_image(name="tagged.tif", wavelengths=(560, 665, 842, 705))
+    with rasterio.open(tagged, "r+") as dst:
+        dst.descriptions = ("B03", "x", "y", "z")
+    with rasterio.open(tagged) as src:
+        assert identify_bands(src) == {
+            "green": 1,
+            "red": 2,
+            "nir": 3,
+            "red_edge1": 4,
+        }
+
+
+def test_target_resolution_averages_bands(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica el cálculo en una malla más gruesa con lecturas remuestreadas."""
+    image = make_image(width=64, height=48)
+    bands = {
+        name: band.reshape(24, 2, 32, 2).mean(axis=(1, 3))
+        for name, band in _read_bands(image).items()
+    }
+    result = compute_indices(
+        image, tmp_path, indices=["ndvi"], resolution=20, tile_size=16
+    )
+    with rasterio.open(result.paths["ndvi"]) as src:
+        assert src.shape == (24, 32) and src.res == (20.0, 20.0)
+        expected = (bands["nir"] - bands["red"]) / (bands["nir"] + bands["red"])
+        np.testing.assert_allclose(src.read(1), expected, atol=1e-6)
+
+
+def test_preview_uses_overviews(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica la vista previa reducida servida desde las overviews."""
+    from rasterio.enums import Resampling
+
+    image = make_image(width=64, height=48)
+    with rasterio.open(image, "r+") as dst:
+        dst.build_overviews([4], Resampling.nearest)
+    with rasterio.open(image) as src:
+        red = src.read(1, out_shape=(12, 16)).astype(float)
+        nir = src.read(2, out_shape=(12, 16)).astype(float)
+
+    preview = calculate_ndvi(image, tmp_path, scale=4)
+    assert preview.name == "scene_preview_ndvi.tif"
+    with rasterio.open(preview) as src:
+        assert src.shape == (12, 16)
+        np.testing.assert_allclose(src.read(1), (nir - red) / (nir + red), atol=1e-6)
+
+    sized = compute_indices(image, tmp_path / "sized", indices=["ndvi"], max_size=32)
+    with rasterio.open(sized.paths["ndvi"]) as src:
+        assert max(src.shape) == 32
+
+
+def test_cloud_mask_and_rejection_from_scl_band(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica el enmascarado de nubes con la banda SCL y el rechazo por nubosidad."""
+    from src.preprocessor import SceneRejected
+
+    image = make_image(name="scl.tif", wavelengths=(0, 0, 0), width=64, height=48)
+    scl = np.full((48, 64), 4, dtype=np.float32)
+    scl[:24, 32:] = 9  # Nube de probabilidad alta en el cuadrante superior derecho
+    with rasterio.open(image, "r+") as dst:
+        dst.descriptions = ("B4", "B8", "SCL")
+        dst.write(scl, 3)
+        red, nir = dst.read(1), dst.read(2)
+
+    result = compute_indices(image, tmp_path, indices=["ndvi"], tile_size=16)
+    assert result.cloud_coverage == pytest.approx(25.0)
+    with rasterio.open(result.paths["ndvi"]) as src:
+        ndvi = src.read(1)
+    assert np.isnan(ndvi[:24, 32:]).all()
+    np.testing.assert_allclose(ndvi[24:], ((nir - red) / (nir + red))[24:], atol=1e-6)
+
+    with pytest.raises(SceneRejected):
+        compute_indices(image, tmp_path / "rejected", max_cloud_coverage=20)
+    assert not list((tmp_path / "rejected").glob("*.tif"))
+
+    unmasked = compute_indices(
+        image, tmp_path / "raw", indices=["ndvi"], cloud_mask=False
+    )
+    assert unmasked.cloud_coverage is None
+    with rasterio.open(unmasked.paths["ndvi"]) as src:
+        assert not np.isnan(src.read(1)).any()
+
+
+def test_cloud_mask_from_qa_pixel_file(
+    make_image: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Verifica el enmascarado con un archivo QA_PIXEL aparte de resolución más gruesa."""
+    from rasterio.transform import from_bounds
+
+    image = make_image(width=64, height=48)
+    qa = np.full((24, 32), 1 << 6, dtype=np.uint16)  # Bit 6: despejado
+    qa[:, :8] = 1 << 4  # Sombra de nube en las 16 primeras columnas
+    qa[20:, :] = 1  # Relleno sin dato en las 8 últimas filas
+    quality_file = tmp_path / "LC09_QA_PIXEL.TIF"
+    with rasterio.open(
+        quality_file,
+        "w",
+        driver="GTiff",
+        width=32,
+        height=24,
+        count=1,
+        dtype="uint16",
+        crs="EPSG:32719",
+        transform=from_bounds(300000, 6000000, 300640, 6000480, 32, 24),
+    ) as dst:
+        dst.write(qa, 1)
+
+    result = compute_indices(
+        image, tmp_path / "out", indices=["ndvi"], quality_file=quality_file
+    )
+    # Nubosidad sobre los píxeles válidos: 8 de 32 columnas
+    assert result.cloud_coverage == pytest.approx(25.0)
+    with rasterio.open(result.paths["ndvi"]) as src:
+        ndvi = src.read(1)
+    assert np.isnan(ndvi[:, :16]).all() and np.isnan(ndvi[40:]).all()
+    assert not np.isnan(ndvi[:40, 16:]).any()